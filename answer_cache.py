@@ -0,0 +1,166 @@
+"""Two-tier cache of report answers.
+
+Answers are cached per document index (a report key, or a corpus generation plus
+search filters), so an answer is never served for a different set of documents:
+
+- the exact tier is keyed by the normalized question and the ids of the retrieved chunks;
+- the semantic tier reuses the answer to an earlier question whose embedding has a cosine
+  similarity of at least ``similarity_threshold`` with the new one.
+
+Both tiers share an LRU bound of ``max_entries`` and a ``ttl`` in seconds.
+"""
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_ENTRIES = 512
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_SIMILARITY_THRESHOLD = 0.95
+
+
+def normalize_question(question):
+    """Lower-case, collapse whitespace and drop trailing punctuation."""
+    return re.sub(r"\s+", " ", question.strip().lower()).rstrip(" ?!.")
+
+
+def exact_key(index_id, question, chunk_ids):
+    digest = hashlib.sha256(index_id.encode())
+    digest.update(normalize_question(question).encode())
+    for chunk_id in chunk_ids:
+        digest.update(f"|{chunk_id}".encode())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL,
+                 similarity_threshold=DEFAULT_SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._exact = OrderedDict()     # key -> (stored_at, value)
+        self._semantic = OrderedDict()  # index_id -> OrderedDict(question -> (stored_at, vector, value))
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _fresh(self, stored_at):
+        return self.ttl is None or time.time() - stored_at <= self.ttl
+
+    def _semantic_size(self):
+        return sum(len(entries) for entries in self._semantic.values())
+
+    def _evict(self):
+        while len(self._exact) > self.max_entries:
+            self._exact.popitem(last=False)
+            self.evictions += 1
+        while self._semantic_size() > self.max_entries:
+            index_id, entries = next(iter(self._semantic.items()))
+            entries.popitem(last=False)
+            if not entries:
+                del self._semantic[index_id]
+            self.evictions += 1
+
+    def get_exact(self, index_id, question, chunk_ids):
+        key = exact_key(index_id, question, chunk_ids)
+        with self._lock:
+            entry = self._exact.get(key)
+            if entry is None:
+                return None
+            if not self._fresh(entry[0]):
+                del self._exact[key]
+                self.expirations += 1
+                return None
+            self._exact.move_to_end(key)
+            self.exact_hits += 1
+            return entry[1]
+
+    def get_similar(self, index_id, query_vector):
+        """Return the cached answer of the most similar earlier question, if similar enough."""
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        with self._lock:
+            entries = self._semantic.get(index_id)
+            if not entries or not norm:
+                return None
+            for question in [q for q, (stored_at, _, _) in entries.items() if not self._fresh(stored_at)]:
+                del entries[question]
+                self.expirations += 1
+            if not entries:
+                del self._semantic[index_id]
+                return None
+            questions = list(entries)
+            matrix = np.stack([entries[q][1] for q in questions])
+            similarities = matrix @ (query / norm)
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.similarity_threshold:
+                return None
+            entries.move_to_end(questions[best])
+            self._semantic.move_to_end(index_id)
+            self.semantic_hits += 1
+            return entries[questions[best]][2]
+
+    def record_miss(self):
+        with self._lock:
+            self.misses += 1
+
+    def put(self, index_id, question, chunk_ids, value, query_vector=None):
+        now = time.time()
+        with self._lock:
+            self._exact[exact_key(index_id, question, chunk_ids)] = (now, value)
+            if query_vector is not None:
+                vector = np.asarray(query_vector, dtype=np.float32)
+                norm = np.linalg.norm(vector)
+                if norm:
+                    entries = self._semantic.setdefault(index_id, OrderedDict())
+                    entries[normalize_question(question)] = (now, vector / norm, value)
+                    entries.move_to_end(normalize_question(question))
+                    self._semantic.move_to_end(index_id)
+            self._evict()
+
+    def invalidate(self, index_id=None):
+        """Drop the semantic entries of ``index_id`` (exact keys age out), or everything."""
+        with self._lock:
+            if index_id is None:
+                self._exact.clear()
+                self._semantic.clear()
+            else:
+                self._semantic.pop(index_id, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                'exact_hits': self.exact_hits,
+                'semantic_hits': self.semantic_hits,
+                'misses': self.misses,
+                'hit_rate': (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                'exact_entries': len(self._exact),
+                'semantic_entries': self._semantic_size(),
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_answer_cache():
+    """Process-wide cache configured by ANSWER_CACHE_SIZE, ANSWER_CACHE_TTL and ANSWER_CACHE_THRESHOLD."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = AnswerCache(
+                max_entries=int(os.environ.get("ANSWER_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+                ttl=float(os.environ.get("ANSWER_CACHE_TTL", DEFAULT_TTL)),
+                similarity_threshold=float(os.environ.get("ANSWER_CACHE_THRESHOLD", DEFAULT_SIMILARITY_THRESHOLD)),
+            )
+        return _default_cache
@@ -1,9 +1,14 @@
 import streamlit as st
-from data_processing import fetch_financial_data, process_financial_data, generate_financial_insights
-from report_analysis import process_annual_report, answer_question_from_report
-from test_api import test_api
+import logging
 import os
 
+# LOG_LEVEL=DEBUG also logs the structure of every processed statement
+logging.basicConfig(level=os.environ.get("LOG_LEVEL", "WARNING").upper(),
+                    format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+# Page modules pull in pandas, Plotly, OpenAI, langchain, FAISS and PyMuPDF. They are imported
+# inside the page that needs them, so the first page renders without paying for all of them.
+
 def api_keys_page():
     st.header("API Keys")
     
@@ -13,7 +18,7 @@ def api_keys_page():
     2. **Tiingo**
     3. **World Trading Data**
     4. **Twelve Data**
-    5. **Polygon.io**
+    5. **Polygon.io**: Optional second source for the same statements, queried when Alpha Vantage is slow or failing.
     6. **Finnhub**
     7. **Quandl**
     8. **IEX Cloud**
@@ -27,78 +32,238 @@ def api_keys_page():
     
     openai_api_key = st.text_input("OpenAI API Key", type="password", value=st.session_state.get('openai_api_key', ''))
     financial_api_key = st.text_input("Financial Data API Key (e.g., Alpha Vantage, Tiingo, etc.)", type="password", value=st.session_state.get('financial_api_key', ''))
+    # With a second source, slow or failing Alpha Vantage requests are hedged to Polygon.io
+    polygon_api_key = st.text_input("Polygon.io API Key (optional fallback)", type="password",
+                                    value=st.session_state.get('polygon_api_key', ''))
     
     if st.button("Save API Keys"):
         st.session_state['openai_api_key'] = openai_api_key
         st.session_state['financial_api_key'] = financial_api_key
+        st.session_state['polygon_api_key'] = polygon_api_key
         os.environ['OPENAI_API_KEY'] = openai_api_key
         os.environ['ALPHA_VANTAGE_API_KEY'] = financial_api_key
         st.success("API Keys saved successfully!")
 
+def provider_chain():
+    """The data provider chain of this session's keys; None without a Polygon.io key."""
+    from data_providers import get_provider_chain
+    from rate_limit import get_provider_quota
+
+    api_key = st.session_state['financial_api_key']
+    return get_provider_chain(api_key, st.session_state.get('polygon_api_key'),
+                              rate_limiter=get_provider_quota(api_key))
+
 def financial_data_page():
     st.header("Financial Data Analysis")
     
     if 'openai_api_key' not in st.session_state or 'financial_api_key' not in st.session_state:
         st.warning("Please enter your API keys in the API Keys tab.")
         return
+
+    from data_processing import INSIGHTS_ERROR_MESSAGE, analyze_ticker, stream_financial_insights
+    from llm_metrics import get_generation_metrics
+    from pipeline_cache import get_pipeline_cache
+    from prefetch_worker import get_prefetch_worker
+    from rate_limit import QuotaExhausted
+    from statement_cache import get_statement_cache
+
+    # Watchlist tickers are fetched and precomputed in the background; the worker's quota is
+    # the key's, so lookups below spend from the same per-minute and per-day budget
+    worker = get_prefetch_worker(st.session_state['financial_api_key'])
     
     ticker = st.text_input("Enter the ticker symbol of a company (e.g., AAPL, MSFT)")
     
     if ticker:
+        watched = ticker.strip().upper() in worker.watchlist
+        if st.checkbox("Keep warm in the background (watchlist)", value=watched) != watched:
+            if watched:
+                worker.remove(ticker)
+            else:
+                worker.add(ticker)
+
+        if st.button("Refresh data"):
+            # Drop the cached statements and everything computed from them
+            get_statement_cache().invalidate(ticker)
+            get_pipeline_cache().invalidate(ticker)
+            if os.environ.get("STATEMENT_WAREHOUSE_PATH"):
+                from statement_warehouse import get_statement_warehouse
+                get_statement_warehouse().invalidate(ticker)
+
         st.write(f"Fetching financial data for {ticker}...")
-        financial_data = fetch_financial_data(ticker, st.session_state['financial_api_key'])
-        
-        if financial_data is not None:
-            metrics_df, charts = process_financial_data(financial_data)
-            
+        # Metrics, charts and insights are memoized per ticker and data version across reruns
+        analysis, exhausted = None, None
+        try:
+            analysis = analyze_ticker(ticker, st.session_state['financial_api_key'], rate_limiter=worker.quota,
+                                      providers=provider_chain())
+        except QuotaExhausted as e:
+            exhausted = e
+
+        if analysis is not None:
             st.subheader("Key Financial Metrics")
-            st.table(metrics_df)
+            st.table(analysis.metrics_df)
             
             st.subheader("Financial Charts")
-            for chart in charts:
+            for chart in analysis.charts:
                 st.plotly_chart(chart)
             
             st.subheader("AI-Generated Insights")
-            insights = generate_financial_insights(metrics_df, st.session_state['openai_api_key'])
-            st.write(insights)
+            if analysis.insights is not None:
+                st.write(analysis.insights)
+            else:
+                # Render the insights token by token as they are generated
+                insights = st.write_stream(stream_financial_insights(analysis.metrics_df,
+                                                                     st.session_state['openai_api_key']))
+                timing = get_generation_metrics().last("insights")
+                if timing and timing['ttft'] is not None:
+                    st.caption(f"First token after {timing['ttft']:.2f} s, complete after {timing['total']:.2f} s")
+                if insights and insights != INSIGHTS_ERROR_MESSAGE:
+                    get_pipeline_cache().set_insights(analysis, insights)
+        elif exhausted is not None:
+            st.error(f"Cannot fetch {ticker} today: the provider key's {exhausted}.")
         else:
             st.error("Failed to fetch financial data. Please check the ticker symbol and try again.")
 
+    status = worker.status()
+    if status['watchlist']:
+        with st.expander(f"Watchlist: {status['warm']} of {status['watchlist']} warm, {status['due']} due"):
+            st.caption(f"{status['requests']} provider requests, {status['failed']} failing, "
+                       f"{status['deferred']} waiting for quota"
+                       + (f", next run in {status['next_run_in']:.0f} s" if status['next_run_in'] is not None else ""))
+            st.dataframe([{'ticker': name, **{key: value for key, value in state.items() if key != 'next_run'}}
+                          for name, state in status['tickers'].items()], hide_index=True)
+
 def document_analysis_page():
     st.header("Document Analysis")
     
     if 'openai_api_key' not in st.session_state:
         st.warning("Please enter your OpenAI API key in the API Keys tab.")
         return
+
+    from answer_cache import get_answer_cache
+    from report_analysis import process_annual_report, stream_answer_from_report, report_key_for, get_report_corpus
     
     uploaded_file = st.file_uploader("Upload an annual report PDF", type=["pdf"])
-    
+
     if uploaded_file:
-        st.write("Processing annual report...")
-        vectorstore = process_annual_report(uploaded_file, st.session_state['openai_api_key'])
-        st.session_state['vectorstore'] = vectorstore
+        col_ticker, col_year = st.columns(2)
+        report_ticker = col_ticker.text_input("Company ticker (optional)")
+        report_year = col_year.number_input("Fiscal year (optional)", min_value=0, max_value=2100, value=0, step=1)
+
+        # Reruns with the same upload keep the index already in the session
+        key = report_key_for(uploaded_file, st.session_state['openai_api_key'])
+        if st.session_state.get('report_key') != key:
+            st.write("Processing annual report...")
+            vectorstore = process_annual_report(uploaded_file, st.session_state['openai_api_key'])
+            st.session_state['vectorstore'] = vectorstore
+            st.session_state['report_key'] = key
         st.success("Annual report processed successfully!")
-    
-    if 'vectorstore' in st.session_state:
+
+    corpus = get_report_corpus(st.session_state['openai_api_key'])
+    if uploaded_file and (report_ticker or report_year):
+        # Ticker and year can be filled in after the upload has already been indexed
+        corpus.tag_report(st.session_state['report_key'], ticker=report_ticker, fiscal_year=report_year)
+    if 'vectorstore' in st.session_state or len(corpus):
+        scopes = ["This report", "All reports"] if 'report_key' in st.session_state else ["All reports"]
+        scope = st.radio("Search in", scopes, horizontal=True)
+        if scope == "This report":
+            filters = {'report_key': st.session_state['report_key']}
+        else:
+            reports = corpus.reports()
+            tickers = sorted({r['ticker'] for r in reports if r['ticker']})
+            years = sorted({r['fiscal_year'] for r in reports if r['fiscal_year']})
+            filters = {
+                'ticker': st.multiselect("Tickers", tickers),
+                'fiscal_year': st.multiselect("Fiscal years", years),
+            }
+
         question = st.text_input("Enter your question about the report")
         
         if question:
-            st.write("Generating answer...")
-            answer, sources = answer_question_from_report(question, st.session_state['vectorstore'], st.session_state['openai_api_key'])
+            tokens, sources = stream_answer_from_report(question, corpus, st.session_state['openai_api_key'],
+                                                        filters=filters)
             st.write("**Answer:**")
-            st.write(answer)
+            st.write_stream(tokens)
             st.write("**Relevant Sources:**")
             for i, source in enumerate(sources, 1):
                 st.write(f"Source {i}:")
                 st.text(source)
+            stats = get_answer_cache().stats()
+            st.caption(f"Answer cache: {stats['exact_hits']} exact / {stats['semantic_hits']} similar-question hits, "
+                       f"{stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)")
+
+def peer_comparison_page():
+    st.header("Peer Comparison")
+
+    from chart_generation import peer_distribution_chart, peer_percentile_chart, top_companies_chart
+    from peer_comparison import get_metric_matrix
+
+    # Built from the statements already stored locally; companies appear here once analyzed or batch-loaded
+    matrix = get_metric_matrix()
+    if not len(matrix):
+        st.info("No company statements are stored yet. Analyze tickers on the Financial Data page "
+                "or load a universe with batch_analysis.py.")
+        return
+    st.caption(f"{len(matrix)} companies, fiscal years {matrix.years[0]}-{matrix.years[-1]}")
+
+    ticker = st.selectbox("Company", matrix.tickers)
+    peers = st.multiselect("Peers (all companies when empty)", matrix.tickers)
+    year = st.selectbox("Fiscal year", ["Latest"] + matrix.years[::-1])
+    year = None if year == "Latest" else year
+    peers = peers or None
+
+    profile = matrix.profile(ticker, year=year, peers=peers)
+    st.plotly_chart(peer_percentile_chart(profile, ticker))
+    st.dataframe(profile.round(2))
+
+    metric = st.selectbox("Metric", matrix.metrics, index=matrix.metrics.index('Return on Invested Capital (ROIC) (%)'))
+    scope = None if peers is None else [ticker] + peers
+    values = matrix.frame(year, scope)[metric]
+    st.plotly_chart(peer_distribution_chart(values, metric, highlight=[ticker]))
+    top_n = st.slider("Top companies", 5, 50, 10)
+    st.plotly_chart(top_companies_chart(matrix.top(metric, top_n, year=year, peers=scope), metric))
 
 def test_api_page():
     st.header("API Test")
     if st.button("Run API Test"):
+        from test_api import test_api
+
         with st.spinner("Testing API..."):
             result = test_api()
         st.write(result)
 
+def profiling_panel():
+    from telemetry import get_tracer
+
+    tracer = get_tracer()
+    st.divider()
+    st.subheader("Profiling")
+    summary = tracer.summary()
+    if not summary:
+        st.caption("No spans recorded yet.")
+        return
+    st.caption("Per operation over the most recent spans in this process, slowest total first.")
+    st.dataframe(
+        [{'operation': name, **{key: round(value, 2) if isinstance(value, float) else value
+                                for key, value in stats.items()}}
+         for name, stats in summary.items()],
+        hide_index=True,
+    )
+    chain = provider_chain() if 'financial_api_key' in st.session_state else None
+    if chain is not None:
+        st.caption("Data providers: breaker state, outcomes and latency (seconds) of successful calls.")
+        st.dataframe([{'provider': name, **{key: round(value, 3) if isinstance(value, float) else value
+                                            for key, value in stats.items()}}
+                      for name, stats in chain.summary().items()],
+                     hide_index=True)
+    for trace in tracer.recent_traces(limit=5):
+        root = trace[0][1]
+        with st.expander(f"{root.name}: {root.duration * 1000:.1f} ms"):
+            st.code("\n".join(
+                f"{'  ' * depth}{span.name} {span.duration * 1000:.1f} ms"
+                + "".join(f" {key}={value}" for key, value in span.attributes.items() if value is not None)
+                + (f" ERROR {span.error}" if span.error else "")
+                for depth, span in trace), language=None)
+
 def main():
     st.title("Financial Insights Application")
 
@@ -108,7 +273,8 @@ def main():
 
     # Create sidebar
     st.sidebar.title("Navigation")
-    page = st.sidebar.radio("Go to", ["API Keys", "Financial Data", "Document Analysis", "API Test"])
+    page = st.sidebar.radio("Go to", ["API Keys", "Financial Data", "Peer Comparison", "Document Analysis", "API Test"])
+    show_profiling = st.sidebar.checkbox("Show profiling panel")
 
     # Update session state
     st.session_state['page'] = page
@@ -118,10 +284,15 @@ def main():
         api_keys_page()
     elif st.session_state['page'] == "Financial Data":
         financial_data_page()
+    elif st.session_state['page'] == "Peer Comparison":
+        peer_comparison_page()
     elif st.session_state['page'] == "Document Analysis":
         document_analysis_page()
     elif st.session_state['page'] == "API Test":
         test_api_page()
 
+    if show_profiling:
+        profiling_panel()
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,377 @@
+"""Batch metric computation for many tickers.
+
+    python batch_analysis.py tickers.txt -o metrics.csv --rpm 75 --workers 4
+    python batch_analysis.py tickers.txt -o metrics.csv --insights insights.jsonl
+    python batch_analysis.py tickers.txt -o metrics.csv --warehouse .cache/warehouse
+
+Fetches are scheduled through a token bucket sized to the provider quota, metrics
+are computed on a worker pool as responses arrive, and one row per ticker is
+streamed to CSV or Parquet. Completed tickers are recorded in a progress file next
+to the output so an interrupted run picks up where it stopped. With ``--insights``,
+AI insights for the processed tickers are generated concurrently through the LLM
+scheduler once the metrics are in.
+
+With ``--warehouse`` the statement history is kept in a ``StatementWarehouse``: only
+tickers whose latest period is stale are fetched, only new periods are appended, and
+the metrics of the whole universe are computed from memory-mapped local scans.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from data_processing import (
+    ALPHA_VANTAGE_URL,
+    STATEMENT_FUNCTIONS,
+    fetch_financial_data,
+    generate_insights_bulk,
+    is_statement_payload,
+    provider_message,
+)
+from metrics_engine import METRIC_NAMES, latest_metrics
+from rate_limit import TokenBucket
+
+ROW_COLUMNS = ['ticker', 'fiscalDateEnding'] + METRIC_NAMES
+
+
+def metrics_row(ticker, financial_data):
+    """Compute one output row for a ticker; runs in the processing pool."""
+    period, metrics = latest_metrics(financial_data)
+    if not metrics:
+        raise ValueError("No valid financial metrics could be calculated")
+    row = {'ticker': ticker, 'fiscalDateEnding': period.strftime('%Y-%m-%d')}
+    row.update({name: metrics.get(name) for name in METRIC_NAMES})
+    return row
+
+
+class ProgressLog:
+    """Append-only JSON-lines record of finished tickers."""
+
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        self.failed = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from a crash; the ticker will simply be redone
+                        continue
+                    if entry['status'] == 'ok':
+                        self.done.add(entry['ticker'])
+                        self.failed.pop(entry['ticker'], None)
+                    else:
+                        self.failed[entry['ticker']] = entry.get('error')
+        self._file = open(path, 'a')
+
+    def record(self, ticker, status, error=None):
+        entry = {'ticker': ticker, 'status': status}
+        if error:
+            entry['error'] = error
+        self._file.write(json.dumps(entry) + '\n')
+        self._file.flush()
+        if status == 'ok':
+            self.done.add(ticker)
+            self.failed.pop(ticker, None)
+        else:
+            self.failed[ticker] = error
+
+    def close(self):
+        self._file.close()
+
+
+class CsvSink:
+    """Appends rows to a CSV file. ``write`` returns the rows now on disk, which is
+    always the row just written."""
+
+    def __init__(self, path):
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'a', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=ROW_COLUMNS)
+        if new_file:
+            self._writer.writeheader()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self._file.flush()
+        return [row]
+
+    def close(self):
+        self._file.close()
+        return []
+
+
+class ParquetSink:
+    """Writes rows to numbered part files under a directory.
+
+    Parquet files cannot be appended to, so rows are buffered and flushed as a new
+    part every ``rows_per_part`` rows; a resumed run keeps adding parts. ``write``,
+    ``flush`` and ``close`` return the rows they wrote to disk (none while buffering),
+    so a ticker is only marked done once its row is in a part file.
+    """
+
+    def __init__(self, path, rows_per_part=500):
+        import pyarrow as pa
+
+        self._pa = pa
+        self.path = path
+        self.rows_per_part = rows_per_part
+        self._rows = []
+        os.makedirs(path, exist_ok=True)
+        self._part = len([name for name in os.listdir(path) if name.endswith('.parquet')])
+        self._schema = pa.schema(
+            [('ticker', pa.string()), ('fiscalDateEnding', pa.string())]
+            + [(name, pa.float64()) for name in METRIC_NAMES]
+        )
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.rows_per_part:
+            return self.flush()
+        return []
+
+    def flush(self):
+        if not self._rows:
+            return []
+        import pyarrow.parquet as pq
+
+        table = self._pa.Table.from_pylist(self._rows, schema=self._schema)
+        pq.write_table(table, os.path.join(self.path, f"part-{self._part:05d}.parquet"))
+        self._part += 1
+        written, self._rows = self._rows, []
+        return written
+
+    def close(self):
+        return self.flush()
+
+
+def open_sink(path):
+    if path.endswith('.parquet') or os.path.isdir(path):
+        return ParquetSink(path)
+    return CsvSink(path)
+
+
+def _fetch(ticker, api_key, base_url, rate_limiter):
+    return _check_payload(fetch_financial_data(ticker, api_key, base_url=base_url, rate_limiter=rate_limiter))
+
+
+def _check_payload(financial_data):
+    if financial_data is None:
+        raise RuntimeError("HTTP error from data provider")
+    for statement, data in financial_data.items():
+        if not is_statement_payload(data):
+            message = provider_message(data) or 'no report data'
+            raise RuntimeError(f"{STATEMENT_FUNCTIONS[statement]}: {message}")
+    return financial_data
+
+
+def run_batch(tickers, api_key, output, requests_per_minute=75, workers=4, fetch_concurrency=4,
+              base_url=ALPHA_VANTAGE_URL, progress_path=None, retry_failed=True, processing_pool=None,
+              on_row=None):
+    """Fetch and process ``tickers``, streaming metric rows to ``output``.
+
+    ``on_row`` is called with each row as it is written.
+
+    Returns a summary dict with counts of processed, skipped and failed tickers.
+    """
+    progress = ProgressLog(progress_path or output.rstrip('/') + '.progress')
+    unique = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    pending = [t for t in unique if t not in progress.done and (retry_failed or t not in progress.failed)]
+
+    rate_limiter = TokenBucket.per_minute(requests_per_minute, burst=len(STATEMENT_FUNCTIONS))
+    sink = open_sink(output)
+    fetch_pool = ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix="batch-fetch")
+    process_pool = processing_pool or ProcessPoolExecutor(max_workers=workers)
+    summary = {'processed': 0, 'skipped': len(unique) - len(pending), 'failed': 0}
+    started = time.monotonic()
+
+    # Keep a bounded window of fetches in flight so large universes don't queue thousands of futures
+    queue = iter(pending)
+    in_flight = {}
+
+    def submit_next():
+        ticker = next(queue, None)
+        if ticker is not None:
+            in_flight[fetch_pool.submit(_fetch, ticker, api_key, base_url, rate_limiter)] = ('fetch', ticker)
+
+    try:
+        for _ in range(fetch_concurrency * 2):
+            submit_next()
+        while in_flight:
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, ticker = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    progress.record(ticker, 'error', str(e))
+                    summary['failed'] += 1
+                    print(f"{ticker}: {e}", file=sys.stderr)
+                    if stage == 'fetch':
+                        submit_next()
+                    continue
+                if stage == 'fetch':
+                    in_flight[process_pool.submit(metrics_row, ticker, result)] = ('process', ticker)
+                    submit_next()
+                else:
+                    # Rows buffered by the sink are not on disk yet; their tickers are
+                    # recorded when the part holding them is written
+                    for row in sink.write(result):
+                        progress.record(row['ticker'], 'ok')
+                    if on_row is not None:
+                        on_row(result)
+                    summary['processed'] += 1
+    finally:
+        for row in sink.close():
+            progress.record(row['ticker'], 'ok')
+        progress.close()
+        fetch_pool.shutdown(wait=False, cancel_futures=True)
+        if processing_pool is None:
+            process_pool.shutdown(cancel_futures=True)
+
+    summary['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
+
+def run_warehouse_batch(tickers, api_key, output, warehouse, requests_per_minute=75, fetch_concurrency=4,
+                        base_url=ALPHA_VANTAGE_URL, on_row=None):
+    """Refresh the stale ``tickers`` in ``warehouse`` and write the latest metric row of each to ``output``.
+
+    Returns a summary dict with counts of refreshed, processed and failed tickers.
+    """
+    unique = list(dict.fromkeys(t.strip().upper() for t in tickers if t.strip()))
+    rate_limiter = TokenBucket.per_minute(requests_per_minute, burst=len(STATEMENT_FUNCTIONS))
+    summary = {'refreshed': 0, 'processed': 0, 'failed': 0}
+    started = time.monotonic()
+
+    def refresh(ticker):
+        return warehouse.refresh([ticker], lambda symbol: fetch_financial_data(
+            symbol, api_key, base_url=base_url, cache=False, rate_limiter=rate_limiter))
+
+    errors = {}
+    with ThreadPoolExecutor(max_workers=fetch_concurrency, thread_name_prefix="batch-fetch") as fetch_pool:
+        for fetched in fetch_pool.map(refresh, unique):
+            for ticker, financial_data in fetched.items():
+                try:
+                    _check_payload(financial_data)
+                    summary['refreshed'] += 1
+                except RuntimeError as e:
+                    errors[ticker] = str(e)
+
+    metrics = warehouse.metrics_table(unique)
+    latest = metrics.groupby(level='ticker').tail(1) if len(metrics) else metrics
+    sink = open_sink(output)
+    try:
+        for (ticker, period), values in latest.iterrows():
+            row = {'ticker': ticker, 'fiscalDateEnding': period.strftime('%Y-%m-%d')}
+            row.update({name: float(values[name]) if pd.notna(values[name]) else None for name in METRIC_NAMES})
+            sink.write(row)
+            if on_row is not None:
+                on_row(row)
+            summary['processed'] += 1
+    finally:
+        sink.close()
+
+    # A refusal only fails a ticker that has no stored history to fall back on
+    stored = set(latest.index.get_level_values('ticker'))
+    for ticker in unique:
+        if ticker not in stored:
+            summary['failed'] += 1
+            print(f"{ticker}: {errors.get(ticker, 'no statements stored')}", file=sys.stderr)
+        elif ticker in errors:
+            print(f"{ticker}: {errors[ticker]} (using stored statements)", file=sys.stderr)
+
+    summary['elapsed_seconds'] = round(time.monotonic() - started, 3)
+    return summary
+
+
+def write_insights(rows, openai_api_key, path, concurrency=8, tokens_per_minute=None):
+    """Generate AI insights for metric rows, appending ``{"ticker", "insights"}`` JSON lines as each completes."""
+    metrics_by_ticker = {
+        row['ticker']: pd.DataFrame([(name, row[name]) for name in METRIC_NAMES if row.get(name) is not None],
+                                    columns=['Metric', 'Value'])
+        for row in rows
+    }
+    written = 0
+    with open(path, 'a') as f:
+        for ticker, insights in generate_insights_bulk(metrics_by_ticker, openai_api_key, concurrency=concurrency,
+                                                       tokens_per_minute=tokens_per_minute):
+            f.write(json.dumps({'ticker': ticker, 'insights': insights}) + '\n')
+            f.flush()
+            written += 1
+    return written
+
+
+def read_tickers(path):
+    with open(path) as f:
+        return [line.split('#')[0].strip() for line in f if line.split('#')[0].strip()]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compute financial metrics for a list of tickers.")
+    parser.add_argument('tickers', help="file with one ticker per line")
+    parser.add_argument('-o', '--output', required=True, help="output .csv file or .parquet directory")
+    parser.add_argument('--api-key', default=os.environ.get('ALPHA_VANTAGE_API_KEY'))
+    parser.add_argument('--rpm', type=float, default=75, help="provider requests per minute")
+    parser.add_argument('--workers', type=int, default=4, help="metric processing workers")
+    parser.add_argument('--fetch-concurrency', type=int, default=4)
+    parser.add_argument('--base-url', default=ALPHA_VANTAGE_URL)
+    parser.add_argument('--progress', help="progress file (default: <output>.progress)")
+    parser.add_argument('--skip-failed', action='store_true', help="do not retry tickers that failed previously")
+    parser.add_argument('--insights', help="also write AI insights for processed tickers to this .jsonl file")
+    parser.add_argument('--openai-api-key', default=os.environ.get('OPENAI_API_KEY'))
+    parser.add_argument('--insights-concurrency', type=int, default=8, help="concurrent insight requests")
+    parser.add_argument('--insights-tpm', type=int, help="OpenAI tokens-per-minute budget for insights")
+    parser.add_argument('--warehouse', help="keep statement history in this warehouse directory and only "
+                                            "fetch stale tickers")
+    args = parser.parse_args(argv)
+
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or ALPHA_VANTAGE_API_KEY)")
+    if args.insights and not args.openai_api_key:
+        parser.error("--insights needs an OpenAI key (--openai-api-key or OPENAI_API_KEY)")
+
+    rows = []
+
+    if args.warehouse:
+        from statement_warehouse import StatementWarehouse
+
+        summary = run_warehouse_batch(
+            read_tickers(args.tickers),
+            args.api_key,
+            args.output,
+            StatementWarehouse(args.warehouse),
+            requests_per_minute=args.rpm,
+            fetch_concurrency=args.fetch_concurrency,
+            base_url=args.base_url,
+            on_row=rows.append if args.insights else None,
+        )
+    else:
+        summary = run_batch(
+            read_tickers(args.tickers),
+            args.api_key,
+            args.output,
+            requests_per_minute=args.rpm,
+            workers=args.workers,
+            fetch_concurrency=args.fetch_concurrency,
+            base_url=args.base_url,
+            progress_path=args.progress,
+            retry_failed=not args.skip_failed,
+            on_row=rows.append if args.insights else None,
+        )
+    if args.insights:
+        summary['insights'] = write_insights(rows, args.openai_api_key, args.insights,
+                                             concurrency=args.insights_concurrency,
+                                             tokens_per_minute=args.insights_tpm)
+    print(json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()
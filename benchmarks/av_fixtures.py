@@ -0,0 +1,95 @@
+"""Recorded Alpha Vantage responses served by ``StubAlphaVantage`` in the offline benchmarks.
+
+Each fixture is ``fixtures/alpha_vantage/<SYMBOL>.json``, mapping the function name
+(``INCOME_STATEMENT``, ``BALANCE_SHEET``, ``CASH_FLOW``) to the response body exactly
+as the API returned it. The checked-in set follows the live schema (full field lists,
+``"None"`` for unreported values, annual and quarterly reports, fiscal years ending in
+other months, a non-USD filer, a bank without current assets) with synthetic figures, plus
+the bodies Alpha Vantage answers with status 200 when it refuses a call:
+``RATE_LIMITED`` (``Note``), ``DAILY_LIMIT`` (``Information``), ``INVALID``
+(``Error Message``) and ``UNKNOWN`` (empty object).
+
+Replace or extend them with live recordings (the free tier allows 5 calls a minute):
+
+    python benchmarks/av_fixtures.py record IBM MSFT --api-key $ALPHA_VANTAGE_API_KEY
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from data_processing import ALPHA_VANTAGE_URL, STATEMENT_FUNCTIONS, is_statement_payload  # noqa: E402
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "alpha_vantage")
+
+
+def load_fixtures(directory=FIXTURE_DIR):
+    """Return ``{symbol: {function: response body}}`` for every fixture file."""
+    fixtures = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".json"):
+            with open(os.path.join(directory, filename)) as f:
+                fixtures[filename[:-len(".json")]] = json.load(f)
+    return fixtures
+
+
+def statement_symbols(fixtures):
+    return [symbol for symbol, responses in fixtures.items()
+            if all(is_statement_payload(body) for body in responses.values())]
+
+
+def as_financial_data(responses):
+    """Map a fixture's responses to the ``fetch_financial_data`` result shape."""
+    return {statement: responses[function] for statement, function in STATEMENT_FUNCTIONS.items()}
+
+
+def record(symbols, api_key, directory=FIXTURE_DIR, base_url=ALPHA_VANTAGE_URL, pause=12.5):
+    """Fetch and save the three statements of each symbol, ``pause`` seconds apart."""
+    os.makedirs(directory, exist_ok=True)
+    for symbol in symbols:
+        responses = {}
+        for function in STATEMENT_FUNCTIONS.values():
+            if responses:
+                time.sleep(pause)
+            response = requests.get(base_url, params={"function": function, "symbol": symbol, "apikey": api_key},
+                                    timeout=30)
+            response.raise_for_status()
+            body = response.json()
+            if 'Note' in body or 'Information' in body:
+                raise RuntimeError(f"{symbol} {function}: {body.get('Note') or body.get('Information')}")
+            responses[function] = body
+        path = os.path.join(directory, f"{symbol.upper()}.json")
+        with open(path, "w") as f:
+            json.dump(responses, f, indent=1)
+        print(f"recorded {path}")
+        time.sleep(pause)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    record_parser = subparsers.add_parser("record", help="record live responses for the given symbols")
+    record_parser.add_argument("symbols", nargs="+")
+    record_parser.add_argument("--api-key", default=os.environ.get("ALPHA_VANTAGE_API_KEY"))
+    record_parser.add_argument("--pause", type=float, default=12.5, help="seconds between calls")
+    subparsers.add_parser("list", help="list the available fixtures")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        if not args.api_key:
+            parser.error("--api-key or ALPHA_VANTAGE_API_KEY is required")
+        record(args.symbols, args.api_key, pause=args.pause)
+    else:
+        fixtures = load_fixtures()
+        for symbol, responses in fixtures.items():
+            kind = "statements" if symbol in statement_symbols(fixtures) else "refusal"
+            print(f"{symbol:>14}: {kind}, {', '.join(responses)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Corpus vector search: exact flat index vs. IVF / HNSW / PQ / SQ8 approximate indexes.
+
+Runs fully offline on synthetic clustered vectors (chunks of many reports cluster by
+topic, so uniform random vectors would flatter IVF less than real data and HNSW more).
+For every index type it reports build/train time, index size, recall@k against exact
+search and single-query p50/p99 latency, sweeping ``nprobe`` (IVF) and ``efSearch`` (HNSW).
+``ivf_pq`` results are re-ranked against the exact vectors as the corpus does (``refine``).
+
+    python benchmarks/bench_ann.py --vectors 200000 --dim 384 --queries 500
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from vector_index import IndexConfig, build_index, index_memory_bytes, refine  # noqa: E402
+
+
+def clustered_vectors(count, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, count)
+    vectors = centers[labels] + 0.35 * rng.standard_normal((count, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(f[f >= 0]) & set(t)) / k for f, t in zip(found, truth)])
+
+
+def latencies(index, queries, k, config, vectors):
+    timings = []
+    results = []
+    params = config.search_parameters()
+    for query in queries:
+        start = time.perf_counter()
+        _, ids = index.search(query[None, :], k * config.refine_factor if config.refines else k, params=params)
+        found = refine(query, ids[0], vectors, k)[0] if config.refines else ids[0]
+        timings.append(time.perf_counter() - start)
+        results.append(np.pad(found, (0, k - len(found)), constant_values=-1))
+    timings = np.array(timings) * 1000
+    return np.array(results), np.percentile(timings, 50), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--nlist", type=int, default=1024)
+    parser.add_argument("--kinds", default="flat,ivf_flat,ivf_sq8,ivf_pq,hnsw")
+    args = parser.parse_args()
+
+    data = clustered_vectors(args.vectors, args.dim, clusters=args.nlist // 2)
+    queries = clustered_vectors(args.queries, args.dim, clusters=args.nlist // 2, seed=0)[::-1].copy()
+    queries += 0.05 * np.random.default_rng(1).standard_normal(queries.shape).astype(np.float32)
+
+    exact = build_index(IndexConfig('flat'), args.dim)
+    exact.add(data)
+    _, truth = exact.search(queries, args.k)
+
+    print(f"{args.vectors} x {args.dim} vectors, {args.queries} queries, recall@{args.k}\n")
+    print(f"{'index':<26} {'build s':>8} {'size MiB':>9} {'recall':>7} {'p50 ms':>7} {'p99 ms':>7}")
+    for kind in args.kinds.split(","):
+        config = IndexConfig(kind, nlist=args.nlist)
+        start = time.perf_counter()
+        training = data[::max(1, len(data) // (config.nlist * 256))] if config.needs_training else None
+        index = build_index(config, args.dim, training)
+        index.add(data)
+        build = time.perf_counter() - start
+        size = index_memory_bytes(index) / 2 ** 20
+
+        if config.needs_training:
+            sweep = [('nprobe', value) for value in (1, 4, 16, 64)]
+        elif kind == 'hnsw':
+            sweep = [('ef_search', value) for value in (16, 64, 256)]
+        else:
+            sweep = [(None, None)]
+        for knob, value in sweep:
+            if knob:
+                setattr(config, knob, value)
+            found, p50, p99 = latencies(index, queries, args.k, config, data)
+            label = f"{kind} {knob}={value}" if knob else kind
+            print(f"{label:<26} {build:8.2f} {size:9.1f} {recall_at_k(found, truth):7.3f} {p50:7.3f} {p99:7.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Financial Data page chart cost: eager plotly.express figures vs. the lazy graph_objects ChartSet.
+
+Runs offline on stub statement payloads. Reports the time to get the metrics table
+alone, to build and serialize all six charts, and the JSON bytes shipped to the
+browser, for a first load and for a repeat load of the same dataset.
+
+    python benchmarks/bench_charts.py --years 20 --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import plotly.express as px
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import make_statement_payload  # noqa: E402
+from chart_generation import figure_json_cache  # noqa: E402
+from data_processing import STATEMENT_FUNCTIONS, process_financial_data  # noqa: E402
+from statement_model import FinancialStatements  # noqa: E402
+
+
+def express_charts(statements):
+    """The previous eager plotly.express construction of the six charts."""
+    revenue = statements.income['totalRevenue']
+    latest = statements.latest('balance_sheet')
+    income = statements.income
+    debt = statements.fields({'balance_sheet': ['shortLongTermDebtTotal'], 'income_statement': ['ebitda']}).dropna()
+    roic = statements.fields({'income_statement': ['ebit'],
+                              'balance_sheet': ['totalShareholderEquity', 'shortLongTermDebtTotal']}).dropna()
+    cash_flow = statements.cash_flow
+    fcf = cash_flow['operatingCashflow'] - cash_flow['capitalExpenditures']
+    return [
+        px.bar(x=revenue.index, y=revenue.values, title='Historical Revenue'),
+        px.pie(names=['Current Assets', 'Non-Current Assets'],
+               values=[latest['totalCurrentAssets'], latest['totalNonCurrentAssets']], hole=0.5),
+        px.line(x=income.index, y=income['grossProfit'] / income['totalRevenue'] * 100),
+        px.line(x=debt.index, y=(debt['shortLongTermDebtTotal'] / debt['ebitda']).values),
+        px.bar(x=fcf.index, y=fcf.values),
+        px.line(x=roic.index, y=(roic['ebit'] / (roic['totalShareholderEquity'] + roic['shortLongTermDebtTotal'])).values),
+    ]
+
+
+def timed(fn, runs):
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return result, statistics.median(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = [{statement: make_statement_payload(function, f"T{i}", years=args.years)
+                 for statement, function in STATEMENT_FUNCTIONS.items()} for i in range(args.runs)]
+    statements = FinancialStatements.from_raw(payloads[0])
+    express_charts(statements)  # warm up plotly.express
+
+    payloads_iter = iter(payloads)
+    _, metrics_ms = timed(lambda: process_financial_data(next(payloads_iter)), args.runs)
+    figures, express_ms = timed(lambda: [fig.to_json() for fig in express_charts(statements)], args.runs)
+
+    sets = iter([process_financial_data(payload)[1] for payload in payloads])
+    lazy, lazy_ms = timed(lambda: next(sets).to_json_list(), args.runs)
+    _, repeat_ms = timed(lambda: process_financial_data(payloads[0])[1].to_json_list(), args.runs)
+
+    print(f"{'metrics table only (charts deferred):':<40} {metrics_ms:8.1f} ms")
+    print(f"{'eager plotly.express, 6 charts:':<40} {express_ms:8.1f} ms  {sum(map(len, figures)):7d} bytes")
+    print(f"{'lazy graph_objects, 6 charts:':<40} {lazy_ms:8.1f} ms  {sum(map(len, lazy)):7d} bytes")
+    print(f"{'lazy, same dataset again (cached JSON):':<40} {repeat_ms:8.1f} ms")
+    print(f"figure JSON cache: {figure_json_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
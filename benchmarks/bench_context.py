@@ -0,0 +1,124 @@
+"""QA prompt context: raw top-k chunks vs. the token-budgeted packed context.
+
+Fixture reports come from ``synthetic_pdf.make_qa_report_pdf`` and are indexed as in
+``bench_retrieval`` (table-aware chunks, ``HashingEmbeddings``, hybrid retrieval). For
+every question the raw context is the top ``RETRIEVAL_K`` chunks as they used to be
+stuffed into the prompt; the packed context is ``CONTEXT_CANDIDATES`` chunks passed
+through ``context_packing.build_context`` at each budget. The table reports context
+tokens, the share of questions whose answer (every required string) is in the context,
+packing time, and the first-token latency of a streamed answer from the local fake
+OpenAI server, which charges prefill time per prompt token.
+
+Token counts are exact when tiktoken's encoding can be loaded, otherwise estimated
+(noted in the output).
+
+    python benchmarks/bench_context.py --reports 3 --pages 60 --budgets 600 800 1000
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.bench_retrieval import build  # noqa: E402
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+from benchmarks.synthetic_pdf import make_qa_report_pdf  # noqa: E402
+from context_packing import ContextMetrics, build_context, get_token_counter  # noqa: E402
+from report_analysis import CONTEXT_CANDIDATES, HYBRID_CANDIDATES, RETRIEVAL_K, make_splitter  # noqa: E402
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def retrieve(corpus, reports):
+    """Return ``(question, candidate documents, candidate vectors)`` for every question."""
+    vectors = corpus.archived_vectors()
+    results = []
+    for key, (_, questions) in reports.items():
+        for question in questions:
+            query_vector = corpus.embeddings.embed_query(question["question"])
+            ids, _ = corpus.hybrid_search_ids(question["question"], query_vector, k=CONTEXT_CANDIDATES,
+                                              filters={"report_key": key}, candidates=HYBRID_CANDIDATES)
+            results.append((question, corpus.documents(ids), vectors[[int(i) for i in ids]]))
+    return results
+
+
+def first_token_seconds(llm, prompt_template, docs, question):
+    prompt = prompt_template.format(context="\n\n".join(doc.page_content for doc in docs), question=question)
+    start, first = time.perf_counter(), None
+    for _ in llm.stream(prompt):
+        first = first or time.perf_counter() - start
+    return first
+
+
+def evaluate(results, counter, budget, llm, prompt_template, latency_runs):
+    tokens, hits, pack_ms, ttft = [], [], [], []
+    metrics = ContextMetrics()
+    for number, (question, candidates, vectors) in enumerate(results):
+        if budget is None:
+            start = time.perf_counter()
+            docs = candidates[:RETRIEVAL_K]
+            pack_ms.append((time.perf_counter() - start) * 1000)
+            tokens.append(sum(counter.count(doc.page_content) for doc in docs))
+        else:
+            start = time.perf_counter()
+            packed = build_context(candidates, vectors, budget, counter=counter, baseline_k=RETRIEVAL_K,
+                                   metrics=metrics)
+            pack_ms.append((time.perf_counter() - start) * 1000)
+            docs = packed.documents
+            tokens.append(packed.tokens)
+        context = _normalize("\n".join(doc.page_content for doc in docs))
+        hits.append(all(part in context for part in question["required"]))
+        if number < latency_runs:
+            ttft.append(first_token_seconds(llm, prompt_template, docs, question["question"]))
+    return {
+        "tokens": statistics.mean(tokens),
+        "tokens_max": max(tokens),
+        "hit": sum(hits) / len(hits),
+        "pack_ms": statistics.median(pack_ms),
+        "ttft": statistics.median(ttft),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--budgets", type=int, nargs="+", default=[600, 800, 1000])
+    parser.add_argument("--prefill", type=float, default=5000.0, help="fake server prompt tokens per second")
+    parser.add_argument("--latency-runs", type=int, default=10, help="questions streamed per row")
+    args = parser.parse_args()
+
+    reports = {f"report-{number}": make_qa_report_pdf(args.pages, seed=number, company=f"Company {number}")
+               for number in range(args.reports)}
+    counter = get_token_counter()
+    fake = FakeOpenAI(first_token_latency=0.05, tokens_per_second=1000, prompt_tokens_per_second=args.prefill)
+    with tempfile.TemporaryDirectory() as root, fake:
+        os.environ["OPENAI_API_BASE"] = fake.url
+        from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR
+        from llm_clients import get_completion_llm
+
+        llm = get_completion_llm("sk-fake")
+        prompt_template = PROMPT_SELECTOR.get_prompt(llm)
+        corpus, _ = build(root, reports, make_splitter)
+        results = retrieve(corpus, reports)
+
+        print(f"{args.reports} reports x {args.pages} pages, {len(results)} questions, "
+              f"{'exact' if counter.exact else 'estimated (4 characters per token)'} token counts, "
+              f"fake prefill {args.prefill:.0f} tokens/s")
+        print()
+        print("| context | tokens mean | tokens max | answer in context | pack ms | first token s |")
+        print("|---|---:|---:|---:|---:|---:|")
+        for budget in [None] + args.budgets:
+            name = f"raw top {RETRIEVAL_K}" if budget is None else f"packed {CONTEXT_CANDIDATES} -> {budget}"
+            result = evaluate(results, counter, budget, llm, prompt_template, args.latency_runs)
+            print(f"| {name} | {result['tokens']:.0f} | {result['tokens_max']} | {result['hit']:.0%} | "
+                  f"{result['pack_ms']:.2f} | {result['ttft']:.3f} |")
+
+
+if __name__ == "__main__":
+    main()
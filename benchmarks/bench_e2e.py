@@ -0,0 +1,293 @@
+"""Offline end-to-end benchmark suite, compared against a stored baseline.
+
+Every stage runs in a fresh subprocess with its own temporary caches and indexes,
+against local stand-ins only: ``StubAlphaVantage`` serving the recorded fixtures
+(``av_fixtures``), a synthetic annual-report PDF, ``HashingEmbeddings`` and the
+``FakeOpenAI`` server.
+
+    fetch    fetch_financial_data latency (statement cache off)
+    process  process_financial_data throughput and chart serialization time
+    ingest   PDF extraction + splitting pages/sec
+    index    corpus index build time and retrieval latency
+    answer   question answering and first-token latency with the fake LLM
+
+    python benchmarks/bench_e2e.py                    # run, compare with benchmarks/baseline.json
+    python benchmarks/bench_e2e.py --update-baseline  # run and store the result as the new baseline
+    python benchmarks/bench_e2e.py --stages fetch process
+
+Metrics ending in ``_per_second`` are better when higher, all others (latencies,
+seconds, ``peak_rss_mb``) when lower. A metric more than ``--tolerance`` worse than
+its baseline (twice that for the noisier p95 latencies) is reported as a regression
+and the exit status is 1.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BASELINE_PATH = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+STAGES = ['fetch', 'process', 'ingest', 'index', 'answer']
+
+QUESTIONS = [
+    "What drove the change in gross margin?",
+    "How much long-term debt does the company carry?",
+    "What are the main liquidity risks?",
+    "How did operating income develop across segments?",
+    "What is the dividend policy?",
+    "Which currency exposures are disclosed?",
+    "How is deferred revenue recognized?",
+    "What capital expenditures are planned?",
+]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def latency_metrics(prefix, seconds):
+    return {f"{prefix}_p50_ms": percentile(seconds, 0.5) * 1000, f"{prefix}_p95_ms": percentile(seconds, 0.95) * 1000}
+
+
+def _timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def _report_chunks(pages):
+    from benchmarks.synthetic_pdf import make_report_pdf
+    from pdf_ingest import iter_chunks, iter_pdf_pages
+    from report_analysis import make_splitter
+
+    splitter = make_splitter()
+    pdf_bytes = make_report_pdf(pages)
+    seconds, chunks = _timed(lambda: list(iter_chunks(iter_pdf_pages(pdf_bytes, name="report.pdf"), splitter)))
+    return seconds, chunks
+
+
+def _build_corpus(chunks, reports):
+    """Index ``reports`` copies of the chunks, one report per ticker, as the Document Analysis page would."""
+    from corpus_index import CorpusIndex
+    from embedding_cache import HashingEmbeddings
+
+    embeddings = HashingEmbeddings()
+    corpus = CorpusIndex(embeddings, root=os.path.join(os.environ["BENCH_TMP"], "corpus"))
+    texts = [chunk.page_content for chunk in chunks]
+    metadatas = [chunk.metadata for chunk in chunks]
+    start = time.perf_counter()
+    for number in range(reports):
+        # Distinct text per report so the copies do not embed to identical vectors
+        report_texts = [f"R{number} {text}" for text in texts]
+        corpus.add_report(f"report-{number}", report_texts, embeddings.embed_documents(report_texts), metadatas,
+                          ticker=f"T{number:03d}", fiscal_year=2024, persist=False)
+    corpus.save()
+    return time.perf_counter() - start, corpus
+
+
+def stage_fetch(args):
+    from benchmarks.av_fixtures import load_fixtures, statement_symbols
+    from benchmarks.stub_server import StubAlphaVantage
+    from data_processing import fetch_financial_data
+
+    fixtures = load_fixtures()
+    symbols = statement_symbols(fixtures)
+    with StubAlphaVantage(latency=args.latency, fixtures=fixtures) as stub:
+        fetch_financial_data(symbols[0], "demo", stub.url, cache=False)  # warm the connection pool
+        timings = []
+        for i in range(args.fetches):
+            seconds, data = _timed(fetch_financial_data, symbols[i % len(symbols)], "demo", stub.url, cache=False)
+            assert data is not None
+            timings.append(seconds)
+    return latency_metrics("fetch", timings)
+
+
+def stage_process(args):
+    from benchmarks.av_fixtures import as_financial_data, load_fixtures, statement_symbols
+    from chart_generation import ChartSet
+    from data_processing import process_financial_data
+    from statement_model import FinancialStatements
+
+    fixtures = load_fixtures()
+    symbols = statement_symbols(fixtures)
+    payloads = [as_financial_data(fixtures[symbol]) for symbol in symbols]
+    refusals = [as_financial_data(responses) for symbol, responses in fixtures.items() if symbol not in symbols]
+
+    # Metrics tables only: charts stay unbuilt until serialized below
+    start = time.perf_counter()
+    for i in range(args.iterations):
+        metrics_df, _ = process_financial_data(payloads[i % len(payloads)])
+        assert 'Error' not in metrics_df.columns
+    elapsed = time.perf_counter() - start
+    for payload in refusals:
+        metrics_df, _ = process_financial_data(payload)
+        assert 'Error' in metrics_df.columns
+
+    # No dataset version, so every figure is built and serialized rather than served from the JSON cache
+    statements = [FinancialStatements.from_raw(payload) for payload in payloads]
+    chart_timings = [_timed(ChartSet(statements[i % len(statements)]).to_json_list)[0]
+                     for i in range(3 * len(statements))]
+    return {
+        "process_per_second": args.iterations / elapsed,
+        "charts_ms": statistics.median(chart_timings) * 1000,
+    }
+
+
+def stage_ingest(args):
+    seconds, chunks = _report_chunks(args.pages)
+    return {"ingest_pages_per_second": args.pages / seconds, "ingest_chunks": len(chunks)}
+
+
+def stage_index(args):
+    _, chunks = _report_chunks(args.pages)
+    build_seconds, corpus = _build_corpus(chunks, args.reports)
+    timings, filtered = [], []
+    for i in range(args.queries):
+        question = QUESTIONS[i % len(QUESTIONS)]
+        timings.append(_timed(corpus.similarity_search, question, k=4)[0])
+        filtered.append(_timed(corpus.similarity_search, question, k=4,
+                               filters={"ticker": f"T{i % args.reports:03d}"})[0])
+    return {
+        "index_build_seconds": build_seconds,
+        "index_chunks": len(corpus),
+        **latency_metrics("query", timings),
+        **latency_metrics("filtered_query", filtered),
+    }
+
+
+def stage_answer(args):
+    from benchmarks.fake_openai import FakeOpenAI
+
+    _, chunks = _report_chunks(args.pages)
+    _, corpus = _build_corpus(chunks, 1)
+    with FakeOpenAI(first_token_latency=0, tokens_per_second=100_000) as fake:
+        os.environ["OPENAI_BASE_URL"] = os.environ["OPENAI_API_BASE"] = fake.url
+        from report_analysis import answer_question_from_report, stream_answer_from_report
+
+        answer_question_from_report(QUESTIONS[0], corpus, "sk-bench", cache=False)  # build the shared chain
+        answers, first_tokens = [], []
+        for i in range(args.queries):
+            question = QUESTIONS[i % len(QUESTIONS)]
+            answers.append(_timed(answer_question_from_report, question, corpus, "sk-bench", cache=False)[0])
+            start = time.perf_counter()
+            tokens, _ = stream_answer_from_report(question, corpus, "sk-bench", cache=False)
+            next(iter(tokens))
+            first_tokens.append(time.perf_counter() - start)
+            for _ in tokens:
+                pass
+    return {**latency_metrics("answer", answers), **latency_metrics("first_token", first_tokens)}
+
+
+def run_stage(stage, args):
+    metrics = globals()[f"stage_{stage}"](args)
+    metrics["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {f"{stage}.{name}": round(value, 3) for name, value in metrics.items()}
+
+
+def run_suite(args):
+    stage_args = ["--latency", str(args.latency), "--fetches", str(args.fetches),
+                  "--iterations", str(args.iterations), "--pages", str(args.pages),
+                  "--reports", str(args.reports), "--queries", str(args.queries)]
+    metrics = {}
+    for stage in args.stages:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ,
+                "BENCH_TMP": tmp,
+                "EMBEDDING_BACKEND": "local",
+                "STATEMENT_CACHE_PATH": os.path.join(tmp, "statements.sqlite"),
+                "EMBEDDING_CACHE_PATH": os.path.join(tmp, "embeddings"),
+                "REPORT_INDEX_PATH": os.path.join(tmp, "indexes"),
+                "CORPUS_INDEX_PATH": os.path.join(tmp, "corpus"),
+            }
+            result = subprocess.run([sys.executable, __file__, "--stage", stage, *stage_args],
+                                    capture_output=True, text=True, cwd=ROOT, env=env)
+        if result.returncode != 0:
+            raise RuntimeError(f"stage {stage} failed:\n{result.stderr[-3000:]}")
+        metrics.update(json.loads(result.stdout.strip().splitlines()[-1]))
+        print(f"  {stage} done", file=sys.stderr)
+    return metrics
+
+
+def higher_is_better(name):
+    return name.endswith("_per_second")
+
+
+def compare(metrics, baseline, tolerance):
+    """Print each metric next to its baseline; return the names of the regressed metrics."""
+    regressions = []
+    print("| metric | baseline | current | change | |")
+    print("|---|---:|---:|---:|---|")
+    for name, value in metrics.items():
+        reference = baseline.get(name)
+        if reference is None or name.endswith("_chunks"):
+            print(f"| {name} | {'-' if reference is None else reference} | {value} | | |")
+            continue
+        change = (value - reference) / reference if reference else 0.0
+        worse = -change if higher_is_better(name) else change
+        allowed = 2 * tolerance if "_p95_" in name else tolerance
+        status = "REGRESSION" if worse > allowed else ("improved" if worse < -allowed else "ok")
+        if status == "REGRESSION":
+            regressions.append(name)
+        print(f"| {name} | {reference} | {value} | {change:+.0%} | {status} |")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true", help="store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed relative slowdown (0.3 = 30%%)")
+    parser.add_argument("--latency", type=float, default=0.02, help="stub server delay per request (s)")
+    parser.add_argument("--fetches", type=int, default=40)
+    parser.add_argument("--iterations", type=int, default=200, help="process_financial_data calls")
+    parser.add_argument("--pages", type=int, default=120, help="pages of the synthetic report")
+    parser.add_argument("--reports", type=int, default=20, help="report copies in the benchmark corpus")
+    parser.add_argument("--queries", type=int, default=40)
+    parser.add_argument("--stage", choices=STAGES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.stage:
+        print(json.dumps(run_stage(args.stage, args)))
+        return
+
+    params = {name: getattr(args, name) for name in ['latency', 'fetches', 'iterations', 'pages', 'reports', 'queries']}
+    metrics = run_suite(args)
+
+    if args.update_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump({"python": platform.python_version(), "machine": platform.machine(), "params": params,
+                       "metrics": metrics}, f, indent=2)
+            f.write("\n")
+        print(f"baseline written to {args.baseline}")
+        return
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            stored = json.load(f)
+        baseline = stored["metrics"]
+        if stored.get("params") != params:
+            print(f"warning: baseline was recorded with {stored.get('params')}, this run uses {params}")
+    else:
+        print(f"no baseline at {args.baseline}; run with --update-baseline to create one")
+    regressions = compare(metrics, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
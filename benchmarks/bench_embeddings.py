@@ -0,0 +1,81 @@
+"""Report ingestion embedding cost: uncached per-chunk calls vs. the cached, batched layer.
+
+Runs fully offline. The backend is ``HashingEmbeddings`` behind a simulated per-request
+and per-text latency, standing in for a remote embedding API. Three synthetic "annual reports"
+share most of their boilerplate pages, as filings from consecutive years do.
+
+    python benchmarks/bench_embeddings.py --chunks 600 --latency 0.05
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import CachedEmbeddings, HashingEmbeddings  # noqa: E402
+
+
+class SlowBackend(HashingEmbeddings):
+    """Adds a round-trip latency plus a per-text server-side cost to every request."""
+
+    def __init__(self, latency, per_text):
+        super().__init__()
+        self.latency = latency
+        self.per_text = per_text
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        time.sleep(self.latency + self.per_text * len(texts))
+        return super().embed_documents(texts)
+
+
+def synthetic_reports(chunks, years=3, boilerplate=0.7, seed=7):
+    rng = random.Random(seed)
+    words = [f"term{i}" for i in range(2000)]
+    shared = [" ".join(rng.choices(words, k=150)) for _ in range(int(chunks * boilerplate))]
+    return [shared + [" ".join(rng.choices(words, k=150)) for _ in range(chunks - len(shared))]
+            for _ in range(years)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chunks", type=int, default=600, help="chunks per report")
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per embedding request")
+    parser.add_argument("--per-text", type=float, default=0.002, help="server-side seconds per text")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    reports = synthetic_reports(args.chunks)
+
+    # Baseline: no cache, one sequential request per 1,000 texts (langchain's default chunking)
+    backend = SlowBackend(args.latency, args.per_text)
+    start = time.perf_counter()
+    for texts in reports:
+        for i in range(0, len(texts), 1000):
+            backend.embed_documents(texts[i:i + 1000])
+    print(f"{'uncached, sequential:':<22} {time.perf_counter() - start:6.2f} s, {backend.calls} requests, "
+          f"{sum(map(len, reports))} texts embedded")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = SlowBackend(args.latency, args.per_text)
+        embeddings = CachedEmbeddings(backend, cache_root=tmp, batch_size=args.batch_size,
+                                      max_concurrency=args.concurrency)
+        for year, texts in enumerate(reports, 1):
+            start = time.perf_counter()
+            embeddings.embed_documents(texts)
+            print(f"{f'cached, report {year}:':<22} {time.perf_counter() - start:6.2f} s  {embeddings.stats()}")
+
+        start = time.perf_counter()
+        embeddings.embed_documents(reports[0])
+        print(f"{'cached, re-ingest:':<22} {time.perf_counter() - start:6.2f} s  {embeddings.stats()}")
+        size = os.path.getsize(os.path.join(embeddings.cache.directory, "vectors.f32"))
+        print(f"cache size: {size / 1024:.0f} KiB for {len(embeddings.cache)} vectors")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Wall-clock latency per ticker for fetch_financial_data against a local stub server.
+
+Compares the previous behaviour (three sequential ``requests.get`` calls, each on a
+fresh connection) with the pooled, concurrent fetch layer and with repeat loads
+served from the statement cache.
+
+    python benchmarks/bench_fetch.py --tickers 20 --latency 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubAlphaVantage  # noqa: E402
+from data_processing import STATEMENT_FUNCTIONS, fetch_financial_data  # noqa: E402
+from statement_cache import StatementCache  # noqa: E402
+
+
+def fetch_sequential(ticker, api_key, base_url, cache=False):
+    financial_data = {}
+    for statement, function in STATEMENT_FUNCTIONS.items():
+        response = requests.get(base_url, params={"function": function, "symbol": ticker, "apikey": api_key})
+        if response.status_code != 200:
+            return None
+        financial_data[statement] = response.json()
+    return financial_data
+
+
+def measure(fetch, tickers, base_url, cache=False):
+    timings = []
+    for ticker in tickers:
+        start = time.perf_counter()
+        data = fetch(ticker, "demo", base_url, cache=cache)
+        timings.append(time.perf_counter() - start)
+        assert data is not None and set(data) == set(STATEMENT_FUNCTIONS)
+    return timings
+
+
+def report(name, timings, stub):
+    p95 = sorted(timings)[max(0, int(len(timings) * 0.95) - 1)]
+    print(f"{name:>18}: mean {statistics.mean(timings) * 1000:7.1f} ms/ticker, "
+          f"p95 {p95 * 1000:7.1f} ms, connections opened {stub.connections}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.05, help="server-side delay per request (s)")
+    args = parser.parse_args()
+
+    tickers = [f"T{i:04d}" for i in range(args.tickers)]
+    with StubAlphaVantage(latency=args.latency) as stub:
+        for name, fetch in [("sequential", fetch_sequential), ("pooled+concurrent", fetch_financial_data)]:
+            stub.connections = 0
+            timings = measure(fetch, tickers, stub.url)
+            report(name, timings, stub)
+
+        # Warm a throwaway statement cache, then measure repeat loads served from it
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = StatementCache(path=os.path.join(tmp, "statements.sqlite"))
+            measure(fetch_financial_data, tickers, stub.url, cache)
+            stub.connections = 0
+            timings = measure(fetch_financial_data, tickers, stub.url, cache)
+            report("cached", timings, stub)
+            print(f"{'':>18}  cache {cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
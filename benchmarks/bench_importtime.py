@@ -0,0 +1,115 @@
+"""Cold-start cost of the app: import time, first-page render latency and worker memory.
+
+Every measurement runs in a fresh interpreter. ``-X importtime`` output is aggregated
+per top-level package to show where import time goes, and the first page (API Keys)
+is rendered headlessly with ``streamlit.testing.v1.AppTest``.
+
+    python benchmarks/bench_importtime.py --runs 3
+    python benchmarks/bench_importtime.py --root /path/to/other/checkout   # compare a revision
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['app', 'data_processing', 'report_analysis']
+
+HEAVY_PACKAGES = ('langchain', 'langchain_core', 'langchain_community', 'faiss', 'openai', 'pymupdf',
+                  'plotly', 'pandas', 'numpy')
+
+_MEASURE = """
+import json, resource, sys, time, warnings
+warnings.simplefilter("ignore")
+start = time.perf_counter()
+{body}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+                  "loaded": sorted(p for p in {heavy!r} if p in sys.modules)}}))
+"""
+
+_FIRST_PAGE = """
+from streamlit.testing.v1 import AppTest
+at = AppTest.from_file("app.py", default_timeout=120)
+at.run()
+assert not at.exception, at.exception
+"""
+
+
+def _run(code, root, *flags):
+    result = subprocess.run([sys.executable, *flags, "-c", code], cwd=root, capture_output=True, text=True,
+                            env={**os.environ, "PYTHONPATH": root})
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr[-2000:])
+    return result
+
+
+def measure(body, root, runs):
+    samples = [json.loads(_run(_MEASURE.format(body=body, heavy=HEAVY_PACKAGES), root).stdout.splitlines()[-1])
+               for _ in range(runs)]
+    return {
+        'seconds': statistics.median(s['seconds'] for s in samples),
+        'max_rss_mb': statistics.median(s['max_rss_mb'] for s in samples),
+        'loaded': samples[0]['loaded'],
+    }
+
+
+def importtime_breakdown(module, root):
+    """Cumulative import time (ms) per top-level package, from ``-X importtime``.
+
+    A package is charged where it enters the import tree from another package, including its
+    own dependencies, so totals of different packages can overlap.
+    """
+    stderr = _run(f"import warnings; warnings.simplefilter('ignore'); import {module}", root, "-X", "importtime").stderr
+    lines = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        lines.append((len(name) - len(name.lstrip()), int(cumulative), name.strip().split(".")[0]))
+
+    # Children are printed before their parent, so walk backwards keeping the chain of ancestors
+    by_package = defaultdict(float)
+    ancestors = []
+    for indent, cumulative, package in reversed(lines):
+        while ancestors and ancestors[-1][0] >= indent:
+            ancestors.pop()
+        parent = ancestors[-1][1] if ancestors else None
+        if parent is not None and parent != package and package != module:
+            by_package[package] += cumulative / 1000
+        ancestors.append((indent, package))
+    return dict(sorted(by_package.items(), key=lambda item: -item[1]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=REPO_ROOT, help="checkout to measure")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=8, help="packages shown per module breakdown")
+    args = parser.parse_args()
+    root = os.path.abspath(args.root)
+
+    print(f"# Cold start ({root})\n")
+    print("| measurement | seconds | peak RSS MB | heavy packages loaded |")
+    print("|---|---:|---:|---|")
+    for module in MODULES:
+        result = measure(f"import {module}", root, args.runs)
+        print(f"| import {module} | {result['seconds']:.2f} | {result['max_rss_mb']:.0f} | "
+              f"{', '.join(result['loaded']) or '-'} |")
+    result = measure(_FIRST_PAGE, root, args.runs)
+    print(f"| first page (API Keys) render | {result['seconds']:.2f} | {result['max_rss_mb']:.0f} | "
+          f"{', '.join(result['loaded']) or '-'} |")
+
+    print("\n## -X importtime, cumulative ms per top-level import\n")
+    for module in MODULES:
+        breakdown = importtime_breakdown(module, root)
+        top = ", ".join(f"{name} {ms:.0f}" for name, ms in list(breakdown.items())[:args.top])
+        print(f"- `{module}`: {top}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""PDF ingestion throughput and memory: PyPDFLoader + split-all vs. the streaming pipeline.
+
+Runs offline with a synthetic annual report and ``HashingEmbeddings``.
+
+    python benchmarks/bench_ingest.py --pages 300 --workers 4
+
+Each variant runs in a fresh subprocess so peak RSS is measured independently.
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def run_variant(variant, path, workers):
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from langchain_community.vectorstores import FAISS
+
+    from embedding_cache import HashingEmbeddings
+    from pdf_ingest import build_vectorstore, iter_chunks, iter_pdf_pages
+
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
+    embeddings = HashingEmbeddings()
+    start = time.perf_counter()
+    if variant == "pypdf":
+        from langchain_community.document_loaders import PyPDFLoader
+
+        docs = splitter.split_documents(PyPDFLoader(path).load())
+        vectorstore = FAISS.from_documents(docs, embeddings)
+        pages = len({doc.metadata["page"] for doc in docs})
+    else:
+        with open(path, "rb") as f:
+            pdf_bytes = f.read()
+        page_docs = iter_pdf_pages(pdf_bytes, workers=workers)
+        vectorstore = build_vectorstore(iter_chunks(page_docs, splitter), embeddings)
+        pages = len({doc.metadata["page"] for doc in vectorstore.docstore._dict.values()})
+    elapsed = time.perf_counter() - start
+    return {
+        "variant": variant,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 1),
+        "chunks": vectorstore.index.ntotal,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--variant", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        print(json.dumps(run_variant(args.variant, args.path, args.workers)))
+        return
+
+    from benchmarks.synthetic_pdf import make_report_pdf
+
+    with tempfile.NamedTemporaryFile(suffix=".pdf") as f:
+        f.write(make_report_pdf(args.pages))
+        f.flush()
+        print(f"synthetic report: {args.pages} pages, {os.path.getsize(f.name) / 1024:.0f} KiB")
+        for variant, workers in [("pypdf", 1), ("streaming", 1), ("streaming", args.workers)]:
+            output = subprocess.run(
+                [sys.executable, __file__, "--variant", variant, "--path", f.name, "--workers", str(workers)],
+                check=True, capture_output=True, text=True, cwd=ROOT).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{variant:>10} x{workers}: {result['seconds']:7.2f} s, {result['pages_per_second']:7.1f} pages/s, "
+                  f"{result['chunks']} chunks, peak RSS {result['peak_rss_mb']} MB")
+
+
+if __name__ == "__main__":
+    main()
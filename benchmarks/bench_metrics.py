@@ -0,0 +1,116 @@
+"""Metric computation throughput: scalar per-field conversion vs. the columnar engine.
+
+The scalar baseline mirrors the previous approach (one ``float()`` per field inside
+a try/except for every ratio), applied to every period of every ticker. The columnar
+timing is reported end to end and split into the one-off parse of the raw JSON and
+the ratio pass over typed columns, which is what repeat screening pays once the
+typed data is kept.
+
+    python benchmarks/bench_metrics.py --tickers 500 --years 20
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import make_statement_payload  # noqa: E402
+from metrics_engine import compute_metrics_from_fields, compute_metrics_table, stacked_fields  # noqa: E402
+
+
+def _value(report, field, default=None):
+    try:
+        return float(report[field]) if default is None else float(report.get(field, default))
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def _safe_ratio(numerator, denominator, scale=1.0):
+    try:
+        return round(numerator * scale / denominator, 2) if denominator else None
+    except TypeError:
+        return None
+
+
+def scalar_metrics(income, balance, cash):
+    revenue, cogs, net_income = _value(income, 'totalRevenue'), _value(income, 'costOfRevenue'), _value(income, 'netIncome')
+    equity, market_cap = _value(balance, 'totalShareholderEquity'), _value(balance, 'marketCapitalization', 0)
+    debt, ocf = _value(balance, 'shortLongTermDebtTotal', 0), _value(cash, 'operatingCashflow')
+    gross = revenue - cogs if revenue is not None and cogs is not None else None
+    fcf = ocf - _value(cash, 'capitalExpenditures', 0) if ocf is not None else None
+    return {
+        'Gross Profit Margin (%)': _safe_ratio(gross, revenue, 100),
+        'Net Profit Margin (%)': _safe_ratio(net_income, revenue, 100),
+        'Current Ratio': _safe_ratio(_value(balance, 'totalCurrentAssets'), _value(balance, 'totalCurrentLiabilities')),
+        'Debt-to-Equity Ratio': _safe_ratio(_value(balance, 'totalLiabilities'), equity),
+        'Operating Cash Flow Margin (%)': _safe_ratio(ocf, revenue, 100),
+        'Return on Assets (%)': _safe_ratio(net_income, _value(balance, 'totalAssets'), 100),
+        'Return on Equity (%)': _safe_ratio(net_income, equity, 100),
+        'Earnings Per Share (EPS)': _safe_ratio(net_income, _value(balance, 'commonStockSharesOutstanding')),
+        'Price to Earnings (P/E) Ratio': _safe_ratio(market_cap, net_income),
+        'Debt to EBITDA Ratio': _safe_ratio(debt, _value(income, 'ebitda', 0)),
+        'Free Cash Flow Yield (%)': _safe_ratio(fcf, market_cap, 100),
+        'Price-to-Book Ratio': _safe_ratio(market_cap, equity),
+        'Dividend Yield (%)': _safe_ratio(abs(_value(cash, 'cashDividendsPaid', 0) or 0), market_cap, 100),
+        'Return on Invested Capital (ROIC) (%)': _safe_ratio(
+            _value(income, 'ebit', 0), equity + debt if equity is not None and debt is not None else None, 100),
+    }
+
+
+def scalar_table(universe):
+    rows = []
+    for ticker, data in universe.items():
+        periods = zip(data['income_statement']['annualReports'], data['balance_sheet']['annualReports'],
+                      data['cash_flow']['annualReports'])
+        for income, balance, cash in periods:
+            for metric, value in scalar_metrics(income, balance, cash).items():
+                if value is not None:
+                    rows.append((ticker, income['fiscalDateEnding'], metric, value))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=500)
+    parser.add_argument("--years", type=int, default=20)
+    args = parser.parse_args()
+
+    universe = {
+        f"T{i:05d}": {
+            statement: make_statement_payload(function, f"T{i:05d}", years=args.years)
+            for statement, function in [('income_statement', 'INCOME_STATEMENT'),
+                                        ('balance_sheet', 'BALANCE_SHEET'), ('cash_flow', 'CASH_FLOW')]
+        }
+        for i in range(args.tickers)
+    }
+    periods = args.tickers * args.years
+
+    start = time.perf_counter()
+    scalar_rows = scalar_table(universe)
+    scalar_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = compute_metrics_table(universe)
+    vector_time = time.perf_counter() - start
+
+    # Split the columnar path into its one-off parse and the ratio pass over typed columns
+    start = time.perf_counter()
+    fields = stacked_fields(universe)
+    parse_time = time.perf_counter() - start
+    start = time.perf_counter()
+    compute_metrics_from_fields(fields)
+    compute_time = time.perf_counter() - start
+
+    print(f"{args.tickers} tickers x {args.years} periods = {periods} company-periods")
+    print(f"  scalar, raw JSON:          {scalar_time:8.3f} s  ({periods / scalar_time:10.0f} periods/s, "
+          f"{len(scalar_rows)} values)")
+    print(f"  columnar, raw JSON:        {vector_time:8.3f} s  ({periods / vector_time:10.0f} periods/s, "
+          f"{len(table)} values)  {scalar_time / vector_time:.1f}x")
+    print(f"    parse to typed columns:  {parse_time:8.3f} s")
+    print(f"    ratios over typed data:  {compute_time:8.3f} s  ({periods / compute_time:10.0f} periods/s)  "
+          f"{scalar_time / compute_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Peer queries over a universe: per-company processing vs. the ``MetricMatrix``.
+
+Without the matrix, ranking a company among its peers means running
+``process_financial_data`` once per peer and assembling the latest metrics of all of
+them before a percentile can be computed. The matrix is built once from the
+statement warehouse (memory-mapped Arrow scans, one vectorized metrics pass) and
+then answers percentiles, z-scores, top-N and a single company's peer profile over
+every company and metric at once.
+
+Statements are generated by ``stub_server.make_statement_payload`` (5 to 8 annual
+reports per ticker); no network access is needed.
+
+    python benchmarks/bench_peers.py --tickers 3000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import make_statement_payload  # noqa: E402
+from data_processing import STATEMENT_FUNCTIONS, process_financial_data  # noqa: E402
+from peer_comparison import MetricMatrix  # noqa: E402
+from statement_warehouse import StatementWarehouse  # noqa: E402
+
+METRIC = 'Return on Invested Capital (ROIC) (%)'
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def per_company_percentiles(universe):
+    rows = {}
+    for ticker, financial_data in universe.items():
+        metrics_df, _ = process_financial_data(financial_data)
+        rows[ticker] = metrics_df.set_index('Metric')['Value']
+    return (pd.DataFrame(rows).T.rank(pct=True) * 100)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tickers = [f"T{i:05d}" for i in range(args.tickers)]
+    universe = {ticker: {statement: make_statement_payload(function, ticker, years=5 + i % 4)
+                         for statement, function in STATEMENT_FUNCTIONS.items()}
+                for i, ticker in enumerate(tickers)}
+
+    with tempfile.TemporaryDirectory() as root:
+        warehouse = StatementWarehouse(root)
+        for ticker, financial_data in universe.items():
+            warehouse.append(ticker, financial_data)
+
+        per_company, reference = _timed(lambda: per_company_percentiles(universe), 1)
+        build, matrix = _timed(lambda: MetricMatrix.from_warehouse(warehouse), args.repeat)
+        timings = {
+            "percentiles, all metrics": _timed(lambda: matrix.percentiles(), args.repeat)[0],
+            "z-scores, all metrics": _timed(lambda: matrix.zscores(), args.repeat)[0],
+            f"top 10 by {METRIC}": _timed(lambda: matrix.top(METRIC, 10), args.repeat)[0],
+            "one company's peer profile": _timed(lambda: matrix.profile(tickers[0]), args.repeat)[0],
+        }
+        peers = tickers[1:50]
+        timings["profile against 50 peers"] = _timed(lambda: matrix.profile(tickers[0], peers=peers),
+                                                     args.repeat)[0]
+
+    agree = (matrix.percentiles()[reference.columns].loc[reference.index] - reference).abs().max().max() < 1e-9
+    print(f"{args.tickers} tickers, {len(matrix.years)} fiscal years, matrix {matrix.nbytes / 1e6:.1f} MB")
+    print(f"  percentiles via process_financial_data per company: {per_company:8.3f} s")
+    print(f"  matrix build from warehouse:                        {build:8.3f} s")
+    for name, seconds in timings.items():
+        print(f"  {name + ':':51} {seconds * 1e3:8.2f} ms")
+    print(f"  percentiles agree with per-company result: {agree}")
+
+
+if __name__ == "__main__":
+    main()
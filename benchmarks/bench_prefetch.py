@@ -0,0 +1,73 @@
+"""First view of a company: cold fetch vs. prefetched by the background worker.
+
+The cold path is what the Financial Data page did on the first lookup of a ticker:
+three provider round-trips, the metrics and the chart JSON. The warm path runs the
+same ``analyze_ticker`` call after ``PrefetchWorker`` has processed the watchlist.
+Runs against the local stub API with a per-request latency, in separate
+statement and pipeline caches for each path. Also reports how long the worker took
+to warm the watchlist at the given requests-per-minute quota and how many provider
+requests it made.
+
+    python benchmarks/bench_prefetch.py --tickers 10 --latency 0.3 --rpm 600
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubAlphaVantage  # noqa: E402
+from data_processing import analyze_ticker  # noqa: E402
+from pipeline_cache import PipelineCache  # noqa: E402
+from prefetch_worker import PrefetchWorker  # noqa: E402
+from statement_cache import StatementCache  # noqa: E402
+
+
+def first_views(tickers, stub, statement_cache, pipeline_cache):
+    timings = []
+    for ticker in tickers:
+        start = time.perf_counter()
+        entry = analyze_ticker(ticker, "demo", pipeline_cache=pipeline_cache, base_url=stub.url,
+                               statement_cache=statement_cache)
+        entry.charts
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.3, help="stub seconds per provider request")
+    parser.add_argument("--rpm", type=float, default=600, help="worker provider requests per minute")
+    args = parser.parse_args()
+
+    tickers = [f"W{i:03d}" for i in range(args.tickers)]
+    with tempfile.TemporaryDirectory() as root, StubAlphaVantage(latency=args.latency) as stub:
+        cold = first_views(tickers, stub, StatementCache(os.path.join(root, "cold.sqlite")), PipelineCache())
+
+        statement_cache, pipeline_cache = StatementCache(os.path.join(root, "warm.sqlite")), PipelineCache()
+        worker = PrefetchWorker("demo", tickers, base_url=stub.url, requests_per_minute=args.rpm,
+                                pipeline_cache=pipeline_cache, statement_cache=statement_cache)
+        requests = stub.requests
+        start = time.perf_counter()
+        worker.run_pending()
+        warm_up = time.perf_counter() - start
+        worker_requests = stub.requests - requests
+        requests = stub.requests
+        warm = first_views(tickers, stub, statement_cache, pipeline_cache)
+        interactive_requests = stub.requests - requests
+        status = worker.status()
+
+    print(f"{args.tickers} tickers, stub latency {args.latency:.2f} s per request, worker quota {args.rpm:.0f}/min")
+    print(f"  cold first view:  p50 {statistics.median(cold) * 1e3:8.1f} ms  max {max(cold) * 1e3:8.1f} ms")
+    print(f"  warm first view:  p50 {statistics.median(warm) * 1e3:8.1f} ms  max {max(warm) * 1e3:8.1f} ms  "
+          f"({interactive_requests} provider requests)")
+    print(f"  worker warm-up:   {warm_up:8.2f} s, {worker_requests} provider requests, "
+          f"{status['warm']} warm / {status['failed']} failed")
+
+
+if __name__ == "__main__":
+    main()
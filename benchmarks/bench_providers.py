@@ -0,0 +1,93 @@
+"""Ticker-load latency from one provider vs. a hedged ``ProviderChain`` of two.
+
+Both providers are local stub servers. The primary (Alpha Vantage format) answers a
+share ``--slow-rate`` of its requests after ``--slow-latency`` seconds instead of
+``--latency``; the secondary (Polygon.io format, one request per ticker) is a little
+slower but has no tail. Each ticker is loaded with ``fetch_financial_data`` and the
+statement cache off: from each provider alone, then through the chain, which queries
+the secondary when the primary has not answered within its own p95 (so hedging cuts
+the tail as long as fewer than 5% of loads are slow).
+
+The last phase switches the primary to HTTP 503 for its second half: the primary
+alone fails those loads, while the same chain falls back and, once the primary's
+circuit breaker opens, skips it. Provider requests per load show the cost of hedging.
+
+    python benchmarks/bench_providers.py --tickers 300 --slow-rate 0.01
+"""
+import argparse
+import logging
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_server import StubAlphaVantage  # noqa: E402
+from data_processing import fetch_financial_data  # noqa: E402
+from data_providers import AlphaVantageProvider, PolygonProvider, ProviderChain  # noqa: E402
+
+
+def load(tickers, providers, stubs, outage=None):
+    timings, failures = [], 0
+    requests = sum(stub.requests for stub in stubs)
+    for i, ticker in enumerate(tickers):
+        if outage is not None and i == len(tickers) // 2:
+            outage.fault = "error"
+        start = time.perf_counter()
+        if fetch_financial_data(ticker, "demo", cache=False, providers=providers) is None:
+            failures += 1
+        timings.append(time.perf_counter() - start)
+    if outage is not None:
+        outage.fault = None
+    return np.array(timings), failures, (sum(stub.requests for stub in stubs) - requests) / len(tickers)
+
+
+def report(name, result):
+    timings, failures, requests = result
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99]) * 1e3
+    print(f"  {name:26} p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  p99 {p99:7.1f} ms  "
+          f"max {timings.max() * 1e3:7.1f} ms  {failures:3d} failed  {requests:.2f} requests/load")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=300)
+    parser.add_argument("--latency", type=float, default=0.05, help="primary seconds per request")
+    parser.add_argument("--slow-rate", type=float, default=0.01, help="share of slow primary requests")
+    parser.add_argument("--slow-latency", type=float, default=1.5, help="seconds per slow primary request")
+    parser.add_argument("--secondary-latency", type=float, default=0.08)
+    args = parser.parse_args()
+    # Every failed load is logged; the counts are in the report
+    logging.getLogger("data_processing").setLevel(logging.ERROR)
+
+    tickers = [f"P{i:04d}" for i in range(args.tickers)]
+    with StubAlphaVantage(latency=args.latency, slow_rate=args.slow_rate, slow_latency=args.slow_latency) as primary, \
+            StubAlphaVantage(latency=args.secondary_latency) as secondary:
+        stubs = (primary, secondary)
+        alpha_vantage = AlphaVantageProvider("demo", base_url=primary.url)
+        polygon = PolygonProvider("demo", base_url=secondary.polygon_url)
+        fetch_financial_data("WARM", "demo", cache=False, providers=ProviderChain([alpha_vantage, polygon]))
+
+        results = {
+            "primary only": load(tickers, ProviderChain([alpha_vantage]), stubs),
+            "secondary only": load(tickers, ProviderChain([polygon]), stubs),
+        }
+        chain = ProviderChain([alpha_vantage, polygon])
+        results["hedged chain"] = load(tickers, chain, stubs)
+        print(f"hedge delay after warm-up: {chain.hedge_delay(alpha_vantage) * 1e3:.1f} ms, "
+              f"{chain.summary()['polygon']['hedged']} hedged loads")
+        results["primary only, outage"] = load(tickers, ProviderChain([alpha_vantage]), stubs, outage=primary)
+        results["hedged chain, outage"] = load(tickers, chain, stubs, outage=primary)
+        breaker = chain.summary()['alpha_vantage']
+
+    print(f"{args.tickers} ticker loads; primary {args.latency * 1e3:.0f} ms per request, "
+          f"{args.slow_rate:.0%} at {args.slow_latency * 1e3:.0f} ms; secondary {args.secondary_latency * 1e3:.0f} ms")
+    for name, result in results.items():
+        report(name, result)
+    print(f"  primary breaker after the outage: {breaker['state']}, {breaker['failed']} failed calls")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""Report retrieval: fixed-size vs. table-aware chunking, dense vs. BM25 vs. hybrid search.
+
+Fixture reports come from ``synthetic_pdf.make_qa_report_pdf``: segment results tables
+set between narrative paragraphs, and single-sentence facts in the narrative, with a
+question about each. A question counts as a hit when one of the ``k`` retrieved chunks
+holds everything needed to answer it: the fact sentence, or the table row together
+with the table's caption and year header. Each question is asked within its own report,
+as the Document Analysis page does for "This report".
+
+For every chunking variant the reports are split, embedded with ``HashingEmbeddings``
+and added to a fresh ``CorpusIndex``; the table reports chunk count, how much of the
+extracted text the chunks repeat, on-disk size of the FAISS index, of the SQLite chunk
+store and of the BM25 postings within it, and build time, then hit rate and latency of
+each retrieval mode. ``HashingEmbeddings`` is a crude dense model (hashed bag of words),
+so the dense and hybrid rows understate what real embeddings retrieve; compare chunking
+variants within a mode.
+
+    python benchmarks/bench_retrieval.py --reports 3 --pages 60
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.synthetic_pdf import make_qa_report_pdf  # noqa: E402
+from corpus_index import CorpusIndex  # noqa: E402
+from embedding_cache import HashingEmbeddings  # noqa: E402
+from pdf_ingest import iter_chunks, iter_pdf_pages  # noqa: E402
+from report_analysis import CHUNK_SIZE, HYBRID_CANDIDATES, RETRIEVAL_MODES, make_splitter  # noqa: E402
+
+
+def fixed_splitter():
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    return RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=200)
+
+
+SPLITTERS = {"fixed 1000/200": fixed_splitter, "table-aware": make_splitter}
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def build(root, reports, make):
+    embeddings = HashingEmbeddings()
+    corpus = CorpusIndex(embeddings, root=root)
+    extracted = chunked = chunks = 0
+    start = time.perf_counter()
+    for key, (pdf_bytes, _) in reports.items():
+        pages = list(iter_pdf_pages(pdf_bytes, name=f"{key}.pdf", workers=1))
+        extracted += sum(len(page.page_content) for page in pages)
+        docs = list(iter_chunks(pages, make()))
+        texts = [doc.page_content for doc in docs]
+        chunked += sum(len(text) for text in texts)
+        chunks += len(texts)
+        corpus.add_report(key, texts, embeddings.embed_documents(texts), [doc.metadata for doc in docs],
+                          persist=False)
+    corpus.save()
+    seconds = time.perf_counter() - start
+    return corpus, {
+        "chunks": chunks,
+        "repeated": chunked / extracted - 1,
+        "faiss_kb": os.path.getsize(os.path.join(root, "index.faiss")) / 1024,
+        "sqlite_kb": os.path.getsize(os.path.join(root, "chunks.sqlite")) / 1024,
+        "bm25_kb": corpus._conn.execute("SELECT sum(length(block)) FROM chunks_fts_data").fetchone()[0] / 1024,
+        "build_s": seconds,
+    }
+
+
+def evaluate(corpus, reports, mode, k):
+    hits = {"table": [], "text": []}
+    timings = []
+    for key, (_, questions) in reports.items():
+        for question in questions:
+            filters = {"report_key": key}
+            vector = corpus.embeddings.embed_query(question["question"])
+            start = time.perf_counter()
+            if mode == "hybrid":
+                ids, _ = corpus.hybrid_search_ids(question["question"], vector, k=k, filters=filters,
+                                                  candidates=HYBRID_CANDIDATES)
+            elif mode == "text":
+                ids, _ = corpus.text_search_ids(question["question"], k=k, filters=filters)
+            else:
+                ids, _ = corpus.search_ids(vector, k=k, filters=filters)
+            timings.append(time.perf_counter() - start)
+            texts = [_normalize(doc.page_content) for doc in corpus.documents(ids)]
+            hits[question["kind"]].append(any(all(part in text for part in question["required"]) for text in texts))
+    return {
+        "table_hit": sum(hits["table"]) / len(hits["table"]),
+        "text_hit": sum(hits["text"]) / len(hits["text"]),
+        "query_ms": statistics.median(timings) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--reports", type=int, default=3)
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    reports = {f"report-{number}": make_qa_report_pdf(args.pages, seed=number, company=f"Company {number}")
+               for number in range(args.reports)}
+    questions = sum(len(qs) for _, qs in reports.values())
+    print(f"{args.reports} reports x {args.pages} pages, {questions} questions, hit@{args.k}")
+    print()
+    print("| chunking | chunks | text repeated | FAISS KB | SQLite KB | BM25 KB | build s | retrieval | table hit | "
+          "text hit | query ms |")
+    print("|---|---:|---:|---:|---:|---:|---:|---|---:|---:|---:|")
+    with tempfile.TemporaryDirectory() as root:
+        for name, make in SPLITTERS.items():
+            corpus, stats = build(os.path.join(root, name.split()[0]), reports, make)
+            for mode in RETRIEVAL_MODES:
+                result = evaluate(corpus, reports, mode, args.k)
+                print(f"| {name} | {stats['chunks']} | {stats['repeated']:.0%} | {stats['faiss_kb']:.0f} | "
+                      f"{stats['sqlite_kb']:.0f} | {stats['bm25_kb']:.0f} | {stats['build_s']:.2f} | {mode} | "
+                      f"{result['table_hit']:.0%} | {result['text_hit']:.0%} | {result['query_ms']:.2f} |")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Perceived latency of AI insights: blocking completion vs. streamed tokens.
+
+Runs against the local fake OpenAI server, so no API key is needed. For the blocking
+call the first visible text arrives with the whole completion; for the streamed call
+it arrives with the first token.
+
+    python benchmarks/bench_streaming.py --first-token 0.4 --tokens-per-second 40 --runs 5
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_openai import FakeOpenAI  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--first-token", type=float, default=0.4, help="seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    metrics_df = pd.DataFrame({'Metric': ['Gross Margin', 'ROE'], 'Value': [0.41, 0.18]})
+    with FakeOpenAI(first_token_latency=args.first_token, tokens_per_second=args.tokens_per_second) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.url
+        from data_processing import generate_financial_insights, stream_financial_insights
+        from llm_metrics import get_generation_metrics
+
+        blocking = []
+        for _ in range(args.runs):
+            start = time.perf_counter()
+            generate_financial_insights(metrics_df, "sk-fake")
+            blocking.append(time.perf_counter() - start)
+        for _ in range(args.runs):
+            "".join(stream_financial_insights(metrics_df, "sk-fake"))
+        streamed = get_generation_metrics().summary()["insights"]
+
+    print(f"{len(fake.tokens)} tokens, first token after {args.first_token:.2f} s, "
+          f"{args.tokens_per_second:.0f} tokens/s\n")
+    print(f"{'blocking:':<11} first text {statistics.median(blocking):5.2f} s, "
+          f"complete {statistics.median(blocking):5.2f} s")
+    print(f"{'streaming:':<11} first text {streamed['ttft_p50']:5.2f} s, complete {streamed['total_p50']:5.2f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Repeat analysis of a coverage universe: cached raw JSON vs. the columnar statement warehouse.
+
+The JSON path is what the statement cache serves on every analysis: decode the three
+stored responses and parse them to typed frames, per ticker (``FinancialStatements``, as
+the Financial Data page does) or stacked for the universe (``compute_metrics_table``).
+The warehouse path memory-maps the Arrow partitions and reads the typed columns
+without parsing. A refresh against the stub server then shows the provider calls of a first
+load, of a repeat run (none: nothing is stale yet) and after a few tickers are marked
+stale.
+
+Statements are the recorded-schema fixtures (full Alpha Vantage field lists, 5 annual
+and 20 quarterly reports), cycled over the requested number of tickers.
+
+    python benchmarks/bench_warehouse.py --tickers 1000
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.av_fixtures import as_financial_data, load_fixtures, statement_symbols  # noqa: E402
+from benchmarks.stub_server import StubAlphaVantage  # noqa: E402
+from data_processing import fetch_financial_data  # noqa: E402
+from metrics_engine import compute_metrics_table  # noqa: E402
+from statement_model import FinancialStatements  # noqa: E402
+from statement_warehouse import StatementWarehouse  # noqa: E402
+
+
+def json_metrics(encoded):
+    universe = {ticker: {statement: json.loads(body) for statement, body in bodies.items()}
+                for ticker, bodies in encoded.items()}
+    return compute_metrics_table(universe, wide=True)
+
+
+def _timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    fixtures = load_fixtures()
+    symbols = statement_symbols(fixtures)
+    tickers = [f"T{i:05d}" for i in range(args.tickers)]
+    universe = {ticker: as_financial_data(fixtures[symbols[i % len(symbols)]]) for i, ticker in enumerate(tickers)}
+    encoded = {ticker: {statement: json.dumps(body) for statement, body in data.items()}
+               for ticker, data in universe.items()}
+
+    with tempfile.TemporaryDirectory() as root:
+        warehouse = StatementWarehouse(os.path.join(root, "warehouse"))
+        start = time.perf_counter()
+        for ticker, data in universe.items():
+            warehouse.append(ticker, data)
+        load_time = time.perf_counter() - start
+
+        first = tickers[0]
+        single_json, _ = _timed(lambda: FinancialStatements.from_raw(
+            {statement: json.loads(body) for statement, body in encoded[first].items()}), args.repeat * 10)
+        single_warehouse, _ = _timed(lambda: warehouse.statements(first), args.repeat * 10)
+        json_time, json_table = _timed(lambda: json_metrics(encoded), args.repeat)
+        warehouse_time, warehouse_table = _timed(lambda: warehouse.metrics_table(tickers), args.repeat)
+
+        print(f"{args.tickers} tickers ({', '.join(symbols)} statements)")
+        print(f"  initial load into warehouse: {load_time:8.3f} s")
+        print(f"  one ticker from cached JSON: {single_json * 1e3:8.3f} ms")
+        print(f"  one ticker from warehouse:   {single_warehouse * 1e3:8.3f} ms  {single_json / single_warehouse:.1f}x")
+        print(f"  metrics from cached JSON:    {json_time:8.3f} s  ({len(json_table)} rows)")
+        print(f"  metrics from warehouse:      {warehouse_time:8.3f} s  ({len(warehouse_table)} rows)  "
+              f"{json_time / warehouse_time:.1f}x")
+
+        stub = StubAlphaVantage(latency=0, fixtures={ticker: fixtures[symbols[i % len(symbols)]]
+                                                     for i, ticker in enumerate(tickers)})
+        stub.start()
+        try:
+            refreshed = StatementWarehouse(os.path.join(root, "refreshed"))
+
+            def fetch(ticker):
+                return fetch_financial_data(ticker, "demo", base_url=stub.url, cache=False)
+
+            for label, before in [("first load", None), ("repeat run", None), ("10% marked stale", 10)]:
+                if before:
+                    for ticker in tickers[::before]:
+                        refreshed.invalidate(ticker)
+                calls = stub.requests
+                start = time.perf_counter()
+                refreshed.refresh(tickers, fetch)
+                print(f"  refresh, {label + ':':18} {time.perf_counter() - start:8.3f} s  "
+                      f"({stub.requests - calls} provider calls)")
+        finally:
+            stub.stop()
+
+
+if __name__ == "__main__":
+    main()
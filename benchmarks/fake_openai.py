@@ -0,0 +1,158 @@
+"""Local stand-in for the OpenAI chat and completions endpoints, with SSE streaming.
+
+Point the clients at it with ``OPENAI_BASE_URL`` (openai) / ``OPENAI_API_BASE``
+(langchain) set to ``FakeOpenAI.url``. Responses are a fixed text split into
+word tokens, sent after ``first_token_latency`` seconds and then one token every
+``1 / tokens_per_second`` seconds. With ``prompt_tokens_per_second`` set, reading the
+prompt (~4 characters per token) adds to the first-token latency, as prefill does.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_TEXT = (
+    "Revenue grew steadily over the period while gross margin held near forty percent. "
+    "Leverage is moderate: debt to EBITDA stays below two and interest coverage is comfortable. "
+    "Free cash flow comfortably funds the dividend, leaving room for buybacks or debt reduction. "
+    "Working capital management could improve, as receivables grew faster than sales."
+)
+
+
+class FakeOpenAI:
+    """Threaded HTTP/1.1 server for ``/v1/chat/completions`` and ``/v1/completions``.
+
+    ``requests`` counts POSTs and ``last_request`` keeps the most recent JSON body.
+    ``errors`` is a list of HTTP status codes returned, in order, for the first requests
+    (e.g. ``[429, 503]``) to exercise client retries.
+    """
+
+    def __init__(self, text=DEFAULT_TEXT, first_token_latency=0.3, tokens_per_second=50.0,
+                 errors=(), prompt_tokens_per_second=None, host="127.0.0.1", port=0):
+        self.tokens = [word + " " for word in text.split(" ")]
+        self.tokens[-1] = self.tokens[-1].rstrip()
+        self.first_token_latency = first_token_latency
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.requests = 0
+        self.last_request = None
+        self.errors = list(errors)
+        self._lock = threading.Lock()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with fake._lock:
+                    fake.requests += 1
+                    fake.last_request = body
+                    status = fake.errors.pop(0) if fake.errors else None
+                if status is not None:
+                    data = json.dumps({"error": {"message": f"fake error {status}", "type": "fake_error"}}).encode()
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    if status == 429:
+                        self.send_header("Retry-After", "0.05")
+                    self.end_headers()
+                    self.wfile.write(data)
+                    return
+                chat = self.path.rstrip("/").endswith("chat/completions")
+                if body.get("stream"):
+                    self._stream(body, chat)
+                else:
+                    self._complete(body, chat)
+
+            def _complete(self, body, chat):
+                time.sleep(fake.first_token_delay(body) + len(fake.tokens) / fake.tokens_per_second)
+                text = "".join(fake.tokens)
+                choice = ({"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                          if chat else {"index": 0, "text": text, "finish_reason": "stop", "logprobs": None})
+                payload = fake.envelope(body, chat, [choice])
+                prompt_tokens = fake.prompt_tokens(body)
+                payload["usage"] = {"prompt_tokens": prompt_tokens, "completion_tokens": len(fake.tokens),
+                                    "total_tokens": prompt_tokens + len(fake.tokens)}
+                data = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, chat):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+                time.sleep(fake.first_token_delay(body))
+                for i, token in enumerate(fake.tokens):
+                    if i:
+                        time.sleep(1 / fake.tokens_per_second)
+                    choice = ({"index": 0, "delta": {"content": token}, "finish_reason": None}
+                              if chat else {"index": 0, "text": token, "finish_reason": None, "logprobs": None})
+                    self._event(fake.envelope(body, chat, [choice], chunk=True))
+                final = ({"index": 0, "delta": {}, "finish_reason": "stop"}
+                         if chat else {"index": 0, "text": "", "finish_reason": "stop", "logprobs": None})
+                self._event(fake.envelope(body, chat, [final], chunk=True))
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+
+            def _event(self, payload):
+                self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode())
+                self.wfile.flush()
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @staticmethod
+    def prompt_tokens(body):
+        if "messages" in body:
+            text = "".join(str(message.get("content", "")) for message in body["messages"])
+        else:
+            prompt = body.get("prompt", "")
+            text = "".join(prompt) if isinstance(prompt, list) else str(prompt)
+        return max(1, len(text) // 4)
+
+    def first_token_delay(self, body):
+        if not self.prompt_tokens_per_second:
+            return self.first_token_latency
+        return self.first_token_latency + self.prompt_tokens(body) / self.prompt_tokens_per_second
+
+    @staticmethod
+    def envelope(body, chat, choices, chunk=False):
+        kind = "chat.completion" if chat else "text_completion"
+        return {"id": "fake-1", "object": f"{kind}.chunk" if chunk and chat else kind,
+                "created": int(time.time()), "model": body.get("model", "fake"), "choices": choices}
+
+    @property
+    def text(self):
+        return "".join(self.tokens)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,161 @@
+"""Local stand-in for the Alpha Vantage (and Polygon.io) statement endpoints used by the benchmarks."""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INCOME_FIELDS = ['totalRevenue', 'costOfRevenue', 'grossProfit', 'netIncome', 'ebit', 'ebitda']
+BALANCE_FIELDS = ['totalAssets', 'totalCurrentAssets', 'totalNonCurrentAssets', 'totalLiabilities',
+                  'totalCurrentLiabilities', 'totalShareholderEquity', 'commonStockSharesOutstanding',
+                  'shortLongTermDebtTotal']
+CASH_FLOW_FIELDS = ['operatingCashflow', 'capitalExpenditures', 'cashDividendsPaid']
+
+
+def _reports(symbol, fields, years):
+    rng = random.Random(f"{symbol}:{','.join(fields)}")
+    reports = []
+    for i in range(years):
+        report = {'fiscalDateEnding': f"{2023 - i}-12-31", 'reportedCurrency': 'USD'}
+        for field in fields:
+            report[field] = str(rng.randint(1_000_000, 900_000_000_000))
+        reports.append(report)
+    return reports
+
+
+def make_statement_payload(function, symbol, years=5):
+    """Build an Alpha Vantage-shaped statement response with deterministic values."""
+    if function == 'INCOME_STATEMENT':
+        reports = _reports(symbol, INCOME_FIELDS, years)
+        for report in reports:
+            report['grossProfit'] = str(int(report['totalRevenue']) - int(report['costOfRevenue']))
+    elif function == 'BALANCE_SHEET':
+        reports = _reports(symbol, BALANCE_FIELDS, years)
+    elif function == 'CASH_FLOW':
+        reports = _reports(symbol, CASH_FLOW_FIELDS, years)
+    else:
+        return {'Error Message': f"Invalid API call for function {function}"}
+    return {'symbol': symbol, 'annualReports': reports, 'quarterlyReports': reports[:1]}
+
+
+def make_polygon_payload(symbol, years=5):
+    """Build a Polygon.io ``vX/reference/financials`` response holding the same values
+    as ``make_statement_payload`` for each field ``PolygonProvider`` maps."""
+    from data_providers import PolygonProvider
+
+    statements = {statement: make_statement_payload(function, symbol, years)['annualReports']
+                  for statement, function in [('income_statement', 'INCOME_STATEMENT'),
+                                              ('balance_sheet', 'BALANCE_SHEET'), ('cash_flow', 'CASH_FLOW')]}
+    results = []
+    for i in range(years):
+        financials = {}
+        for statement, fields in PolygonProvider.FIELDS.items():
+            for field, source in fields.items():
+                value = statements[statement][i].get(field)
+                if source is not None and value is not None:
+                    financials.setdefault(source[0], {})[source[1]] = {'value': float(value), 'unit': 'USD'}
+        results.append({'end_date': statements['income_statement'][i]['fiscalDateEnding'],
+                        'fiscal_year': str(2023 - i), 'fiscal_period': 'FY', 'financials': financials})
+    return {'status': 'OK', 'results': results}
+
+
+class StubAlphaVantage:
+    """Threaded HTTP/1.1 server answering ``/query?function=...&symbol=...``.
+
+    ``latency`` adds a fixed server-side delay per request so that sequential and
+    concurrent clients can be compared; ``connections`` counts accepted sockets.
+    Symbols found in ``fixtures`` (see ``av_fixtures.load_fixtures``) are answered with
+    their recorded responses, any other symbol with generated statements.
+
+    ``/vX/reference/financials?ticker=...`` (``polygon_url``) answers in the Polygon.io
+    format. A share ``slow_rate`` of requests is delayed by ``slow_latency`` instead of
+    ``latency``, giving a latency tail. ``fault`` simulates a degraded provider: "note"
+    answers with a 200 rate-limit ``Note`` body, "error" with HTTP 503; it can be
+    changed while the server runs.
+    """
+
+    def __init__(self, latency=0.05, host="127.0.0.1", port=0, fixtures=None, slow_rate=0.0, slow_latency=1.0,
+                 fault=None, seed=0):
+        self.latency = latency
+        self.fixtures = fixtures or {}
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.fault = fault
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stub._lock:
+                    stub.connections += 1
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                with stub._lock:
+                    stub.requests += 1
+                    slow = stub.slow_rate and stub._random.random() < stub.slow_rate
+                latency = stub.slow_latency if slow else stub.latency
+                if latency:
+                    time.sleep(latency)
+                status = 200
+                if stub.fault == "error":
+                    status, payload = 503, {'error': 'service unavailable'}
+                elif stub.fault == "note":
+                    payload = {'Note': "Thank you for using Alpha Vantage! Our standard API call frequency is "
+                                       "5 calls per minute and 500 calls per day."}
+                elif url.path.endswith("/financials"):
+                    payload = make_polygon_payload(query.get('ticker', [''])[0])
+                else:
+                    payload = stub.payload(query.get('function', [''])[0], query.get('symbol', [''])[0])
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def payload(self, function, symbol):
+        if symbol in self.fixtures:
+            return self.fixtures[symbol].get(function, {})
+        return make_statement_payload(function, symbol)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/query"
+
+    @property
+    def polygon_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/vX/reference/financials"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,93 @@
+"""Generate synthetic annual-report PDFs with narrative text and financial tables."""
+import random
+
+import pymupdf as fitz
+
+SECTIONS = ["Management's Discussion and Analysis", "Risk Factors", "Liquidity and Capital Resources",
+            "Results of Operations", "Critical Accounting Estimates", "Segment Information"]
+LINE_ITEMS = ["Total revenue", "Cost of revenue", "Gross profit", "Research and development",
+              "Selling, general and administrative", "Operating income", "Interest expense",
+              "Income before taxes", "Provision for income taxes", "Net income", "Deferred revenue",
+              "Total current assets", "Total assets", "Long-term debt", "Total shareholders' equity"]
+WORDS = ("the company revenue growth margin customers products services operating segment fiscal year "
+         "increase decrease primarily due to higher lower demand pricing costs investment capital cash "
+         "flow liquidity debt facility interest rate currency exchange risk market competition supply "
+         "chain regulatory compliance tax provision deferred recognized performance obligations").split()
+
+
+def make_report_pdf(pages=50, seed=0, company="Example Corp"):
+    """Return the bytes of a PDF alternating narrative pages with statement tables."""
+    rng = random.Random(seed)
+    doc = fitz.open()
+    for number in range(pages):
+        page = doc.new_page()
+        lines = [f"{company} Annual Report - Page {number + 1}", ""]
+        if number % 4 == 3:
+            years = [2023, 2022, 2021]
+            lines.append("Consolidated Statements of Operations (in millions)")
+            lines.append(f"{'':40}" + "".join(f"{year:>12}" for year in years))
+            for item in LINE_ITEMS:
+                values = "".join(f"{rng.randint(100, 99_999):>12,}" for _ in years)
+                lines.append(f"{item:40}{values}")
+        else:
+            lines.append(rng.choice(SECTIONS))
+            for _ in range(40):
+                lines.append(" ".join(rng.choices(WORDS, k=14)).capitalize() + ".")
+        page.insert_text((36, 40), "\n".join(lines), fontsize=7, fontname="cour")
+    data = doc.tobytes()
+    doc.close()
+    return data
+
+
+REGIONS = ["Americas", "Europe", "Asia Pacific", "Japan"]
+SEGMENTS = ["Cloud", "Consulting", "Hardware", "Software", "Financing", "Services"]
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def make_qa_report_pdf(pages=60, seed=0, company="Example Corp"):
+    """Return ``(pdf_bytes, questions)`` for a report with per-segment tables and facts in its narrative.
+
+    Every third page holds a segment results table between narrative paragraphs; the other
+    pages each state one figure of a segment in a sentence. ``questions`` is a list of
+    ``{"kind": "table" | "text", "question", "required"}``: an answer needs every string in
+    ``required`` (whitespace-normalized) to be in one retrieved chunk, e.g. a table row
+    together with the table's caption and year header.
+    """
+    rng = random.Random(seed)
+    names = [f"{region} {segment}" for region in REGIONS for segment in SEGMENTS]
+    rng.shuffle(names)
+    years = [2023, 2022, 2021]
+    header = f"{'':40}" + "".join(f"{year:>12}" for year in years)
+    doc, questions = fitz.open(), []
+    for number in range(pages):
+        name = names[number % len(names)]
+        lines = [f"{company} Annual Report - Page {number + 1}", rng.choice(SECTIONS)]
+        narrative = [" ".join(rng.choices(WORDS, k=14)).capitalize() + "." for _ in range(24)]
+        if number % 3 == 2:
+            caption = f"{name} Segment Results (in millions)"
+            rows = [f"{item:40}" + "".join(f"{rng.randint(100, 99_999):>12,}" for _ in years) for item in LINE_ITEMS]
+            lines += narrative[:rng.randint(6, 14)] + [caption, header] + rows + narrative[14:]
+            row = rng.randrange(len(LINE_ITEMS))
+            questions.append({
+                "kind": "table",
+                "question": f"What was {LINE_ITEMS[row].lower()} of the {name} segment in {rng.choice(years)}?",
+                "required": [_normalize(caption), _normalize(header), _normalize(rows[row])],
+            })
+        else:
+            item, year, value = rng.choice(LINE_ITEMS), rng.choice(years), rng.randint(100, 99_999)
+            fact = f"The {name} segment reported {item.lower()} of ${value:,} million for fiscal {year}."
+            narrative.insert(rng.randint(0, len(narrative)), fact)
+            lines += narrative
+            questions.append({
+                "kind": "text",
+                "question": f"What {item.lower()} did the {name} segment report for fiscal {year}?",
+                "required": [_normalize(fact)],
+            })
+        page = doc.new_page()
+        page.insert_text((36, 40), "\n".join(lines), fontsize=7, fontname="cour")
+    data = doc.tobytes()
+    doc.close()
+    return data, questions
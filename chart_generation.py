@@ -1,33 +1,288 @@
-import plotly.graph_objects as go
-import plotly.express as px
+import logging
+import os
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Any
 
+import pandas as pd
+import plotly.graph_objects as go
+
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+# Figures carry no Plotly template: Streamlit applies its own theme in the browser, and the
+# default template is ~7 KB of JSON per figure that would be serialized and shipped for nothing
+MINIMAL_TEMPLATE = go.layout.Template()
+
+DEFAULT_FIGURE_CACHE_BYTES = 32 * 1024 * 1024
+# A figure, or its JSON parsed back into dicts and lists, takes ~8x the JSON's length in memory
+PARSED_JSON_FACTOR = 8
+# Rough JSON length of one plotted value and of a figure's layout and trace settings, to size
+# a figure without serializing it
+VALUE_JSON_BYTES = 16
+FIGURE_JSON_BYTES = 256
+DATA_ATTRIBUTES = ('x', 'y', 'text', 'labels', 'values')
+
+
+def _figure(traces, **layout):
+    fig = go.Figure(data=traces)
+    fig.update_layout(template=MINIMAL_TEMPLATE, **layout)
+    return fig
+
+
+def estimated_json_bytes(fig):
+    """JSON length of ``fig`` estimated from the length of its data arrays."""
+    values = 0
+    for trace in fig.data:
+        for attribute in DATA_ATTRIBUTES:
+            data = trace[attribute] if attribute in trace else None
+            if data is not None:
+                values += 1 if isinstance(data, str) else len(data)
+    return FIGURE_JSON_BYTES + VALUE_JSON_BYTES * values
+
+
 def create_revenue_chart(historical_revenue: List[Dict[str, Any]]):
     """Create a bar chart for historical revenue trends."""
     years = [data["year"] for data in historical_revenue]
     revenues = [data["revenue"] for data in historical_revenue]
-    
-    fig = go.Figure(data=[
-        go.Bar(x=years, y=revenues, text=revenues, textposition='auto')
-    ])
-    fig.update_layout(
+
+    return _figure(
+        [go.Bar(x=years, y=revenues, text=revenues, textposition='auto')],
         title="Historical Revenue Trends",
         xaxis_title="Year",
         yaxis_title="Revenue (USD)",
-        yaxis_tickformat=',.0f'
+        yaxis_tickformat=',.0f',
     )
-    return fig
 
-def create_asset_composition_chart(asset_composition: Dict[str, float]):
+
+def create_asset_composition_chart(asset_composition: Dict[str, float], hole=0.4, title="Asset Composition"):
     """Create a donut chart for asset composition."""
-    labels = list(asset_composition.keys())
-    values = list(asset_composition.values())
-    
-    fig = px.pie(
-        names=labels,
-        values=values,
-        title="Asset Composition",
-        hole=0.4
+    return _figure(
+        [go.Pie(labels=list(asset_composition.keys()), values=list(asset_composition.values()), hole=hole,
+                textposition='inside', textinfo='percent+label')],
+        title=title,
     )
-    fig.update_traces(textposition='inside', textinfo='percent+label')
-    return fig
+
+
+def _series_chart(trace_type, series, title, y_title, **trace):
+    return _figure([trace_type(x=series.index, y=series.values, **trace)],
+                   title=title, xaxis_title='fiscalDateEnding', yaxis_title=y_title)
+
+
+def revenue_chart(statements):
+    return _series_chart(go.Bar, statements.income['totalRevenue'], 'Historical Revenue', 'totalRevenue')
+
+
+def asset_composition_chart(statements):
+    balance_sheet = statements.latest('balance_sheet')
+    current_assets = balance_sheet['totalCurrentAssets']
+    if pd.isna(current_assets):
+        raise ValueError("totalCurrentAssets is not reported")
+    assets = {
+        'Current Assets': current_assets,
+        'Non-Current Assets': balance_sheet.get('totalNonCurrentAssets', 0)
+    }
+    return create_asset_composition_chart(assets, hole=0.5)
+
+
+def profitability_chart(statements):
+    income = statements.income
+    gross_profit_margin = income['grossProfit'] / income['totalRevenue'] * 100
+    net_profit_margin = income['netIncome'] / income['totalRevenue'] * 100
+    return _figure(
+        [go.Scatter(x=income.index, y=gross_profit_margin, mode='lines+markers', name='Gross Profit Margin'),
+         go.Scatter(x=income.index, y=net_profit_margin, mode='lines+markers', name='Net Profit Margin')],
+        title='Profitability Metrics Over Time', xaxis_title='Date', yaxis_title='Percentage (%)',
+    )
+
+
+def debt_to_ebitda_chart(statements):
+    debt_ebitda = statements.fields({'balance_sheet': ['shortLongTermDebtTotal'], 'income_statement': ['ebitda']}).dropna()
+    debt_to_ebitda = debt_ebitda['shortLongTermDebtTotal'] / debt_ebitda['ebitda']
+    return _series_chart(go.Scatter, debt_to_ebitda, 'Debt to EBITDA Ratio Over Time', 'debtToEBITDA', mode='lines')
+
+
+def free_cash_flow_chart(statements):
+    cash_flow = statements.cash_flow
+    free_cash_flow = cash_flow['operatingCashflow'] - cash_flow['capitalExpenditures']
+    return _series_chart(go.Bar, free_cash_flow, 'Free Cash Flow Trend', 'freeCashFlow')
+
+
+def roic_chart(statements):
+    roic_data = statements.fields({
+        'income_statement': ['ebit'],
+        'balance_sheet': ['totalShareholderEquity', 'shortLongTermDebtTotal'],
+    }).dropna()
+    invested_capital = roic_data['totalShareholderEquity'] + roic_data['shortLongTermDebtTotal']
+    roic = roic_data['ebit'] / invested_capital * 100
+    return _series_chart(go.Scatter, roic, 'Return on Invested Capital (ROIC) Over Time', 'ROIC (%)', mode='lines')
+
+
+def peer_percentile_chart(profile, ticker):
+    """Horizontal bars of ``ticker``'s percentile among its peers on every metric (``MetricMatrix.profile``)."""
+    percentiles = profile['percentile'].dropna()
+    return _figure(
+        [go.Bar(x=percentiles.values, y=percentiles.index, orientation='h',
+                text=[f"{value:.0f}" for value in percentiles.values], textposition='auto')],
+        title=f"{ticker} Percentile Among Peers", xaxis_title='Percentile', xaxis_range=[0, 100],
+        yaxis_autorange='reversed', height=max(300, 28 * len(percentiles)),
+    )
+
+
+def peer_distribution_chart(values, metric, highlight=()):
+    """Box plot of ``metric`` over the peers in ``values`` (ticker -> value), marking the ``highlight`` tickers."""
+    values = values.dropna()
+    marked = values[values.index.isin(list(highlight))]
+    # Outliers are drawn as points only; with thousands of peers every point would be a marker
+    return _figure(
+        [go.Box(x=values.values, name=metric, boxpoints='outliers', hoverinfo='x'),
+         go.Scatter(x=marked.values, y=[metric] * len(marked), mode='markers+text', text=list(marked.index),
+                    textposition='top center', marker={'size': 12, 'symbol': 'diamond'}, name='Selected')],
+        title=f"{metric} Across {len(values)} Companies", xaxis_title=metric, showlegend=False,
+    )
+
+
+def top_companies_chart(top, metric):
+    """Bar chart of the ``top`` series (ticker -> value) returned by ``MetricMatrix.top``."""
+    return _figure(
+        [go.Bar(x=list(top.index), y=top.values, text=[f"{value:,.2f}" for value in top.values],
+                textposition='auto')],
+        title=f"Top {len(top)} by {metric}", xaxis_title='Ticker', yaxis_title=metric,
+    )
+
+
+# Chart name -> (builder taking FinancialStatements, label used in error messages), in display order
+CHARTS = OrderedDict([
+    ('revenue', (revenue_chart, "revenue chart")),
+    ('asset_composition', (asset_composition_chart, "asset composition chart")),
+    ('profitability', (profitability_chart, "profitability metrics chart")),
+    ('debt_to_ebitda', (debt_to_ebitda_chart, "Debt to EBITDA chart")),
+    ('free_cash_flow', (free_cash_flow_chart, "Free Cash Flow chart")),
+    ('roic', (roic_chart, "ROIC chart")),
+])
+
+
+class FigureJsonCache:
+    """LRU cache of serialized figures keyed by (dataset version, chart name), bounded in bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_FIGURE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            if key in self._entries:
+                self._bytes -= len(self._entries.pop(key))
+            self._entries[key] = value
+            self._bytes += len(value)
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                self._bytes -= len(self._entries.popitem(last=False)[1])
+
+    def stats(self):
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries), 'bytes': self._bytes}
+
+
+figure_json_cache = FigureJsonCache(int(os.environ.get("FIGURE_CACHE_MAX_BYTES", DEFAULT_FIGURE_CACHE_BYTES)))
+
+# Serialized form of a chart whose builder failed, so the failure is cached too
+_FAILED = ""
+
+
+class ChartSet:
+    """The charts of one dataset, built only when a figure or its JSON is first requested.
+
+    Iterating yields the figures that could be built, in ``CHARTS`` order, so a ChartSet
+    can be used wherever a list of figures was. ``version`` identifies the dataset (e.g. a
+    payload fingerprint); with one, serialized figures are shared across ChartSets through
+    ``figure_json_cache``.
+    """
+
+    def __init__(self, statements=None, version=None, names=None):
+        self.statements = statements
+        self.version = version
+        self.names = list(names or CHARTS) if statements is not None else []
+        self._figures = {}
+        self._json = {}
+        # One ChartSet is shared by the prefetch worker and every session showing the dataset
+        self._lock = threading.Lock()
+
+    def _build(self, name):
+        builder, label = CHARTS[name]
+        try:
+            with span("chart.build", chart=name):
+                return builder(self.statements)
+        except Exception as e:
+            # Usually a field this company does not report; the chart is skipped
+            logger.info("Cannot create %s: %s", label, e)
+            return None
+
+    def figure(self, name):
+        """Return the figure for ``name``, or None if it cannot be built from this dataset."""
+        with self._lock:
+            if name not in self._figures:
+                self._figures[name] = self._build(name)
+            return self._figures[name]
+
+    def json(self, name):
+        """Serialized figure for ``name`` (None if it cannot be built)."""
+        with self._lock:
+            if name not in self._json:
+                key = (self.version, name)
+                value = figure_json_cache.get(key) if self.version is not None else None
+                if value is None:
+                    # A figure built only to be serialized is not kept; the JSON replaces it
+                    fig = self._figures[name] if name in self._figures else self._build(name)
+                    with span("chart.serialize", chart=name) as serialize_span:
+                        value = _FAILED if fig is None else fig.to_json(validate=False)
+                        serialize_span.set(bytes=len(value))
+                    if self.version is not None:
+                        figure_json_cache.put(key, value)
+                self._json[name] = value
+            return self._json[name] or None
+
+    @property
+    def serialized_bytes(self):
+        """Size of the figures serialized so far."""
+        with self._lock:
+            return sum(len(value) for value in self._json.values())
+
+    @property
+    def parsed_bytes(self):
+        """Estimated memory of the serialized figures once parsed back into dicts (``json.loads``)."""
+        return PARSED_JSON_FACTOR * self.serialized_bytes
+
+    @property
+    def nbytes(self):
+        """Estimated memory held: the statement frames, the serialized figures and the figures kept
+        by ``figure``/iteration (estimated from their data, see ``estimated_json_bytes``)."""
+        with self._lock:
+            held = sum(PARSED_JSON_FACTOR * estimated_json_bytes(fig) for fig in self._figures.values()
+                       if fig is not None)
+            serialized = sum(len(value) for value in self._json.values())
+        statements = self.statements.nbytes if self.statements is not None else 0
+        return statements + serialized + held
+
+    def to_json_list(self):
+        return [value for value in map(self.json, self.names) if value is not None]
+
+    def __iter__(self):
+        for name in self.names:
+            fig = self.figure(name)
+            if fig is not None:
+                yield fig
@@ -0,0 +1,268 @@
+"""Token-budgeted context for report questions.
+
+``build_context`` turns the retrieved candidate chunks into the evidence that is
+stuffed into the QA prompt:
+
+1. Text a higher-ranked chunk already contains (the overlap between neighbouring
+   chunks, repeated headers) is removed line by line.
+2. The remaining chunks are reordered with maximal marginal relevance, trading the
+   retrieval rank against similarity to the chunks already picked, so near-duplicates
+   give way to different evidence.
+3. Chunks are packed in that order until the token budget is spent.
+
+Tokens are counted with ``tiktoken`` for the completion model. When its encoding
+cannot be loaded (it is downloaded on first use) counts fall back to an estimate of
+4 characters per token, and are flagged as estimated. Every call is recorded in
+``ContextMetrics`` and as a ``qa.context`` telemetry span.
+"""
+import logging
+import os
+import re
+import threading
+from collections import deque
+from dataclasses import dataclass, field
+
+import numpy as np
+from langchain_core.documents import Document
+
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL = "gpt-3.5-turbo-instruct"
+DEFAULT_TOKEN_BUDGET = 800
+# Weight of retrieval rank against diversity when ordering chunks
+MMR_LAMBDA = 0.7
+# Lines shorter than this are only dropped when repeated whole, not when contained in earlier text
+MIN_CONTAINED_LINE = 20
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class TokenCounter:
+    """Count tokens with the tiktoken encoding of ``model``, or estimate them if it is unavailable."""
+
+    def __init__(self, model=DEFAULT_MODEL):
+        self.model = model
+        try:
+            import tiktoken
+
+            try:
+                self._encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception as e:
+            logger.warning("tiktoken encoding for %s unavailable (%s); estimating 4 characters per token", model, e)
+            self._encoding = None
+
+    @property
+    def exact(self):
+        return self._encoding is not None
+
+    def count(self, text):
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return (len(text) + 3) // 4
+
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model=DEFAULT_MODEL):
+    with _counters_lock:
+        if model not in _counters:
+            _counters[model] = TokenCounter(model)
+        return _counters[model]
+
+
+def token_budget():
+    return int(os.environ.get("CONTEXT_TOKEN_BUDGET", DEFAULT_TOKEN_BUDGET))
+
+
+def deduplicate(texts):
+    """Remove from each text the lines that an earlier text already contains.
+
+    Returns the remaining text of each input, in order (empty when nothing new is left).
+    """
+    seen_lines, result = set(), []
+    # Normalized earlier texts, newline-separated so a line cannot match across two of them
+    earlier = ""
+    for text in texts:
+        kept, kept_normalized = [], []
+        # Lowercased once per text; the lines only have their whitespace collapsed
+        for line, lowered in zip(text.splitlines(), text.lower().splitlines()):
+            normalized = " ".join(lowered.split())
+            if not normalized or normalized in seen_lines:
+                continue
+            # Splitter overlap can start or end mid-line, leaving a fragment of an earlier line
+            if len(normalized) >= MIN_CONTAINED_LINE and normalized in earlier:
+                continue
+            seen_lines.add(normalized)
+            kept.append(line)
+            kept_normalized.append(normalized)
+        result.append("\n".join(kept))
+        earlier += "\n" + " ".join(kept_normalized)
+    return result
+
+
+def _word_sets(texts):
+    return [set(WORD_PATTERN.findall(text.lower())) for text in texts]
+
+
+def similarity_matrix(texts, vectors=None):
+    """Pairwise cosine similarity of ``vectors``, or word-set Jaccard similarity of ``texts`` without them."""
+    if vectors is not None:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        unit = vectors / np.where(norms == 0, 1, norms)
+        return unit @ unit.T
+    words = _word_sets(texts)
+    matrix = np.eye(len(texts), dtype=np.float32)
+    for i in range(len(texts)):
+        for j in range(i + 1, len(texts)):
+            union = len(words[i] | words[j])
+            matrix[i, j] = matrix[j, i] = len(words[i] & words[j]) / union if union else 0.0
+    return matrix
+
+
+def mmr_order(relevance, similarity, lambda_mult=MMR_LAMBDA):
+    """Order candidates by maximal marginal relevance.
+
+    Each step picks the candidate maximizing ``lambda_mult * relevance - (1 - lambda_mult) *
+    max similarity to the already picked ones``.
+    """
+    relevance = np.asarray(relevance, dtype=np.float64)
+    picked = np.zeros(len(relevance), dtype=bool)
+    # Max similarity of every candidate to the picked ones, updated with each pick
+    redundancy = np.zeros(len(relevance))
+    order = []
+    for _ in range(len(relevance)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[picked] = -np.inf
+        best = int(np.argmax(scores))
+        redundancy = similarity[:, best] if not order else np.maximum(redundancy, similarity[:, best])
+        picked[best] = True
+        order.append(best)
+    return order
+
+
+def _truncate(text, budget, counter):
+    # Keep whole lines of an oversized first chunk while they fit
+    kept, tokens = [], 0
+    for line in text.splitlines():
+        line_tokens = counter.count(line + "\n")
+        if tokens + line_tokens > budget:
+            break
+        kept.append(line)
+        tokens += line_tokens
+    return "\n".join(kept)
+
+
+@dataclass
+class PackedContext:
+    documents: list
+    tokens: int
+    budget: int
+    candidates: int
+    # Tokens of the top candidates as they would have been stuffed without packing
+    baseline_tokens: int
+    duplicate_tokens: int
+    exact: bool
+    dropped: list = field(default_factory=list)
+
+    def as_dict(self):
+        return {
+            'candidates': self.candidates,
+            'selected': len(self.documents),
+            'tokens': self.tokens,
+            'budget': self.budget,
+            'baseline_tokens': self.baseline_tokens,
+            'duplicate_tokens': self.duplicate_tokens,
+            'exact_tokens': self.exact,
+        }
+
+
+def build_context(documents, vectors=None, budget=None, counter=None, lambda_mult=MMR_LAMBDA,
+                  baseline_k=4, metrics=None):
+    """Select and pack retrieved ``documents`` (best first) into at most ``budget`` tokens.
+
+    ``vectors`` are the candidates' embeddings, used for the MMR similarity; without them
+    the word overlap of the chunk texts is used. Relevance is the retrieval rank, scaled
+    from 1 for the first candidate towards 0 for the last. ``baseline_k`` is how many
+    raw top candidates the unpacked prompt would have held, for the savings metric.
+    """
+    counter = counter or get_token_counter()
+    budget = budget or token_budget()
+    metrics = metrics or _metrics
+    with span("qa.context", candidates=len(documents), budget=budget) as context_span:
+        raw_tokens = [counter.count(doc.page_content) for doc in documents]
+        texts = deduplicate([doc.page_content for doc in documents])
+        unique_tokens = [counter.count(text) if text else 0 for text in texts]
+        kept = [i for i, text in enumerate(texts) if text]
+
+        relevance = 1.0 - np.arange(len(documents)) / max(len(documents), 1)
+        similarity = similarity_matrix([texts[i] for i in kept],
+                                       None if vectors is None else np.asarray(vectors)[kept])
+        order = [kept[i] for i in mmr_order(relevance[kept], similarity, lambda_mult)]
+
+        packed, dropped, tokens = [], [], 0
+        for i in order:
+            text, cost = texts[i], unique_tokens[i]
+            if tokens + cost > budget:
+                if packed:
+                    dropped.append(i)
+                    continue
+                text = _truncate(text, budget, counter)
+                cost = counter.count(text)
+                if not text:
+                    dropped.append(i)
+                    continue
+            packed.append(Document(page_content=text, metadata=documents[i].metadata))
+            tokens += cost
+
+        packed_context = PackedContext(
+            documents=packed, tokens=tokens, budget=budget, candidates=len(documents),
+            baseline_tokens=sum(raw_tokens[:baseline_k]),
+            duplicate_tokens=sum(raw - unique for raw, unique in zip(raw_tokens, unique_tokens)),
+            exact=counter.exact, dropped=dropped)
+        context_span.set(**packed_context.as_dict(), tokens_saved=packed_context.baseline_tokens - tokens)
+    metrics.record(packed_context)
+    return packed_context
+
+
+class ContextMetrics:
+    """The most recent ``window`` packed contexts, for per-call and summary reporting."""
+
+    def __init__(self, window=256):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=window)
+
+    def record(self, packed_context):
+        with self._lock:
+            self._samples.append(packed_context.as_dict())
+
+    def last(self):
+        with self._lock:
+            return dict(self._samples[-1]) if self._samples else None
+
+    def summary(self):
+        """Return count, mean packed and baseline tokens, and the mean share of tokens saved."""
+        with self._lock:
+            samples = list(self._samples)
+        if not samples:
+            return {}
+        tokens = np.array([s['tokens'] for s in samples], dtype=float)
+        baseline = np.array([s['baseline_tokens'] for s in samples], dtype=float)
+        return {
+            'count': len(samples),
+            'tokens_mean': float(tokens.mean()),
+            'baseline_tokens_mean': float(baseline.mean()),
+            'saved_share': float(1 - tokens.sum() / baseline.sum()) if baseline.sum() else 0.0,
+        }
+
+
+_metrics = ContextMetrics()
+
+
+def get_context_metrics():
+    return _metrics
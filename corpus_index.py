@@ -0,0 +1,393 @@
+"""Incremental vector index over many annual reports.
+
+Reports are added one at a time without rebuilding what is already indexed. Chunk
+vectors live in a single FAISS index whose positions are the chunk ids, while chunk
+text and metadata (report, ticker, fiscal year, page) live in SQLite next to it.
+Metadata filters are resolved to an id set in SQLite and passed to FAISS as an
+``IDSelector``, so a filtered query only scores the matching chunks.
+
+Chunk text is also indexed in an SQLite FTS5 table (an inverted index ranked with
+BM25), kept in step with the chunks table. ``hybrid_search_ids`` runs the dense and
+the BM25 search side by side and merges them with reciprocal rank fusion, so exact
+line-item terms ("deferred revenue") are found even when they are not what the
+embedding ranks highest.
+
+The index type comes from an ``IndexConfig`` (exact flat search by default, or
+IVF/HNSW/PQ/SQ8). The exact float32 vectors are also archived in ``vectors.f32`` so
+the index can be retrained or rebuilt with another type at any time, and ``ivf_pq``
+candidates are re-ranked against them; IVF types start out as a flat index and are
+trained automatically once enough vectors exist.
+"""
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from telemetry import span
+from vector_index import IndexConfig, build_index, refine
+
+DEFAULT_CORPUS_PATH = os.path.join(".cache", "corpus")
+
+FILTER_COLUMNS = {'ticker', 'fiscal_year', 'report_key'}
+
+# Reciprocal rank fusion constant: a result at rank r contributes 1 / (RRF_K + r)
+RRF_K = 60
+QUERY_TERM_PATTERN = re.compile(r"\w+")
+STOPWORDS = frozenset(
+    "a an and are as at be by did do does for from has have how in is it its of on or that the their this "
+    "to was were what when which who why with".split())
+
+
+def fts_query(text):
+    """An FTS5 query matching any content word of ``text``; None if it has none.
+
+    Adjacent content words are also matched as phrases, so chunks with the exact
+    line item ("deferred revenue") rank above chunks that only share its words.
+    """
+    terms = [term for term in QUERY_TERM_PATTERN.findall(text.lower()) if term not in STOPWORDS]
+    if not terms:
+        return None
+    phrases = [f"{first} {second}" for first, second in zip(terms, terms[1:])]
+    return " OR ".join(f'"{term}"' for term in dict.fromkeys(terms + phrases))
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Merge ranked id lists into ``(ids, scores)``, best first, scoring each id by ``sum(1 / (k + rank))``."""
+    scores = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(ranking, 1):
+            scores[int(chunk_id)] = scores.get(int(chunk_id), 0.0) + 1.0 / (k + rank)
+    ordered = sorted(scores.items(), key=lambda item: -item[1])
+    return (np.fromiter((chunk_id for chunk_id, _ in ordered), dtype=np.int64, count=len(ordered)),
+            np.fromiter((score for _, score in ordered), dtype=np.float32, count=len(ordered)))
+
+
+class CorpusIndex:
+    def __init__(self, embeddings, root=None, index_config=None):
+        self.embeddings = embeddings
+        self.config = index_config or IndexConfig.from_env()
+        self.root = root or os.environ.get("CORPUS_INDEX_PATH", DEFAULT_CORPUS_PATH)
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(self.root, "chunks.sqlite"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS reports (
+                report_key TEXT PRIMARY KEY,
+                name TEXT,
+                ticker TEXT,
+                fiscal_year INTEGER,
+                chunk_count INTEGER NOT NULL,
+                added_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS chunks (
+                id INTEGER PRIMARY KEY,
+                report_key TEXT NOT NULL,
+                ticker TEXT,
+                fiscal_year INTEGER,
+                page INTEGER,
+                text TEXT NOT NULL,
+                source TEXT
+            );
+            CREATE INDEX IF NOT EXISTS chunks_ticker_year ON chunks (ticker, fiscal_year);
+            CREATE INDEX IF NOT EXISTS chunks_report ON chunks (report_key);
+            CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5(
+                text, content='chunks', content_rowid='id', tokenize='porter unicode61'
+            );
+            """
+        )
+        model = getattr(embeddings, "model", None)
+        stored = self._meta("embedding_model")
+        if stored is None and model is not None:
+            self._set_meta("embedding_model", model)
+        elif model is not None and stored != model:
+            raise ValueError(f"corpus at {self.root} was built with {stored}, not {model}")
+        self.index = self._load_index()
+        self.active_kind = self._meta("index_kind") or 'flat'
+        # Bumped whenever chunks or their metadata change, so answers cached against the corpus go stale
+        self.generation = int(self._meta("generation") or 0)
+        self._drop_unindexed_chunks()
+
+    @property
+    def _index_path(self):
+        return os.path.join(self.root, "index.faiss")
+
+    def _meta(self, key):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, str(value)))
+
+    def _load_index(self):
+        if not os.path.exists(self._index_path):
+            return None
+        return faiss.read_index(self._index_path)
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.root, "vectors.f32")
+
+    def _drop_unindexed_chunks(self):
+        # Ids are assigned contiguously, so rows at or past ntotal were committed to SQLite
+        # by an add whose index write never happened (e.g. a crash in between)
+        indexed = self.index.ntotal if self.index is not None else 0
+        if os.path.exists(self._vectors_path):
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(indexed * 4 * self.index.d if indexed else 0)
+        with self._conn:
+            self._conn.execute("INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+                               "SELECT 'delete', id, text FROM chunks WHERE id >= ?", (indexed,))
+            self._conn.execute("DELETE FROM chunks WHERE id >= ?", (indexed,))
+            self._conn.execute("DELETE FROM reports WHERE report_key NOT IN (SELECT DISTINCT report_key FROM chunks)")
+
+    def archived_vectors(self):
+        """Memory-map the exact vectors of every indexed chunk, in id order."""
+        count = len(self)
+        if count == 0:
+            return np.empty((0, 0), dtype=np.float32)
+        return np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(count, self.index.d))
+
+    def rebuild(self, config=None, batch_size=65536):
+        """Rebuild the index from the archived vectors, e.g. to switch type or retrain IVF centroids."""
+        with span("corpus.rebuild", kind=(config or self.config).kind, vectors=len(self)), self._lock:
+            config = config or self.config
+            vectors = self.archived_vectors()
+            if len(vectors) == 0:
+                self.config = config
+                return
+            training = None
+            if config.needs_training:
+                # A strided sample of up to 256 points per centroid keeps training time bounded
+                step = max(1, len(vectors) // (config.nlist * 256))
+                training = np.ascontiguousarray(vectors[::step])
+            index = build_index(config, vectors.shape[1], training)
+            for start in range(0, len(vectors), batch_size):
+                index.add(np.ascontiguousarray(vectors[start:start + batch_size]))
+            self.index, self.config, self.active_kind = index, config, config.kind
+            self._set_meta("index_kind", config.kind)
+            self.save()
+
+    def _maybe_train(self):
+        # IVF types need training data; until there is enough, the corpus is served by a flat index
+        if self.active_kind != self.config.kind and len(self) >= self.config.min_training_vectors():
+            self.rebuild()
+
+    def _bump_generation(self):
+        self.generation += 1
+        self._set_meta("generation", self.generation)
+
+    def save(self):
+        with self._lock:
+            if self.index is None:
+                return
+            staging = self._index_path + ".tmp"
+            faiss.write_index(self.index, staging)
+            os.replace(staging, self._index_path)
+
+    def __contains__(self, report_key):
+        with self._lock:
+            row = self._conn.execute("SELECT 1 FROM reports WHERE report_key = ?", (report_key,)).fetchone()
+        return row is not None
+
+    def __len__(self):
+        return self.index.ntotal if self.index is not None else 0
+
+    def reports(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT report_key, name, ticker, fiscal_year, chunk_count FROM reports ORDER BY ticker, fiscal_year"
+            ).fetchall()
+        return [dict(zip(['report_key', 'name', 'ticker', 'fiscal_year', 'chunk_count'], row)) for row in rows]
+
+    def add_report(self, report_key, texts, vectors, metadatas, ticker=None, fiscal_year=None, name=None,
+                   persist=True):
+        """Add one report's chunks; a report already in the corpus is left untouched.
+
+        Returns the number of chunks added.
+        """
+        ticker = ticker.upper() if ticker else None
+        fiscal_year = int(fiscal_year) if fiscal_year else None
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with span("corpus.add", report_key=report_key, chunks=len(texts), bytes=vectors.nbytes), self._lock:
+            if report_key in self:
+                return 0
+            if self.index is None:
+                self.index = build_index(IndexConfig('flat'), vectors.shape[1])
+                self.active_kind = 'flat'
+            elif vectors.shape[1] != self.index.d:
+                raise ValueError(f"expected {self.index.d}-dimensional vectors, got {vectors.shape[1]}")
+            # Chunk ids are index positions: the next id is always the current index size
+            start = self.index.ntotal
+            ids = np.arange(start, start + len(texts), dtype=np.int64)
+            rows = [
+                (int(chunk_id), report_key, ticker, fiscal_year, metadata.get('page'), text, metadata.get('source'))
+                for chunk_id, text, metadata in zip(ids, texts, metadatas)
+            ]
+            with self._conn:
+                self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute("INSERT INTO chunks_fts (rowid, text) SELECT id, text FROM chunks "
+                                   "WHERE id >= ?", (start,))
+                self._conn.execute(
+                    "INSERT INTO reports VALUES (?, ?, ?, ?, ?, ?)",
+                    (report_key, name, ticker, fiscal_year, len(texts), time.time()))
+            with open(self._vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self.index.add(vectors)
+            self._bump_generation()
+            if persist:
+                self.save()
+            self._maybe_train()
+        return len(texts)
+
+    def tag_report(self, report_key, ticker=None, fiscal_year=None):
+        """Set the ticker and/or fiscal year of a report already in the corpus."""
+        updates = {}
+        if ticker:
+            updates['ticker'] = ticker.upper()
+        if fiscal_year:
+            updates['fiscal_year'] = int(fiscal_year)
+        if not updates:
+            return
+        assignments = ', '.join(f"{column} = ?" for column in updates)
+        with self._lock:
+            current = self._conn.execute(
+                f"SELECT {', '.join(updates)} FROM reports WHERE report_key = ?", (report_key,)).fetchone()
+            if current is None or list(current) == list(updates.values()):
+                return
+            with self._conn:
+                for table in ('reports', 'chunks'):
+                    self._conn.execute(f"UPDATE {table} SET {assignments} WHERE report_key = ?",
+                                       [*updates.values(), report_key])
+                self._bump_generation()
+
+    def add_vectorstore(self, report_key, vectorstore, ticker=None, fiscal_year=None, name=None):
+        """Add the chunks of a per-report langchain FAISS store, reusing its vectors."""
+        count = vectorstore.index.ntotal
+        vectors = vectorstore.index.reconstruct_n(0, count)
+        docs = [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in range(count)]
+        return self.add_report(report_key, [doc.page_content for doc in docs], vectors,
+                               [doc.metadata for doc in docs], ticker=ticker, fiscal_year=fiscal_year, name=name)
+
+    def _filter_clauses(self, filters):
+        clauses, params = [], []
+        for column, value in filters.items():
+            if column not in FILTER_COLUMNS:
+                raise ValueError(f"unsupported filter {column!r}; expected one of {sorted(FILTER_COLUMNS)}")
+            values = list(value) if isinstance(value, (list, tuple, set)) else [value]
+            if not values or values == [None]:
+                continue
+            if column == 'ticker':
+                values = [str(v).upper() for v in values]
+            elif column == 'fiscal_year':
+                values = [int(v) for v in values]
+            clauses.append(f"chunks.{column} IN ({', '.join('?' * len(values))})")
+            params.extend(values)
+        return clauses, params
+
+    def _filter_ids(self, filters):
+        clauses, params = self._filter_clauses(filters)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        rows = self._conn.execute(f"SELECT id FROM chunks {where}", params).fetchall()
+        return np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+
+    def search_ids(self, query_vector, k=4, filters=None):
+        """Return ``(ids, distances)`` of the ``k`` nearest chunks matching ``filters``."""
+        with span("corpus.search", k=k, kind=self.active_kind, filtered=bool(filters)), self._lock:
+            if self.index is None or self.index.ntotal == 0:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            query = np.asarray([query_vector], dtype=np.float32)
+            selector = None
+            if filters:
+                ids = self._filter_ids(filters)
+                if len(ids) == 0:
+                    return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+                selector = faiss.IDSelectorBatch(ids)
+                k = min(k, len(ids))
+            config = self.config if self.active_kind == self.config.kind else IndexConfig(self.active_kind)
+            fetch = k * config.refine_factor if config.refines else k
+            distances, ids = self.index.search(query, fetch, params=config.search_parameters(selector))
+            if config.refines:
+                return refine(query[0], ids[0], self.archived_vectors(), k)
+        keep = ids[0] >= 0
+        return ids[0][keep], distances[0][keep]
+
+    def text_search_ids(self, query, k=4, filters=None):
+        """Return ``(ids, scores)`` of the ``k`` chunks ranked best by BM25 for the words of ``query``.
+
+        Scores are FTS5 ``bm25()`` values, lower is better.
+        """
+        match = fts_query(query)
+        with span("corpus.text_search", k=k, filtered=bool(filters)), self._lock:
+            if match is None:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            clauses, params = self._filter_clauses(filters or {})
+            where = "".join(f" AND {clause}" for clause in clauses)
+            join = " JOIN chunks ON chunks.id = chunks_fts.rowid" if clauses else ""
+            rows = self._conn.execute(
+                f"SELECT chunks_fts.rowid, bm25(chunks_fts) FROM chunks_fts{join} "
+                f"WHERE chunks_fts MATCH ?{where} ORDER BY bm25(chunks_fts) LIMIT ?",
+                [match, *params, k]).fetchall()
+        return (np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows)),
+                np.fromiter((row[1] for row in rows), dtype=np.float32, count=len(rows)))
+
+    def hybrid_search_ids(self, query, query_vector, k=4, filters=None, candidates=20):
+        """Fuse the top ``candidates`` of the dense and the BM25 search; returns ``(ids, fused scores)``."""
+        with span("corpus.hybrid_search", k=k, candidates=candidates, filtered=bool(filters)):
+            dense_ids, _ = self.search_ids(query_vector, k=candidates, filters=filters)
+            text_ids, _ = self.text_search_ids(query, k=candidates, filters=filters)
+            ids, scores = reciprocal_rank_fusion([dense_ids, text_ids])
+        return ids[:k], scores[:k]
+
+    def documents(self, ids):
+        if len(ids) == 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT id, text, report_key, ticker, fiscal_year, page, source FROM chunks "
+                f"WHERE id IN ({', '.join('?' * len(ids))})", [int(i) for i in ids]).fetchall()
+        by_id = {
+            row[0]: Document(page_content=row[1], metadata={
+                'chunk_id': row[0], 'report_key': row[2], 'ticker': row[3], 'fiscal_year': row[4],
+                'page': row[5], 'source': row[6]})
+            for row in rows
+        }
+        return [by_id[int(i)] for i in ids if int(i) in by_id]
+
+    def similarity_search(self, query, k=4, filters=None, embeddings=None):
+        """Same call shape as langchain's ``FAISS.similarity_search``, plus metadata ``filters``.
+
+        ``filters`` maps ``ticker``, ``fiscal_year`` or ``report_key`` to a value or a list of
+        values. ``embeddings`` overrides the query embedder, e.g. with a session's own API key.
+        """
+        embeddings = embeddings or self.embeddings
+        ids, _ = self.search_ids(embeddings.embed_query(query), k=k, filters=filters)
+        return self.documents(ids)
+
+    def hybrid_search(self, query, k=4, filters=None, embeddings=None, candidates=20):
+        """``similarity_search`` with the dense results fused with a BM25 search of the same query."""
+        embeddings = embeddings or self.embeddings
+        ids, _ = self.hybrid_search_ids(query, embeddings.embed_query(query), k=k, filters=filters,
+                                        candidates=candidates)
+        return self.documents(ids)
+
+
+_corpora = {}
+_corpora_lock = threading.Lock()
+
+
+def get_corpus(embeddings, root=None, index_config=None):
+    """Return the process-wide CorpusIndex for ``root`` so all sessions share one index."""
+    root = os.path.abspath(root or os.environ.get("CORPUS_INDEX_PATH", DEFAULT_CORPUS_PATH))
+    with _corpora_lock:
+        if root not in _corpora:
+            _corpora[root] = CorpusIndex(embeddings, root, index_config)
+        return _corpora[root]
@@ -1,331 +1,247 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 import requests
+from requests.adapters import HTTPAdapter
 import pandas as pd
-import numpy as np
-import plotly.express as px
-import plotly.graph_objects as go
-from openai import OpenAI
-
-def fetch_financial_data(ticker, api_key):
-    # Fetch data from Alpha Vantage API
-    base_url = "https://www.alphavantage.co/query"
-
-    # Income Statement
-    params_is = {
-        "function": "INCOME_STATEMENT",
-        "symbol": ticker,
-        "apikey": api_key
-    }
-    response_is = requests.get(base_url, params=params_is)
-    if response_is.status_code != 200:
-        return None
-    data_is = response_is.json()
 
-    # Balance Sheet
-    params_bs = {
-        "function": "BALANCE_SHEET",
-        "symbol": ticker,
-        "apikey": api_key
-    }
-    response_bs = requests.get(base_url, params=params_bs)
-    if response_bs.status_code != 200:
+from chart_generation import ChartSet
+from llm_clients import get_openai_client
+from llm_metrics import timed_stream
+from metrics_engine import latest_metrics
+from pipeline_cache import PipelineEntry, get_pipeline_cache, payload_fingerprint
+from statement_model import FinancialStatements
+from statement_cache import get_statement_cache
+from telemetry import bind_context, span
+
+logger = logging.getLogger(__name__)
+
+ALPHA_VANTAGE_URL = "https://www.alphavantage.co/query"
+
+STATEMENT_FUNCTIONS = {
+    'income_statement': "INCOME_STATEMENT",
+    'balance_sheet': "BALANCE_SHEET",
+    'cash_flow': "CASH_FLOW",
+}
+
+def cache_function(function, base_url=ALPHA_VANTAGE_URL):
+    """Statement cache key for ``function`` as answered by ``base_url``.
+
+    Responses from anywhere but the Alpha Vantage API (a stub server, another provider)
+    are stored under a key qualified by a digest of the URL, so they are never served
+    as Alpha Vantage data.
+    """
+    if base_url == ALPHA_VANTAGE_URL:
+        return function
+    return f"{function}@{hashlib.blake2b(base_url.encode(), digest_size=8).hexdigest()}"
+
+_session = None
+_session_lock = threading.Lock()
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="statement-fetch")
+
+def get_session():
+    """Return the shared requests session with pooled keep-alive connections."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+def is_statement_payload(data):
+    """Alpha Vantage answers rate limits and bad symbols with 200 + a Note/Information/Error body."""
+    return isinstance(data, dict) and ('annualReports' in data or 'quarterlyReports' in data)
+
+def provider_message(data):
+    """Return the Note/Information/Error Message text of an Alpha Vantage refusal (None if there is none)."""
+    if not isinstance(data, dict):
         return None
-    data_bs = response_bs.json()
-
-    # Cash Flow
-    params_cf = {
-        "function": "CASH_FLOW",
-        "symbol": ticker,
-        "apikey": api_key
-    }
-    response_cf = requests.get(base_url, params=params_cf)
-    if response_cf.status_code != 200:
+    return data.get('Note') or data.get('Information') or data.get('Error Message')
+
+def _fetch_statement(function, ticker, api_key, base_url, cache, rate_limiter, refresh=False):
+    with span("fetch.statement", function=function, ticker=ticker) as fetch_span:
+        if cache and not refresh:
+            cached = cache.get(cache_function(function, base_url), ticker)
+            if cached is not None:
+                fetch_span.set(cache_hit=True)
+                return cached
+
+        # Only requests that actually reach the provider count against the quota
+        if rate_limiter is not None:
+            rate_limiter.acquire()
+
+        params = {
+            "function": function,
+            "symbol": ticker,
+            "apikey": api_key
+        }
+        response = get_session().get(base_url, params=params, timeout=30)
+        fetch_span.set(cache_hit=False, status_code=response.status_code, bytes=len(response.content))
+        if response.status_code != 200:
+            logger.warning("%s %s: HTTP %s", function, ticker, response.status_code)
+            return None
+        data = response.json()
+        if is_statement_payload(data):
+            if cache:
+                cache.set(cache_function(function, base_url), ticker, data)
+        else:
+            # Passed on so the page can show the provider's message, but never cached
+            logger.warning("%s %s: %s", function, ticker, provider_message(data) or "no report data")
+            fetch_span.set(refused=True)
+        return data
+
+def _fetch_from_providers(ticker, providers, cache, refresh):
+    from data_providers import ProviderError
+
+    # Statements are cached under the URL of the provider that answered, so another
+    # provider's normalized payloads are never served as Alpha Vantage responses
+    if cache and not refresh:
+        for provider in providers.providers:
+            cached = {statement: cache.get(cache_function(function, provider.base_url), ticker)
+                      for statement, function in STATEMENT_FUNCTIONS.items()}
+            if all(data is not None for data in cached.values()):
+                return cached
+    try:
+        provider, financial_data = providers.answer(ticker)
+    except ProviderError as e:
+        logger.warning("%s: %s", ticker, e)
         return None
-    data_cf = response_cf.json()
+    if cache:
+        for statement, function in STATEMENT_FUNCTIONS.items():
+            cache.set(cache_function(function, provider.base_url), ticker, financial_data[statement])
+    return financial_data
 
-    financial_data = {
-        'income_statement': data_is,
-        'balance_sheet': data_bs,
-        'cash_flow': data_cf
+def fetch_financial_data(ticker, api_key, base_url=ALPHA_VANTAGE_URL, cache=None, rate_limiter=None, refresh=False,
+                         providers=None):
+    # Serve statements from the on-disk cache; pass cache=False to always hit the API, or
+    # refresh=True to ask the API while still storing the new responses in the cache
+    if cache is None:
+        cache = get_statement_cache()
+
+    # A data_providers.ProviderChain replaces the direct Alpha Vantage requests (and their
+    # api_key/base_url/rate_limiter); refusals and failures of every provider return None
+    if providers is not None:
+        return _fetch_from_providers(ticker, providers, cache, refresh)
+
+    # Fetch the three statements from Alpha Vantage concurrently over the shared session
+    futures = {
+        statement: _executor.submit(bind_context(_fetch_statement), function, ticker, api_key, base_url, cache,
+                                    rate_limiter, refresh)
+        for statement, function in STATEMENT_FUNCTIONS.items()
     }
-    return financial_data
 
-def process_financial_data(financial_data):
-    print("Financial Data Structure:")
-    print(financial_data.keys())
-    for statement in ['income_statement', 'balance_sheet', 'cash_flow']:
-        print(f"{statement.capitalize()} Structure:")
-        print(financial_data[statement].keys())
-    
-    # Check if 'annualReports' exists
-    if 'annualReports' not in financial_data['income_statement']:
-        print("Warning: 'annualReports' not found in income statement data")
-        # Try to use quarterlyReports instead
-        if 'quarterlyReports' in financial_data['income_statement']:
-            print("Using quarterlyReports for income statement")
-            income_statement = financial_data['income_statement']['quarterlyReports'][0]
-        else:
-            print("Error: No financial report data available")
-            return pd.DataFrame({'Error': ['No financial report data available']}), []
-    else:
-        income_statement = financial_data['income_statement']['annualReports'][0]
+    financial_data = {}
+    for statement, future in futures.items():
+        data = future.result()
+        if data is None:
+            return None
+        financial_data[statement] = data
+    return financial_data
 
-    # Similar checks for balance sheet and cash flow
-    if 'annualReports' not in financial_data['balance_sheet']:
-        if 'quarterlyReports' in financial_data['balance_sheet']:
-            balance_sheet = financial_data['balance_sheet']['quarterlyReports'][0]
-        else:
-            return pd.DataFrame({'Error': ['No balance sheet data available']}), []
-    else:
-        balance_sheet = financial_data['balance_sheet']['annualReports'][0]
+def process_financial_data(financial_data, version=None):
+    """Compute the metrics table and a lazy ``ChartSet`` from raw payloads or parsed FinancialStatements.
 
-    if 'annualReports' not in financial_data['cash_flow']:
-        if 'quarterlyReports' in financial_data['cash_flow']:
-            cash_flow = financial_data['cash_flow']['quarterlyReports'][0]
-        else:
-            return pd.DataFrame({'Error': ['No cash flow data available']}), []
+    ``version`` identifies the dataset so serialized charts can be reused across calls; for
+    raw payloads it defaults to their fingerprint.
+    """
+    if isinstance(financial_data, FinancialStatements):
+        statements = financial_data
     else:
-        cash_flow = financial_data['cash_flow']['annualReports'][0]
-
-    # Calculate metrics
-    metrics = {}
-
-    try:
-        revenue = float(income_statement['totalRevenue'])
-        metrics['Revenue'] = revenue
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating revenue: {e}")
-        revenue = None
-
-    try:
-        cogs = float(income_statement['costOfRevenue'])
-        metrics['Cost of Goods Sold'] = cogs
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating cost of revenue: {e}")
-        cogs = None
-
-    if revenue is not None and cogs is not None:
-        gross_profit = revenue - cogs
-        gross_profit_margin = (gross_profit / revenue) * 100 if revenue != 0 else None
-        metrics['Gross Profit'] = gross_profit
-        metrics['Gross Profit Margin (%)'] = round(gross_profit_margin, 2) if gross_profit_margin is not None else None
-
-    try:
-        net_income = float(income_statement['netIncome'])
-        metrics['Net Income'] = net_income
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating net income: {e}")
-        net_income = None
-
-    if revenue is not None and net_income is not None:
-        net_profit_margin = (net_income / revenue) * 100 if revenue != 0 else None
-        metrics['Net Profit Margin (%)'] = round(net_profit_margin, 2) if net_profit_margin is not None else None
-
-    try:
-        current_assets = float(balance_sheet['totalCurrentAssets'])
-        current_liabilities = float(balance_sheet['totalCurrentLiabilities'])
-        current_ratio = current_assets / current_liabilities if current_liabilities != 0 else None
-        metrics['Current Ratio'] = round(current_ratio, 2) if current_ratio is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating current ratio: {e}")
-
-    try:
-        total_assets = float(balance_sheet['totalAssets'])
-        total_liabilities = float(balance_sheet['totalLiabilities'])
-        total_shareholder_equity = float(balance_sheet['totalShareholderEquity'])
-        debt_to_equity = total_liabilities / total_shareholder_equity if total_shareholder_equity != 0 else None
-        metrics['Debt-to-Equity Ratio'] = round(debt_to_equity, 2) if debt_to_equity is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating debt-to-equity ratio: {e}")
-
-    try:
-        operating_cash_flow = float(cash_flow['operatingCashflow'])
-        operating_cash_flow_margin = (operating_cash_flow / revenue) * 100 if revenue != 0 else None
-        metrics['Operating Cash Flow'] = operating_cash_flow
-        metrics['Operating Cash Flow Margin (%)'] = round(operating_cash_flow_margin, 2) if operating_cash_flow_margin is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating operating cash flow margin: {e}")
-
-    try:
-        roa = (net_income / total_assets) * 100 if total_assets != 0 else None
-        metrics['Return on Assets (%)'] = round(roa, 2) if roa is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating return on assets: {e}")
-
-    try:
-        roe = (net_income / total_shareholder_equity) * 100 if total_shareholder_equity != 0 else None
-        metrics['Return on Equity (%)'] = round(roe, 2) if roe is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating return on equity: {e}")
-
-    try:
-        common_stock_shares_outstanding = float(balance_sheet['commonStockSharesOutstanding'])
-        eps = net_income / common_stock_shares_outstanding if common_stock_shares_outstanding != 0 else None
-        metrics['Earnings Per Share (EPS)'] = round(eps, 2) if eps is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating earnings per share: {e}")
-
-    try:
-        market_cap = float(balance_sheet.get('marketCapitalization', 0))
-        pe_ratio = market_cap / net_income if net_income != 0 else None
-        metrics['Price to Earnings (P/E) Ratio'] = round(pe_ratio, 2) if pe_ratio is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating P/E ratio: {e}")
-
-    try:
-        ebitda = float(income_statement.get('ebitda', 0))
-        total_debt = float(balance_sheet.get('shortLongTermDebtTotal', 0))
-        debt_to_ebitda = total_debt / ebitda if ebitda != 0 else None
-        metrics['Debt to EBITDA Ratio'] = round(debt_to_ebitda, 2) if debt_to_ebitda is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Debt to EBITDA ratio: {e}")
-
-    try:
-        capital_expenditure = float(cash_flow.get('capitalExpenditures', 0))
-        free_cash_flow = operating_cash_flow - capital_expenditure
-        metrics['Free Cash Flow'] = round(free_cash_flow, 2)
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Free Cash Flow: {e}")
-
-    try:
-        free_cash_flow_yield = (free_cash_flow / market_cap) * 100 if market_cap != 0 else None
-        metrics['Free Cash Flow Yield (%)'] = round(free_cash_flow_yield, 2) if free_cash_flow_yield is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Free Cash Flow Yield: {e}")
-
-    # New metrics
-    try:
-        book_value = float(balance_sheet['totalShareholderEquity'])
-        price_to_book = market_cap / book_value if book_value != 0 else None
-        metrics['Price-to-Book Ratio'] = round(price_to_book, 2) if price_to_book is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Price-to-Book Ratio: {e}")
-
-    try:
-        dividends_paid = abs(float(cash_flow.get('cashDividendsPaid', 0)))
-        dividend_yield = (dividends_paid / market_cap) * 100 if market_cap != 0 else None
-        metrics['Dividend Yield (%)'] = round(dividend_yield, 2) if dividend_yield is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Dividend Yield: {e}")
-
-    try:
-        ebit = float(income_statement.get('ebit', 0))
-        invested_capital = total_shareholder_equity + total_debt
-        roic = (ebit / invested_capital) * 100 if invested_capital != 0 else None
-        metrics['Return on Invested Capital (ROIC) (%)'] = round(roic, 2) if roic is not None else None
-    except (KeyError, ValueError, TypeError) as e:
-        print(f"Error calculating Return on Invested Capital: {e}")
-
-    if all(metric is None for metric in metrics.values()):
-        print("No valid financial metrics could be calculated")
-        return pd.DataFrame({'Error': ['No valid financial metrics could be calculated']}), []
-
-    # Create charts
-    charts = []
-
-    try:
-        revenue_trends = pd.DataFrame(financial_data['income_statement'].get('annualReports', []))
-        if revenue_trends.empty:
-            revenue_trends = pd.DataFrame(financial_data['income_statement'].get('quarterlyReports', []))
-        revenue_trends['fiscalDateEnding'] = pd.to_datetime(revenue_trends['fiscalDateEnding'])
-        revenue_trends['totalRevenue'] = revenue_trends['totalRevenue'].astype(float)
-        revenue_trends = revenue_trends.sort_values('fiscalDateEnding')
-
-        fig_revenue = px.bar(revenue_trends, x='fiscalDateEnding', y='totalRevenue', title='Historical Revenue')
-        charts.append(fig_revenue)
-    except Exception as e:
-        print(f"Error creating revenue chart: {e}")
-
-    try:
-        assets = {
-            'Current Assets': float(balance_sheet['totalCurrentAssets']),
-            'Non-Current Assets': float(balance_sheet.get('totalNonCurrentAssets', 0))
-        }
-        fig_assets = px.pie(names=list(assets.keys()), values=list(assets.values()), hole=0.5, title='Asset Composition')
-        charts.append(fig_assets)
-    except Exception as e:
-        print(f"Error creating asset composition chart: {e}")
-
-    try:
-        profitability_metrics = pd.DataFrame(financial_data['income_statement'].get('annualReports', financial_data['income_statement'].get('quarterlyReports', [])))
-        profitability_metrics['fiscalDateEnding'] = pd.to_datetime(profitability_metrics['fiscalDateEnding'])
-        profitability_metrics['grossProfitMargin'] = (profitability_metrics['grossProfit'].astype(float) / profitability_metrics['totalRevenue'].astype(float)) * 100
-        profitability_metrics['netProfitMargin'] = (profitability_metrics['netIncome'].astype(float) / profitability_metrics['totalRevenue'].astype(float)) * 100
-        profitability_metrics = profitability_metrics.sort_values('fiscalDateEnding')
-
-        fig_profitability = go.Figure()
-        fig_profitability.add_trace(go.Scatter(x=profitability_metrics['fiscalDateEnding'], y=profitability_metrics['grossProfitMargin'], mode='lines+markers', name='Gross Profit Margin'))
-        fig_profitability.add_trace(go.Scatter(x=profitability_metrics['fiscalDateEnding'], y=profitability_metrics['netProfitMargin'], mode='lines+markers', name='Net Profit Margin'))
-        fig_profitability.update_layout(title='Profitability Metrics Over Time', xaxis_title='Date', yaxis_title='Percentage (%)')
-        charts.append(fig_profitability)
-    except Exception as e:
-        print(f"Error creating profitability metrics chart: {e}")
-
-    try:
-        debt_ebitda_data = pd.DataFrame(financial_data['balance_sheet'].get('annualReports', financial_data['balance_sheet'].get('quarterlyReports', [])))
-        debt_ebitda_data['fiscalDateEnding'] = pd.to_datetime(debt_ebitda_data['fiscalDateEnding'])
-        debt_ebitda_data['shortLongTermDebtTotal'] = debt_ebitda_data['shortLongTermDebtTotal'].astype(float)
-        
-        income_data = pd.DataFrame(financial_data['income_statement'].get('annualReports', financial_data['income_statement'].get('quarterlyReports', [])))
-        income_data['fiscalDateEnding'] = pd.to_datetime(income_data['fiscalDateEnding'])
-        income_data['ebitda'] = income_data['ebitda'].astype(float)
-        
-        debt_ebitda_data = pd.merge(debt_ebitda_data, income_data[['fiscalDateEnding', 'ebitda']], on='fiscalDateEnding')
-        debt_ebitda_data['debtToEBITDA'] = debt_ebitda_data['shortLongTermDebtTotal'] / debt_ebitda_data['ebitda']
-        debt_ebitda_data = debt_ebitda_data.sort_values('fiscalDateEnding')
-
-        fig_debt_ebitda = px.line(debt_ebitda_data, x='fiscalDateEnding', y='debtToEBITDA', title='Debt to EBITDA Ratio Over Time')
-        charts.append(fig_debt_ebitda)
-    except Exception as e:
-        print(f"Error creating Debt to EBITDA chart: {e}")
-
-    try:
-        cash_flow_data = pd.DataFrame(financial_data['cash_flow'].get('annualReports', financial_data['cash_flow'].get('quarterlyReports', [])))
-        cash_flow_data['fiscalDateEnding'] = pd.to_datetime(cash_flow_data['fiscalDateEnding'])
-        cash_flow_data['operatingCashflow'] = cash_flow_data['operatingCashflow'].astype(float)
-        cash_flow_data['capitalExpenditures'] = cash_flow_data['capitalExpenditures'].astype(float)
-        cash_flow_data['freeCashFlow'] = cash_flow_data['operatingCashflow'] - cash_flow_data['capitalExpenditures']
-        cash_flow_data = cash_flow_data.sort_values('fiscalDateEnding')
-
-        fig_free_cash_flow = px.bar(cash_flow_data, x='fiscalDateEnding', y='freeCashFlow', title='Free Cash Flow Trend')
-        charts.append(fig_free_cash_flow)
-    except Exception as e:
-        print(f"Error creating Free Cash Flow chart: {e}")
-
-    # New chart: Return on Invested Capital (ROIC) over time
-    try:
-        roic_data = pd.DataFrame(financial_data['income_statement'].get('annualReports', financial_data['income_statement'].get('quarterlyReports', [])))
-        roic_data['fiscalDateEnding'] = pd.to_datetime(roic_data['fiscalDateEnding'])
-        roic_data['ebit'] = roic_data['ebit'].astype(float)
-        
-        balance_sheet_data = pd.DataFrame(financial_data['balance_sheet'].get('annualReports', financial_data['balance_sheet'].get('quarterlyReports', [])))
-        balance_sheet_data['fiscalDateEnding'] = pd.to_datetime(balance_sheet_data['fiscalDateEnding'])
-        balance_sheet_data['totalShareholderEquity'] = balance_sheet_data['totalShareholderEquity'].astype(float)
-        balance_sheet_data['shortLongTermDebtTotal'] = balance_sheet_data['shortLongTermDebtTotal'].astype(float)
-        
-        roic_data = pd.merge(roic_data, balance_sheet_data[['fiscalDateEnding', 'totalShareholderEquity', 'shortLongTermDebtTotal']], on='fiscalDateEnding')
-        roic_data['investedCapital'] = roic_data['totalShareholderEquity'] + roic_data['shortLongTermDebtTotal']
-        roic_data['roic'] = (roic_data['ebit'] / roic_data['investedCapital']) * 100
-        roic_data = roic_data.sort_values('fiscalDateEnding')
-
-        fig_roic = px.line(roic_data, x='fiscalDateEnding', y='roic', title='Return on Invested Capital (ROIC) Over Time')
-        fig_roic.update_layout(yaxis_title='ROIC (%)')
-        charts.append(fig_roic)
-    except Exception as e:
-        print(f"Error creating ROIC chart: {e}")
+        version = version or payload_fingerprint(financial_data)
+        try:
+            with span("process.parse"):
+                statements = FinancialStatements.from_raw(financial_data)
+        except ValueError as e:
+            logger.warning("Cannot process financial data: %s", e)
+            return pd.DataFrame({'Error': [str(e)]}), ChartSet()
+
+    if logger.isEnabledFor(logging.DEBUG):
+        for statement in STATEMENT_FUNCTIONS:
+            frame = statements.statement(statement)
+            logger.debug("%s structure: %d %s periods", statement, len(frame), statements.periodicity[statement])
+
+    # Every ratio is computed column-wise over all periods; the table shows the latest one
+    with span("process.metrics") as metrics_span:
+        _, metrics = latest_metrics(statements)
+        metrics_span.set(metrics=len(metrics))
+
+    if not metrics:
+        logger.warning("No valid financial metrics could be calculated")
+        return pd.DataFrame({'Error': ['No valid financial metrics could be calculated']}), ChartSet()
+
+    # Charts are built on demand, when a figure or its JSON is first requested
+    charts = ChartSet(statements, version=version)
 
     metrics_df = pd.DataFrame(list(metrics.items()), columns=['Metric', 'Value'])
 
     return metrics_df, charts
 
-def generate_financial_insights(metrics_df, openai_api_key):
-    try:
-        # Use OpenAI API to generate insights based on the metrics
-        client = OpenAI(api_key=openai_api_key)
-
-        # Convert metrics dataframe to text
-        metrics_text = metrics_df.to_string(index=False)
-
-        prompt = f"""
+def analyze_ticker(ticker, api_key, pipeline_cache=None, warehouse=None, base_url=ALPHA_VANTAGE_URL,
+                   rate_limiter=None, refresh=False, statement_cache=None, providers=None):
+    """Fetch and process ``ticker``, memoized per (ticker, data version); None when the fetch fails.
+
+    Returns a ``PipelineEntry`` with the metrics table and lazily built charts. An unchanged
+    rerun is served from the pipeline cache after the (statement-cached) fetch. With a
+    ``StatementWarehouse`` (passed in, or enabled by STATEMENT_WAREHOUSE_PATH) statements
+    are read from its memory-mapped history, which is only refreshed when stale.
+    ``refresh=True`` asks the provider for newer statements even when cached ones are fresh;
+    ``statement_cache`` replaces the process-wide statement cache. Statements come from
+    ``providers`` (a ``data_providers.ProviderChain``) instead of Alpha Vantage alone when
+    one is given.
+    """
+    pipeline_cache = pipeline_cache or get_pipeline_cache()
+    if warehouse is None and os.environ.get("STATEMENT_WAREHOUSE_PATH"):
+        from statement_warehouse import get_statement_warehouse
+        warehouse = get_statement_warehouse()
+    with span("pipeline.analyze", ticker=ticker, warehouse=warehouse is not None) as analyze_span:
+        if warehouse is not None:
+            if refresh:
+                warehouse.invalidate(ticker)
+            with span("warehouse.refresh", ticker=ticker) as refresh_span:
+                fetched = warehouse.refresh(
+                    [ticker], lambda symbol: fetch_financial_data(symbol, api_key, base_url=base_url, cache=False,
+                                                                  rate_limiter=rate_limiter, providers=providers))
+                refresh_span.set(fetched=ticker in fetched)
+            statements = warehouse.statements(ticker)
+            if statements is None:
+                # Nothing stored: report the provider's refusal (or failed fetch) like the uncached path
+                financial_data = fetched.get(ticker)
+                if financial_data is None:
+                    return None
+                metrics_df, charts = process_financial_data(financial_data)
+                return PipelineEntry(ticker, payload_fingerprint(financial_data), metrics_df, charts)
+            data, version = statements, warehouse.version(ticker)
+        else:
+            data = fetch_financial_data(ticker, api_key, base_url=base_url, cache=statement_cache,
+                                        rate_limiter=rate_limiter, refresh=refresh, providers=providers)
+            if data is None:
+                return None
+            version = payload_fingerprint(data)
+        entry = pipeline_cache.get(ticker, version)
+        analyze_span.set(cache_hit=entry is not None)
+        if entry is None:
+            metrics_df, charts = process_financial_data(data, version=version)
+            entry = PipelineEntry(ticker, version, metrics_df, charts)
+            # Error tables (rate-limit notes, unknown symbols) are not worth keeping
+            if 'Error' not in metrics_df.columns:
+                pipeline_cache.put(entry)
+        return entry
+
+INSIGHTS_MODEL = "gpt-4o"
+INSIGHTS_ERROR_MESSAGE = "Unable to generate AI insights at this time. Please try again later."
+
+def _insights_request(metrics_df):
+    # Convert metrics dataframe to text
+    metrics_text = metrics_df.to_string(index=False)
+
+    prompt = f"""
         Analyze the following financial metrics and provide insights about the company's financial health:
 
         {metrics_text}
@@ -333,19 +249,67 @@ def generate_financial_insights(metrics_df, openai_api_key):
         Focus on aspects like profitability, liquidity, solvency, and efficiency. Provide a comprehensive analysis with specific recommendations for improvement.
         """
 
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a financial analyst providing insights on company performance."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=750,
-            n=1,
-            temperature=0.7,
-        )
+    return dict(
+        model=INSIGHTS_MODEL,
+        messages=[
+            {"role": "system", "content": "You are a financial analyst providing insights on company performance."},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=750,
+        n=1,
+        temperature=0.7,
+    )
+
+def generate_financial_insights(metrics_df, openai_api_key):
+    try:
+        # Use OpenAI API to generate insights based on the metrics
+        client = get_openai_client(openai_api_key)
+
+        with span("llm.insights", model=INSIGHTS_MODEL) as llm_span:
+            response = client.chat.completions.create(**_insights_request(metrics_df))
+            if response.usage is not None:
+                llm_span.set(prompt_tokens=response.usage.prompt_tokens,
+                             completion_tokens=response.usage.completion_tokens,
+                             tokens=response.usage.total_tokens)
 
         insights = response.choices[0].message.content.strip()
         return insights
     except Exception as e:
-        print(f"Error generating financial insights: {str(e)}")
-        return "Unable to generate AI insights at this time. Please try again later."
+        logger.warning("Error generating financial insights: %s", e)
+        return INSIGHTS_ERROR_MESSAGE
+
+def generate_insights_bulk(metrics_by_ticker, openai_api_key, concurrency=8, tokens_per_minute=None):
+    """Generate insights for many tickers at once, yielding ``(ticker, insights)`` as each completes.
+
+    ``metrics_by_ticker`` maps tickers to metrics DataFrames. Requests go through the
+    ``llm_scheduler`` (concurrency limit, token budget, retries, coalescing); a ticker whose
+    request ultimately fails gets the usual fallback message.
+    """
+    from llm_scheduler import iter_completed
+
+    batch = [(ticker, _insights_request(metrics_df)) for ticker, metrics_df in metrics_by_ticker.items()]
+    for ticker, insights, error in iter_completed(
+            batch, api_key=openai_api_key, concurrency={INSIGHTS_MODEL: concurrency},
+            tokens_per_minute={INSIGHTS_MODEL: tokens_per_minute} if tokens_per_minute else None):
+        if error is not None:
+            logger.warning("Error generating financial insights for %s: %s", ticker, error)
+            insights = INSIGHTS_ERROR_MESSAGE
+        yield ticker, insights
+
+def stream_financial_insights(metrics_df, openai_api_key):
+    """Yield the insights text as it is generated (e.g. for ``st.write_stream``).
+
+    Time-to-first-token and total time are recorded under ``insights`` in ``llm_metrics``.
+    """
+    def tokens():
+        try:
+            client = get_openai_client(openai_api_key)
+            stream = client.chat.completions.create(stream=True, **_insights_request(metrics_df))
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except Exception as e:
+            logger.warning("Error generating financial insights: %s", e)
+            yield INSIGHTS_ERROR_MESSAGE
+
+    return timed_stream(tokens(), "insights")
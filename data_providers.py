@@ -0,0 +1,441 @@
+"""Statement providers behind one interface, with hedged requests and circuit breakers.
+
+A ``StatementProvider`` returns the three statements of a ticker in the normalized
+schema the rest of the app reads: Alpha Vantage-shaped payloads (``annualReports`` of
+``fiscalDateEnding`` plus Alpha Vantage field names), so the statement cache,
+warehouse and ``FinancialStatements.from_raw`` work unchanged whichever source
+answered. ``AlphaVantageProvider`` detects the ``Note``/``Information``/``Error Message``
+bodies that Alpha Vantage sends with status 200 and raises ``RateLimited`` or
+``SymbolNotFound`` instead of passing them on as data. ``PolygonProvider`` maps the
+Polygon.io financials endpoint onto the same fields.
+
+``ProviderChain`` queries its providers in order. When the primary has not answered
+within the hedge delay (its own recent p95 latency by default), the next provider is
+queried as well and the first complete answer wins; a failed provider is replaced by
+the next one straight away. Each provider has a ``CircuitBreaker``, which skips it
+after consecutive failures until a trial request succeeds. Per-provider latency
+percentiles and outcome counts are kept in ``ProviderStats`` for the profiling panel.
+
+The Financial Data page routes its lookups through ``get_provider_chain`` when a
+Polygon.io key is entered; FINANCIAL_DATA_PROVIDERS picks and orders the sources.
+"""
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import numpy as np
+import requests
+
+from data_processing import (ALPHA_VANTAGE_URL, STATEMENT_FUNCTIONS, get_session, is_statement_payload,
+                             provider_message)
+from telemetry import bind_context, span
+
+logger = logging.getLogger(__name__)
+
+POLYGON_URL = "https://api.polygon.io/vX/reference/financials"
+
+DEFAULT_TIMEOUT_SECONDS = 30
+# Hedge delay before a provider has MIN_HEDGE_SAMPLES latencies to take a p95 from
+DEFAULT_HEDGE_AFTER_SECONDS = 1.0
+MIN_HEDGE_SAMPLES = 20
+MIN_HEDGE_AFTER_SECONDS = 0.05
+DEFAULT_FAILURE_THRESHOLD = 3
+DEFAULT_RESET_SECONDS = 30.0
+DEFAULT_PROVIDERS = "alpha_vantage,polygon"
+
+# Provider calls and the statement requests they make run in separate pools, so a call
+# waiting on its requests can never hold the threads those requests need
+_call_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="provider-call")
+_request_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider-request")
+
+
+class ProviderError(Exception):
+    """A provider could not return the statements of a ticker (HTTP error, timeout, bad body)."""
+
+
+class RateLimited(ProviderError):
+    """The provider refused the request because of its rate limit or quota."""
+
+
+class SymbolNotFound(ProviderError):
+    """The provider does not know the symbol; not held against its circuit breaker."""
+
+
+class StatementProvider:
+    """One data source. ``fetch(ticker)`` returns ``{statement: payload}`` for every
+    statement in ``STATEMENT_FUNCTIONS`` or raises ``ProviderError``."""
+
+    name = "provider"
+
+    def __init__(self, rate_limiter=None, timeout=DEFAULT_TIMEOUT_SECONDS, name=None):
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        if name:
+            self.name = name
+
+    def _get(self, url, params):
+        # Only requests that actually reach the provider count against the quota
+        if self.rate_limiter is not None:
+            self.rate_limiter.acquire()
+        try:
+            response = get_session().get(url, params=params, timeout=self.timeout)
+        except requests.RequestException as e:
+            raise ProviderError(f"{self.name}: {e}") from e
+        if response.status_code == 429:
+            raise RateLimited(f"{self.name}: HTTP 429")
+        if response.status_code != 200:
+            raise ProviderError(f"{self.name}: HTTP {response.status_code}")
+        try:
+            return response.json()
+        except ValueError as e:
+            raise ProviderError(f"{self.name}: response is not JSON") from e
+
+    def fetch(self, ticker):
+        raise NotImplementedError
+
+
+class AlphaVantageProvider(StatementProvider):
+    """Alpha Vantage statement endpoints, one request per statement sent concurrently."""
+
+    name = "alpha_vantage"
+
+    def __init__(self, api_key, base_url=ALPHA_VANTAGE_URL, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+
+    def _statement(self, function, ticker):
+        data = self._get(self.base_url, {"function": function, "symbol": ticker, "apikey": self.api_key})
+        if is_statement_payload(data):
+            return data
+        message = provider_message(data)
+        if isinstance(data, dict) and 'Error Message' in data:
+            raise SymbolNotFound(f"{self.name} {function}: {message}")
+        if message:
+            # Rate limits and premium-only notices both arrive as Note/Information
+            raise RateLimited(f"{self.name} {function}: {message}")
+        raise ProviderError(f"{self.name} {function}: no report data")
+
+    def fetch(self, ticker):
+        futures = {statement: _request_executor.submit(bind_context(self._statement), function, ticker)
+                   for statement, function in STATEMENT_FUNCTIONS.items()}
+        return {statement: future.result() for statement, future in futures.items()}
+
+
+class PolygonProvider(StatementProvider):
+    """Polygon.io ``vX/reference/financials``: all three statements in one request.
+
+    ``FIELDS`` maps each Alpha Vantage field to its Polygon (statement, field). Fields
+    without an exact Polygon equivalent map to None and are reported as "None", as Alpha
+    Vantage reports a missing value: EBITDA, capital expenditures, dividends paid, shares
+    outstanding at period end (Polygon only has the period's average) and total debt
+    (Polygon only has long-term debt). ``reportedCurrency`` is the ``unit`` of the
+    filing's values.
+    """
+
+    name = "polygon"
+
+    FIELDS = {
+        'income_statement': {
+            'totalRevenue': ('income_statement', 'revenues'),
+            'costOfRevenue': ('income_statement', 'cost_of_revenue'),
+            'grossProfit': ('income_statement', 'gross_profit'),
+            'ebit': ('income_statement', 'operating_income_loss'),
+            'netIncome': ('income_statement', 'net_income_loss'),
+            'ebitda': None,
+        },
+        'balance_sheet': {
+            'totalAssets': ('balance_sheet', 'assets'),
+            'totalCurrentAssets': ('balance_sheet', 'current_assets'),
+            'totalNonCurrentAssets': ('balance_sheet', 'noncurrent_assets'),
+            'totalLiabilities': ('balance_sheet', 'liabilities'),
+            'totalCurrentLiabilities': ('balance_sheet', 'current_liabilities'),
+            'totalShareholderEquity': ('balance_sheet', 'equity_attributable_to_parent'),
+            'shortLongTermDebtTotal': None,
+            'commonStockSharesOutstanding': None,
+        },
+        'cash_flow': {
+            'operatingCashflow': ('cash_flow_statement', 'net_cash_flow_from_operating_activities'),
+            'capitalExpenditures': None,
+            'cashDividendsPaid': None,
+        },
+    }
+
+    def __init__(self, api_key, base_url=POLYGON_URL, limit=10, **kwargs):
+        super().__init__(**kwargs)
+        self.api_key = api_key
+        self.base_url = base_url
+        self.limit = limit
+
+    @classmethod
+    def normalize(cls, ticker, results):
+        """Map Polygon annual filings to Alpha Vantage-shaped statement payloads."""
+        financial_data = {statement: {'symbol': ticker, 'annualReports': []} for statement in cls.FIELDS}
+        for result in results:
+            financials = result.get('financials', {})
+            entries = {statement: {field: financials.get(source[0], {}).get(source[1], {}) if source else {}
+                                   for field, source in fields.items()}
+                       for statement, fields in cls.FIELDS.items()}
+            # Every mapped field is a money amount, so any of them carries the filing's currency
+            units = [entry['unit'] for fields in entries.values() for entry in fields.values() if entry.get('unit')]
+            for statement, fields in entries.items():
+                report = {'fiscalDateEnding': result.get('end_date'), 'reportedCurrency': units[0] if units else "None"}
+                for field, entry in fields.items():
+                    value = entry.get('value')
+                    report[field] = "None" if value is None else str(value)
+                financial_data[statement]['annualReports'].append(report)
+        return financial_data
+
+    def fetch(self, ticker):
+        data = self._get(self.base_url, {"ticker": ticker, "timeframe": "annual", "limit": self.limit,
+                                         "order": "desc", "apiKey": self.api_key})
+        if not isinstance(data, dict) or data.get('status') == 'ERROR':
+            raise ProviderError(f"{self.name}: {data.get('error') if isinstance(data, dict) else 'bad body'}")
+        results = [result for result in data.get('results') or [] if result.get('end_date')]
+        if not results:
+            raise SymbolNotFound(f"{self.name}: no filings for {ticker}")
+        return self.normalize(ticker, results)
+
+
+class CircuitBreaker:
+    """Skip a provider after ``failure_threshold`` consecutive failures.
+
+    An open breaker lets one trial request through after ``reset_timeout`` seconds
+    (half-open); its success closes the breaker, its failure opens it again.
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, reset_timeout=DEFAULT_RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == "trial" or (self._state == "open"
+                                          and time.monotonic() - self._opened_at >= self.reset_timeout):
+                return "half_open"
+            return self._state
+
+    def allow(self):
+        """Whether a request may be sent now; in the half-open state only the first caller is let through."""
+        with self._lock:
+            if self._state == "closed":
+                return True
+            if self._state == "open" and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = "trial"
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = "closed"
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._state == "trial" or self.failures >= self.failure_threshold:
+                self._state = "open"
+                self._opened_at = time.monotonic()
+
+
+class ProviderStats:
+    """Latency of the most recent ``window`` successful calls and outcome counts per provider."""
+
+    def __init__(self, window=256):
+        self._lock = threading.Lock()
+        self._latencies = defaultdict(lambda: deque(maxlen=window))
+        self._counts = defaultdict(lambda: defaultdict(int))
+
+    def record(self, name, seconds, outcome):
+        with self._lock:
+            if outcome == "ok":
+                self._latencies[name].append(seconds)
+            self._counts[name][outcome] += 1
+
+    def count(self, name, outcome):
+        with self._lock:
+            self._counts[name][outcome] += 1
+
+    def percentile(self, name, q, min_samples=1):
+        with self._lock:
+            samples = list(self._latencies.get(name, ()))
+        if len(samples) < min_samples:
+            return None
+        return float(np.percentile(samples, q))
+
+    def summary(self):
+        """Return ``{name: {ok, failed, rate_limited, not_found, hedged, won, p50, p95, p99}}``.
+
+        Latencies are in seconds, over successful calls only.
+        """
+        with self._lock:
+            snapshot = {name: (list(self._latencies.get(name, ())), dict(counts))
+                        for name, counts in self._counts.items()}
+        summary = {}
+        for name, (samples, counts) in snapshot.items():
+            summary[name] = {
+                **{outcome: counts.get(outcome, 0)
+                   for outcome in ('ok', 'failed', 'rate_limited', 'not_found', 'hedged', 'won')},
+                **{f'p{q}': float(np.percentile(samples, q)) if samples else None for q in (50, 95, 99)},
+            }
+        return summary
+
+
+class ProviderChain:
+    """Fetch statements from the first of ``providers`` to answer, hedging slow ones.
+
+    ``hedge_after`` fixes the delay (seconds) before the next provider is also queried;
+    by default it is the waiting provider's p95 latency (``DEFAULT_HEDGE_AFTER_SECONDS``
+    until it has ``MIN_HEDGE_SAMPLES``). ``hedge_after=False`` disables hedging, so the
+    next provider is only tried after a failure.
+    """
+
+    def __init__(self, providers, hedge_after=None, failure_threshold=DEFAULT_FAILURE_THRESHOLD,
+                 reset_timeout=DEFAULT_RESET_SECONDS, stats=None):
+        if not providers:
+            raise ValueError("at least one provider is required")
+        if len({provider.name for provider in providers}) != len(providers):
+            raise ValueError("provider names must be unique")
+        self.providers = list(providers)
+        self.hedge_after = hedge_after
+        self.breakers = {provider.name: CircuitBreaker(failure_threshold, reset_timeout) for provider in providers}
+        self.stats = stats or ProviderStats()
+
+    def hedge_delay(self, provider):
+        if self.hedge_after is not None:
+            return self.hedge_after
+        p95 = self.stats.percentile(provider.name, 95, min_samples=MIN_HEDGE_SAMPLES)
+        return DEFAULT_HEDGE_AFTER_SECONDS if p95 is None else max(p95, MIN_HEDGE_AFTER_SECONDS)
+
+    def _call(self, provider, ticker):
+        breaker = self.breakers[provider.name]
+        start = time.perf_counter()
+        with span("provider.fetch", provider=provider.name, ticker=ticker) as call_span:
+            try:
+                data = provider.fetch(ticker)
+            except SymbolNotFound:
+                # The provider answered; it just has nothing for this ticker
+                breaker.record_success()
+                outcome = "not_found"
+                raise
+            except RateLimited:
+                breaker.record_failure()
+                outcome = "rate_limited"
+                raise
+            except Exception as e:
+                breaker.record_failure()
+                outcome = "failed"
+                if isinstance(e, ProviderError):
+                    raise
+                raise ProviderError(f"{provider.name}: {e}") from e
+            else:
+                breaker.record_success()
+                outcome = "ok"
+                return data
+            finally:
+                call_span.set(outcome=outcome)
+                self.stats.record(provider.name, time.perf_counter() - start, outcome)
+
+    def _launch(self, queue, pending, ticker):
+        """Start the next provider whose breaker allows a request; False when none is left."""
+        while queue:
+            provider = queue.pop(0)
+            if self.breakers[provider.name].allow():
+                pending[_call_executor.submit(bind_context(self._call), provider, ticker)] = provider
+                return provider
+            logger.debug("%s: circuit open, skipped", provider.name)
+        return None
+
+    def fetch(self, ticker):
+        """Return ``{statement: payload}`` from the first provider to answer (see ``answer``)."""
+        return self.answer(ticker)[1]
+
+    def answer(self, ticker):
+        """Return ``(provider, {statement: payload})`` from the first provider to answer.
+
+        Raises ``SymbolNotFound`` when every provider that answered lacks the ticker and
+        ``ProviderError`` when none could answer (including when every breaker is open).
+        """
+        with span("providers.fetch", ticker=ticker) as fetch_span:
+            queue, pending, errors = list(self.providers), {}, []
+            waiting = self._launch(queue, pending, ticker)
+            while pending:
+                timeout = self.hedge_delay(waiting) if queue and self.hedge_after is not False else None
+                done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                if not done:
+                    # The waiting provider is slower than usual: ask the next one as well
+                    hedge = self._launch(queue, pending, ticker)
+                    if hedge is not None:
+                        self.stats.count(hedge.name, "hedged")
+                        waiting = hedge
+                    continue
+                for future in done:
+                    provider = pending.pop(future)
+                    try:
+                        data = future.result()
+                    except ProviderError as e:
+                        logger.info("%s %s: %s", provider.name, ticker, e)
+                        errors.append(e)
+                        continue
+                    self.stats.count(provider.name, "won")
+                    fetch_span.set(provider=provider.name, attempts=len(errors) + len(pending) + 1)
+                    return provider, data
+                if not pending:
+                    waiting = self._launch(queue, pending, ticker)
+            fetch_span.set(provider=None, attempts=len(errors))
+            if errors and all(isinstance(e, SymbolNotFound) for e in errors):
+                raise SymbolNotFound("; ".join(map(str, errors)))
+            raise ProviderError("; ".join(map(str, errors)) or "every provider's circuit is open")
+
+    def summary(self):
+        """``ProviderStats.summary`` with each provider's breaker state, in chain order."""
+        stats = self.stats.summary()
+        return {provider.name: {'state': self.breakers[provider.name].state, **stats.get(provider.name, {})}
+                for provider in self.providers}
+
+
+def make_provider(name, api_key, **kwargs):
+    """Build a provider by name."""
+    if name == "alpha_vantage":
+        return AlphaVantageProvider(api_key, **kwargs)
+    if name == "polygon":
+        return PolygonProvider(api_key, **kwargs)
+    raise ValueError(f"unknown provider {name!r}")
+
+
+_chains = {}
+_chains_lock = threading.Lock()
+
+
+def get_provider_chain(api_key, polygon_api_key=None, rate_limiter=None):
+    """Return the process-wide chain for these keys, or None when there is no second source.
+
+    ``api_key`` is the Alpha Vantage key and ``rate_limiter`` its quota. The sources are
+    those in FINANCIAL_DATA_PROVIDERS (default ``alpha_vantage,polygon``) that have a
+    key; PROVIDER_HEDGE_AFTER fixes the hedge delay in seconds.
+    """
+    keys = {"alpha_vantage": api_key, "polygon": polygon_api_key}
+    setting = os.environ.get("FINANCIAL_DATA_PROVIDERS") or DEFAULT_PROVIDERS
+    names = [name.strip() for name in setting.split(",") if name.strip()]
+    # Sources without a key are left out; unknown names still fail in make_provider
+    names = [name for name in names if keys.get(name, True)]
+    if not names or names == ["alpha_vantage"]:
+        # Alpha Vantage alone is the direct fetch path
+        return None
+    hedge_after = os.environ.get("PROVIDER_HEDGE_AFTER")
+    key = (tuple((name, keys.get(name)) for name in names), hedge_after, rate_limiter)
+    with _chains_lock:
+        if key not in _chains:
+            providers = [make_provider(name, keys.get(name),
+                                       **({"rate_limiter": rate_limiter} if name == "alpha_vantage" else {}))
+                         for name in names]
+            _chains[key] = ProviderChain(providers, hedge_after=float(hedge_after) if hedge_after else None)
+        return _chains[key]
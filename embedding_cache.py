@@ -0,0 +1,203 @@
+"""Embedding layer with a persistent content-hash cache.
+
+``CachedEmbeddings`` wraps any langchain ``Embeddings`` backend. Texts are keyed by
+the SHA-256 of their content; vectors already seen (for example boilerplate pages
+repeated across annual reports) are served from a compact float32 store on disk,
+and only cache misses are sent to the backend, in batches of ``batch_size`` with at
+most ``max_concurrency`` requests in flight.
+
+``HashingEmbeddings`` is a deterministic local backend used to run and benchmark
+the pipeline offline.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from telemetry import bind_context, span
+
+DEFAULT_CACHE_ROOT = os.path.join(".cache", "embeddings")
+
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.,][0-9]+)*")
+
+
+class HashingEmbeddings(Embeddings):
+    """Feature-hashed bag-of-words vectors: deterministic, offline and cheap."""
+
+    def __init__(self, size=384):
+        self.size = size
+        self.model = f"local-hashing-{size}"
+
+    def _embed(self, text):
+        vector = np.zeros(self.size, dtype=np.float32)
+        for token in _TOKEN_PATTERN.findall(text.lower()):
+            digest = int.from_bytes(hashlib.blake2b(token.encode(), digest_size=8).digest(), "little")
+            vector[digest % self.size] += 1.0 if (digest >> 63) & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._embed(text)
+
+
+class VectorCache:
+    """Append-only store of float32 vectors keyed by hex digest.
+
+    Vectors live in ``vectors.f32`` as a raw (n, dim) float32 matrix and their keys,
+    one per line and in the same order, in ``keys.txt``.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._vectors = None
+        self.dim = None
+        os.makedirs(directory, exist_ok=True)
+        meta_path = os.path.join(directory, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            with open(self._keys_path) as f:
+                keys = f.read().split()
+            # Keep only rows whose vector and key both made it to disk before a crash
+            row_bytes = 4 * self.dim
+            complete = min(len(keys), os.path.getsize(self._vectors_path) // row_bytes)
+            self._rows = {key: row for row, key in enumerate(keys[:complete])}
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(complete * row_bytes)
+            with open(self._keys_path, "w") as f:
+                f.write("".join(key + "\n" for key in keys[:complete]))
+            self._load_vectors()
+
+    @property
+    def _keys_path(self):
+        return os.path.join(self.directory, "keys.txt")
+
+    @property
+    def _vectors_path(self):
+        return os.path.join(self.directory, "vectors.f32")
+
+    def _load_vectors(self):
+        rows = len(self._rows)
+        self._vectors = (np.memmap(self._vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+                         if rows else np.empty((0, self.dim), dtype=np.float32))
+
+    def __len__(self):
+        return len(self._rows)
+
+    def get_many(self, keys):
+        """Return ``{key: vector}`` for the keys present in the cache."""
+        with self._lock:
+            rows = {key: self._rows[key] for key in keys if key in self._rows}
+            vectors = self._vectors
+        return {key: np.array(vectors[row]) for key, row in rows.items()}
+
+    def put_many(self, items):
+        """Append ``(key, vector)`` pairs that are not cached yet."""
+        with self._lock:
+            new = [(key, vector) for key, vector in dict(items).items() if key not in self._rows]
+            if not new:
+                return
+            matrix = np.asarray([vector for _, vector in new], dtype=np.float32)
+            if self.dim is None:
+                self.dim = matrix.shape[1]
+                with open(os.path.join(self.directory, "meta.json"), "w") as f:
+                    json.dump({"dim": self.dim}, f)
+            elif matrix.shape[1] != self.dim:
+                raise ValueError(f"expected {self.dim}-dimensional vectors, got {matrix.shape[1]}")
+            with open(self._vectors_path, "ab") as f:
+                f.write(matrix.tobytes())
+            with open(self._keys_path, "a") as f:
+                f.write("".join(key + "\n" for key, _ in new))
+            for key, _ in new:
+                self._rows[key] = len(self._rows)
+            self._load_vectors()
+
+
+_vector_caches = {}
+_vector_caches_lock = threading.Lock()
+
+
+def get_vector_cache(directory):
+    """Return the process-wide VectorCache for ``directory`` so concurrent sessions share one writer."""
+    directory = os.path.abspath(directory)
+    with _vector_caches_lock:
+        if directory not in _vector_caches:
+            _vector_caches[directory] = VectorCache(directory)
+        return _vector_caches[directory]
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, base, cache_root=None, batch_size=128, max_concurrency=4):
+        self.base = base
+        self.model = getattr(base, "model", type(base).__name__)
+        self.batch_size = batch_size
+        self.max_concurrency = max_concurrency
+        root = cache_root or os.environ.get("EMBEDDING_CACHE_PATH", DEFAULT_CACHE_ROOT)
+        namespace = re.sub(r"[^A-Za-z0-9_.-]", "_", self.model)
+        self.cache = get_vector_cache(os.path.join(root, namespace))
+        self.hits = 0
+        self.misses = 0
+        self.requests = 0
+        self._stats_lock = threading.Lock()
+
+    @staticmethod
+    def key(text):
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def _embed_batch(self, texts):
+        with self._stats_lock:
+            self.requests += 1
+        with span("embed.request", model=self.model, texts=len(texts), bytes=sum(len(text) for text in texts)):
+            return self.base.embed_documents(texts)
+
+    def embed_documents(self, texts):
+        with span("embed.documents", model=self.model, texts=len(texts)) as embed_span:
+            keys = [self.key(text) for text in texts]
+            found = self.cache.get_many(keys)
+
+            # Each distinct missing text is embedded once, however often it repeats
+            missing = {}
+            for key, text in zip(keys, texts):
+                if key not in found and key not in missing:
+                    missing[key] = text
+            with self._stats_lock:
+                self.hits += len(texts) - len(missing)
+                self.misses += len(missing)
+            embed_span.set(cache_hits=len(texts) - len(missing), bytes=sum(len(text) for text in missing.values()))
+
+            if missing:
+                missing_keys = list(missing)
+                batches = [missing_keys[i:i + self.batch_size] for i in range(0, len(missing_keys), self.batch_size)]
+                with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as pool:
+                    futures = [pool.submit(bind_context(self._embed_batch), [missing[key] for key in batch])
+                               for batch in batches]
+                    for batch, future in zip(batches, futures):
+                        computed = list(zip(batch, future.result()))
+                        self.cache.put_many(computed)
+                        found.update((key, np.asarray(vector, dtype=np.float32)) for key, vector in computed)
+
+            return [found[key].tolist() for key in keys]
+
+    def embed_query(self, text):
+        with span("embed.query", model=self.model, bytes=len(text)):
+            return self.base.embed_query(text)
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'requests': self.requests,
+            'cached_vectors': len(self.cache),
+        }
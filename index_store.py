@@ -0,0 +1,105 @@
+"""On-disk store of FAISS indexes built from annual reports.
+
+Each processed report is stored under a key derived from the SHA-256 of the PDF
+bytes and the splitter/embedding configuration, so re-uploading the same report
+(or restarting the app) loads the saved index instead of re-embedding the PDF.
+The FAISS index is written with ``faiss.write_index`` and read back memory-mapped;
+chunk text and metadata are kept alongside it as JSON lines.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import faiss
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+DEFAULT_INDEX_ROOT = os.path.join(".cache", "report_indexes")
+
+INDEX_FILE = "index.faiss"
+CHUNKS_FILE = "chunks.jsonl"
+CONFIG_FILE = "config.json"
+
+
+def report_key(pdf_bytes, config):
+    """Return the store key for a report: SHA-256 over the PDF bytes and the ingestion config."""
+    digest = hashlib.sha256(pdf_bytes)
+    digest.update(json.dumps(config, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+class IndexStore:
+    def __init__(self, root=None):
+        self.root = root or os.environ.get("REPORT_INDEX_PATH", DEFAULT_INDEX_ROOT)
+        self._lock = threading.Lock()
+
+    def path(self, key):
+        return os.path.join(self.root, key)
+
+    def __contains__(self, key):
+        return os.path.exists(os.path.join(self.path(key), INDEX_FILE))
+
+    def save(self, key, vectorstore, config=None):
+        """Persist a langchain FAISS vectorstore under ``key``; the write is atomic."""
+        os.makedirs(self.root, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f".{key[:12]}-", dir=self.root)
+        try:
+            faiss.write_index(vectorstore.index, os.path.join(staging, INDEX_FILE))
+            with open(os.path.join(staging, CHUNKS_FILE), "w") as f:
+                for position in range(vectorstore.index.ntotal):
+                    doc_id = vectorstore.index_to_docstore_id[position]
+                    doc = vectorstore.docstore.search(doc_id)
+                    f.write(json.dumps({"id": doc_id, "page_content": doc.page_content,
+                                        "metadata": doc.metadata}) + "\n")
+            with open(os.path.join(staging, CONFIG_FILE), "w") as f:
+                json.dump(config or {}, f, sort_keys=True)
+            with self._lock:
+                if key in self:
+                    # Another session saved the same report first; keep that copy
+                    shutil.rmtree(staging)
+                    return
+                os.replace(staging, self.path(key))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+    def load(self, key, embeddings, mmap=True):
+        """Return the stored vectorstore for ``key`` wired to ``embeddings``, or None if absent."""
+        if key not in self:
+            return None
+        directory = self.path(key)
+        index_path = os.path.join(directory, INDEX_FILE)
+        try:
+            index = faiss.read_index(index_path, faiss.IO_FLAG_MMAP if mmap else 0)
+        except RuntimeError:
+            # Not every index type supports memory mapping
+            index = faiss.read_index(index_path)
+
+        docs, index_to_docstore_id = {}, {}
+        with open(os.path.join(directory, CHUNKS_FILE)) as f:
+            for position, line in enumerate(f):
+                chunk = json.loads(line)
+                docs[chunk["id"]] = Document(page_content=chunk["page_content"], metadata=chunk["metadata"])
+                index_to_docstore_id[position] = chunk["id"]
+        return FAISS(embeddings, index, InMemoryDocstore(docs), index_to_docstore_id)
+
+    def config(self, key):
+        with open(os.path.join(self.path(key), CONFIG_FILE)) as f:
+            return json.load(f)
+
+    def delete(self, key):
+        shutil.rmtree(self.path(key), ignore_errors=True)
+
+
+_default_store = None
+
+
+def get_index_store():
+    global _default_store
+    if _default_store is None:
+        _default_store = IndexStore()
+    return _default_store
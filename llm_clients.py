@@ -0,0 +1,82 @@
+"""Process-wide registry of OpenAI clients and langchain LLMs/chains, keyed by API key.
+
+Building an ``openai.OpenAI`` client (or a langchain ``OpenAI`` LLM, which wraps one)
+creates a new HTTP connection pool, so every call that builds its own pays for a fresh
+TCP/TLS handshake. Clients are created lazily on first use, shared by all Streamlit
+sessions using the same key and endpoint, and the least recently used ones are
+dropped once more than ``MAX_CLIENTS`` are live.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from openai import OpenAI
+
+MAX_CLIENTS = 32
+
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+_build_locks = {}
+
+
+def _key(kind, api_key):
+    # Keys are hashed so the registry never holds them in plain text; the endpoint is part of
+    # the key because OPENAI_BASE_URL / OPENAI_API_BASE are only read when a client is built
+    endpoint = os.environ.get("OPENAI_BASE_URL") or os.environ.get("OPENAI_API_BASE") or ""
+    return kind, hashlib.sha256(f"{api_key}\0{endpoint}".encode()).hexdigest()
+
+
+def _get(kind, api_key, build):
+    key = _key(kind, api_key)
+    with _registry_lock:
+        if key in _registry:
+            _registry.move_to_end(key)
+            return _registry[key]
+        build_lock = _build_locks.setdefault(key, threading.Lock())
+    # Build outside the registry lock so a slow construction doesn't block other keys
+    with build_lock:
+        with _registry_lock:
+            if key in _registry:
+                return _registry[key]
+        value = build()
+        with _registry_lock:
+            _registry[key] = value
+            _build_locks.pop(key, None)
+            while len(_registry) > MAX_CLIENTS:
+                # Not closed explicitly: a session or chain may still be using it
+                _registry.popitem(last=False)
+    return value
+
+
+def get_openai_client(api_key):
+    """Shared ``openai.OpenAI`` client for ``api_key``."""
+    return _get("openai", api_key, lambda: OpenAI(api_key=api_key))
+
+
+# langchain is imported inside the getters: the Financial Data page only needs the OpenAI client
+# and should not pay langchain's import time
+
+
+def get_completion_llm(api_key):
+    """Shared langchain completion LLM (temperature 0) used for report answers."""
+    from langchain.llms import OpenAI as LangchainOpenAI
+    return _get("completion_llm", api_key, lambda: LangchainOpenAI(temperature=0, openai_api_key=api_key))
+
+
+def get_qa_chain(api_key):
+    """Shared "stuff" question-answering chain over ``get_completion_llm(api_key)``."""
+    from langchain.chains.question_answering import load_qa_chain
+    return _get("qa_chain", api_key, lambda: load_qa_chain(get_completion_llm(api_key), chain_type="stuff"))
+
+
+def get_openai_embeddings(api_key):
+    """Shared langchain ``OpenAIEmbeddings`` backend."""
+    from langchain.embeddings.openai import OpenAIEmbeddings
+    return _get("embeddings", api_key, lambda: OpenAIEmbeddings(openai_api_key=api_key))
+
+
+def clear_clients():
+    """Forget every client, e.g. after an API key is revoked."""
+    with _registry_lock:
+        _registry.clear()
@@ -0,0 +1,79 @@
+"""Latency metrics for streamed LLM generations.
+
+``timed_stream`` wraps a token iterator and records, per generation, the
+time-to-first-token and the total generation time under a name such as
+``insights`` or ``report_answer``. The most recent ``window`` samples per name are
+kept for percentile summaries. Each generation is also recorded as an ``llm.<name>``
+telemetry span.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+import numpy as np
+
+from telemetry import record
+
+
+class GenerationMetrics:
+    def __init__(self, window=256):
+        self._lock = threading.Lock()
+        self._samples = defaultdict(lambda: deque(maxlen=window))
+
+    def record(self, name, ttft, total, chunks):
+        with self._lock:
+            self._samples[name].append((ttft, total, chunks))
+
+    def last(self, name):
+        with self._lock:
+            samples = self._samples.get(name)
+            if not samples:
+                return None
+            ttft, total, chunks = samples[-1]
+        return {'ttft': ttft, 'total': total, 'chunks': chunks}
+
+    def summary(self):
+        """Return ``{name: {count, ttft_p50, ttft_p95, total_p50, total_p95}}`` in seconds."""
+        with self._lock:
+            snapshot = {name: list(samples) for name, samples in self._samples.items()}
+        summary = {}
+        for name, samples in snapshot.items():
+            ttft = np.array([s[0] for s in samples if s[0] is not None])
+            total = np.array([s[1] for s in samples])
+            summary[name] = {
+                'count': len(samples),
+                'ttft_p50': float(np.percentile(ttft, 50)) if len(ttft) else None,
+                'ttft_p95': float(np.percentile(ttft, 95)) if len(ttft) else None,
+                'total_p50': float(np.percentile(total, 50)),
+                'total_p95': float(np.percentile(total, 95)),
+            }
+        return summary
+
+
+_metrics = GenerationMetrics()
+
+
+def get_generation_metrics():
+    return _metrics
+
+
+def timed_stream(chunks, name, metrics=None):
+    """Yield from ``chunks``, recording time to the first non-empty chunk and the total time."""
+    metrics = metrics or _metrics
+    start_ns = time.time_ns()
+    start = time.perf_counter()
+    ttft = None
+    count = 0
+    try:
+        for chunk in chunks:
+            if chunk:
+                if ttft is None:
+                    ttft = time.perf_counter() - start
+                count += 1
+            yield chunk
+    finally:
+        total = time.perf_counter() - start
+        metrics.record(name, ttft, total, count)
+        # Streamed chunks are roughly one token each
+        record(f"llm.{name}", start_ns, start_ns + int(total * 1e9), tokens=count,
+               ttft_ms=None if ttft is None else ttft * 1000)
@@ -0,0 +1,205 @@
+"""Asyncio scheduler for bulk chat-completion requests.
+
+    scheduler = LLMScheduler(api_key, concurrency={'gpt-4o': 8}, tokens_per_minute={'gpt-4o': 30000})
+    async for key, text, error in scheduler.as_completed(requests):
+        ...
+
+Each model gets its own concurrency limit and token-per-minute budget (a token
+bucket charged with the estimated prompt size plus ``max_tokens`` before each
+request). Rate-limit, server and connection errors are retried with exponential
+backoff and jitter, honouring ``Retry-After``. Identical in-flight requests are
+coalesced into a single API call. ``iter_completed`` exposes the bulk API to
+synchronous code.
+"""
+import asyncio
+import contextlib
+import hashlib
+import json
+import queue
+import random
+import threading
+
+import openai
+
+from rate_limit import TokenBucket
+from telemetry import span
+
+DEFAULT_CONCURRENCY = 4
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+def estimate_tokens(messages, max_tokens):
+    """Rough token cost of a request: ~4 characters per prompt token plus the completion budget."""
+    characters = sum(len(str(message.get('content', ''))) for message in messages)
+    return characters // 4 + len(messages) * 4 + (max_tokens or 0)
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code in RETRY_STATUS_CODES
+
+
+def _retry_after(error):
+    response = getattr(error, 'response', None)
+    try:
+        return float(response.headers.get('retry-after'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class LLMScheduler:
+    def __init__(self, api_key=None, concurrency=None, tokens_per_minute=None, max_retries=5,
+                 base_delay=1.0, max_delay=30.0, client=None):
+        self.api_key = api_key
+        self.concurrency = concurrency or {}
+        self.tokens_per_minute = tokens_per_minute or {}
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._client = client
+        self._semaphores = {}
+        self._buckets = {}
+        self._inflight = {}
+        self.stats = {'requests': 0, 'completed': 0, 'failed': 0, 'retries': 0, 'coalesced': 0,
+                      'budget_wait_seconds': 0.0}
+
+    @property
+    def client(self):
+        # Built lazily inside the running loop; retries are handled here, not by the SDK
+        if self._client is None:
+            self._client = openai.AsyncOpenAI(api_key=self.api_key, max_retries=0)
+        return self._client
+
+    def _semaphore(self, model):
+        if model not in self._semaphores:
+            self._semaphores[model] = asyncio.Semaphore(self.concurrency.get(model, DEFAULT_CONCURRENCY))
+        return self._semaphores[model]
+
+    def _bucket(self, model):
+        tpm = self.tokens_per_minute.get(model)
+        if tpm is None:
+            return None
+        if model not in self._buckets:
+            self._buckets[model] = TokenBucket.per_minute(tpm, burst=tpm)
+        return self._buckets[model]
+
+    async def _call(self, model, messages, params):
+        bucket = self._bucket(model)
+        tokens = min(estimate_tokens(messages, params.get('max_tokens')), bucket.capacity) if bucket is not None else 0
+        for attempt in range(self.max_retries + 1):
+            # Every attempt is charged: a retried request spends the tokens again
+            if bucket is not None:
+                self.stats['budget_wait_seconds'] += await bucket.acquire_async(tokens)
+            try:
+                async with self._semaphore(model):
+                    self.stats['requests'] += 1
+                    with span("llm.request", model=model, attempt=attempt) as request_span:
+                        response = await self.client.chat.completions.create(model=model, messages=messages, **params)
+                        if response.usage is not None:
+                            request_span.set(prompt_tokens=response.usage.prompt_tokens,
+                                             completion_tokens=response.usage.completion_tokens,
+                                             tokens=response.usage.total_tokens)
+                return response.choices[0].message.content.strip()
+            except Exception as e:
+                if attempt == self.max_retries or not is_retryable(e):
+                    raise
+                self.stats['retries'] += 1
+                delay = _retry_after(e)
+                if delay is None:
+                    delay = min(self.max_delay, self.base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+                await asyncio.sleep(delay)
+
+    async def complete(self, messages, model="gpt-4o", **params):
+        """Return the completion text; identical concurrent requests share one API call."""
+        key = hashlib.sha256(json.dumps([model, messages, params], sort_keys=True).encode()).hexdigest()
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(model, messages, params))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        try:
+            text = await asyncio.shield(task)
+        except Exception:
+            self.stats['failed'] += 1
+            raise
+        self.stats['completed'] += 1
+        return text
+
+    async def as_completed(self, requests):
+        """Run ``(key, request_kwargs)`` pairs concurrently, yielding ``(key, text, error)`` as each finishes.
+
+        ``request_kwargs`` are passed to ``complete`` (``messages``, ``model``, ``max_tokens``, ...).
+        ``error`` is None on success and the final exception otherwise.
+        """
+        async def run(key, kwargs):
+            try:
+                return key, await self.complete(**kwargs), None
+            except Exception as e:
+                return key, None, e
+
+        tasks = [asyncio.ensure_future(run(key, kwargs)) for key, kwargs in requests]
+        try:
+            for finished in asyncio.as_completed(tasks):
+                yield await finished
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+
+def iter_completed(requests, **scheduler_kwargs):
+    """Synchronous ``as_completed``: runs a new scheduler on a background event loop.
+
+    ``scheduler_kwargs`` are passed to ``LLMScheduler``. Yields ``(key, text, error)``
+    tuples in completion order.
+    """
+    results = queue.Queue()
+    done = object()
+    stopped = threading.Event()
+    running = {}
+
+    async def produce():
+        running['loop'], running['task'] = asyncio.get_running_loop(), asyncio.current_task()
+        if stopped.is_set():
+            return
+        scheduler = LLMScheduler(**scheduler_kwargs)
+        try:
+            async for result in scheduler.as_completed(requests):
+                results.put(result)
+        finally:
+            await scheduler.aclose()
+
+    def run():
+        try:
+            asyncio.run(produce())
+        except BaseException as e:
+            results.put(e)
+        finally:
+            results.put(done)
+
+    threading.Thread(target=run, name="llm-scheduler", daemon=True).start()
+    finished = False
+    try:
+        while True:
+            item = results.get()
+            if item is done:
+                finished = True
+                return
+            if isinstance(item, BaseException):
+                finished = True
+                raise item
+            yield item
+    finally:
+        if not finished:
+            # The consumer stopped early (break, close or an error): cancel the pending requests
+            stopped.set()
+            if 'task' in running:
+                with contextlib.suppress(RuntimeError):  # the loop already closed
+                    running['loop'].call_soon_threadsafe(running['task'].cancel)
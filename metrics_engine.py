@@ -0,0 +1,168 @@
+"""Columnar computation of financial ratios over every reported period.
+
+Ratios are computed with vectorized column arithmetic over every period of a
+company's parsed ``FinancialStatements`` (and, through ``compute_metrics_table``,
+over the stacked raw reports of many tickers at once). Missing or non-numeric
+values, including Alpha Vantage's literal ``"None"``, become NaN and propagate
+through the ratios; division by zero yields NaN rather than raising.
+"""
+import numpy as np
+import pandas as pd
+
+from statement_model import STATEMENTS, FinancialStatements, statement_reports, to_float_array
+
+METRIC_NAMES = [
+    'Revenue',
+    'Cost of Goods Sold',
+    'Gross Profit',
+    'Gross Profit Margin (%)',
+    'Net Income',
+    'Net Profit Margin (%)',
+    'Current Ratio',
+    'Debt-to-Equity Ratio',
+    'Operating Cash Flow',
+    'Operating Cash Flow Margin (%)',
+    'Return on Assets (%)',
+    'Return on Equity (%)',
+    'Earnings Per Share (EPS)',
+    'Price to Earnings (P/E) Ratio',
+    'Debt to EBITDA Ratio',
+    'Free Cash Flow',
+    'Free Cash Flow Yield (%)',
+    'Price-to-Book Ratio',
+    'Dividend Yield (%)',
+    'Return on Invested Capital (ROIC) (%)',
+]
+
+# Ratios are reported to two decimals; absolute amounts are left as reported
+ROUNDED_METRICS = [name for name in METRIC_NAMES
+                   if name not in ('Revenue', 'Cost of Goods Sold', 'Gross Profit', 'Net Income', 'Operating Cash Flow')]
+
+# Fields read by the metrics, per statement; OPTIONAL_FIELDS default to 0 when the provider omits them
+FIELDS = {
+    'income_statement': ['totalRevenue', 'costOfRevenue', 'netIncome', 'ebitda', 'ebit'],
+    'balance_sheet': ['totalCurrentAssets', 'totalCurrentLiabilities', 'totalAssets', 'totalLiabilities',
+                      'totalShareholderEquity', 'commonStockSharesOutstanding', 'marketCapitalization',
+                      'shortLongTermDebtTotal'],
+    'cash_flow': ['operatingCashflow', 'capitalExpenditures', 'cashDividendsPaid'],
+}
+OPTIONAL_FIELDS = {'ebitda', 'ebit', 'marketCapitalization', 'shortLongTermDebtTotal',
+                   'capitalExpenditures', 'cashDividendsPaid'}
+
+
+def _ratio(numerator, denominator, scale=1.0):
+    return numerator * scale / denominator.where(denominator != 0)
+
+
+def _metric_columns(data):
+    """Compute every metric column from an aligned frame of statement fields."""
+    revenue = data['totalRevenue']
+    net_income = data['netIncome']
+    equity = data['totalShareholderEquity']
+    market_cap = data['marketCapitalization']
+    total_debt = data['shortLongTermDebtTotal']
+    gross_profit = revenue - data['costOfRevenue']
+    operating_cash_flow = data['operatingCashflow']
+    free_cash_flow = operating_cash_flow - data['capitalExpenditures']
+
+    metrics = pd.DataFrame({
+        'Revenue': revenue,
+        'Cost of Goods Sold': data['costOfRevenue'],
+        'Gross Profit': gross_profit,
+        'Gross Profit Margin (%)': _ratio(gross_profit, revenue, 100),
+        'Net Income': net_income,
+        'Net Profit Margin (%)': _ratio(net_income, revenue, 100),
+        'Current Ratio': _ratio(data['totalCurrentAssets'], data['totalCurrentLiabilities']),
+        'Debt-to-Equity Ratio': _ratio(data['totalLiabilities'], equity),
+        'Operating Cash Flow': operating_cash_flow,
+        'Operating Cash Flow Margin (%)': _ratio(operating_cash_flow, revenue, 100),
+        'Return on Assets (%)': _ratio(net_income, data['totalAssets'], 100),
+        'Return on Equity (%)': _ratio(net_income, equity, 100),
+        'Earnings Per Share (EPS)': _ratio(net_income, data['commonStockSharesOutstanding']),
+        'Price to Earnings (P/E) Ratio': _ratio(market_cap, net_income),
+        'Debt to EBITDA Ratio': _ratio(total_debt, data['ebitda']),
+        'Free Cash Flow': free_cash_flow,
+        'Free Cash Flow Yield (%)': _ratio(free_cash_flow, market_cap, 100),
+        'Price-to-Book Ratio': _ratio(market_cap, equity),
+        'Dividend Yield (%)': _ratio(data['cashDividendsPaid'].abs(), market_cap, 100),
+        'Return on Invested Capital (ROIC) (%)': _ratio(data['ebit'], equity + total_debt, 100),
+    }, index=data.index)
+    metrics = metrics.replace([np.inf, -np.inf], np.nan)
+    metrics[ROUNDED_METRICS] = metrics[ROUNDED_METRICS].round(2)
+    return metrics
+
+
+def _stacked_statement(financial_data_by_ticker, name):
+    """Build one typed frame indexed by (ticker, period) from the reports of every ticker.
+
+    Field values are gathered into flat columns first and converted with a single
+    array cast per field, rather than per report or per ticker.
+    """
+    fields = FIELDS[name]
+    tickers, dates = [], []
+    columns = {field: [] for field in fields}
+    for ticker, financial_data in financial_data_by_ticker.items():
+        reports = statement_reports(financial_data[name])
+        absent = {field for field in fields if field in OPTIONAL_FIELDS
+                  and not any(field in report for report in reports)}
+        for report in reports:
+            tickers.append(ticker)
+            dates.append(report.get('fiscalDateEnding'))
+            for field in fields:
+                columns[field].append(0.0 if field in absent else report.get(field))
+
+    index = pd.MultiIndex.from_arrays(
+        [pd.Index(tickers, dtype=object), pd.to_datetime(pd.Index(dates, dtype=object), errors='coerce')],
+        names=['ticker', 'period'])
+    frame = pd.DataFrame(
+        {field: to_float_array(values) for field, values in columns.items()},
+        index=index, columns=fields)
+    frame = frame[index.get_level_values('period').notna()]
+    return frame[~frame.index.duplicated()]
+
+
+def stacked_fields(financial_data_by_ticker):
+    """Return the typed fields of all statements aligned on (ticker, period)."""
+    frames = [_stacked_statement(financial_data_by_ticker, name) for name in STATEMENTS]
+    return pd.concat(frames, axis=1, join='outer')
+
+
+def compute_metrics_from_fields(fields):
+    """Compute the (ticker, period) x metric frame from already typed, aligned fields."""
+    return _metric_columns(fields).sort_index()
+
+
+def compute_metrics_table(financial_data_by_ticker, wide=False):
+    """Return a long (ticker, period, metric, value) table for many companies.
+
+    The typed statement frames of all tickers are stacked first so the ratios are
+    computed in a single vectorized pass over every (ticker, period) row. With
+    ``wide=True`` the (ticker, period) x metric frame is returned instead.
+    """
+    metrics = compute_metrics_from_fields(stacked_fields(financial_data_by_ticker))
+    if wide:
+        return metrics
+    table = metrics.stack(future_stack=True).rename('value').reset_index()
+    table.columns = ['ticker', 'period', 'metric', 'value']
+    return table.dropna(subset=['value']).reset_index(drop=True)
+
+
+def compute_metrics_frame(statements):
+    """Return a (fiscalDateEnding x metric) frame for one company from its parsed statements."""
+    defaults = {name: 0.0 for name in OPTIONAL_FIELDS}
+    return compute_metrics_from_fields(statements.fields(FIELDS, defaults))
+
+
+def latest_metrics(statements):
+    """Return ``(fiscalDateEnding, {metric: value})`` for the most recent income statement period.
+
+    Accepts parsed ``FinancialStatements`` or the raw payload dict. Metrics that
+    cannot be computed for that period are omitted.
+    """
+    if not isinstance(statements, FinancialStatements):
+        statements = FinancialStatements.from_raw(statements)
+    period = statements.latest_period
+    if period is None:
+        return None, {}
+    row = compute_metrics_frame(statements).loc[period]
+    return period, {name: float(row[name]) for name in METRIC_NAMES if pd.notna(row[name])}
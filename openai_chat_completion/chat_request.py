@@ -1,14 +1,25 @@
 import os
-from openai import OpenAI
 
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-if not OPENAI_API_KEY:
-    raise ValueError("OPENAI_API_KEY environment variable is not set")
+from llm_clients import get_openai_client
+
+
+def _client():
+    # Looked up on every call, so a key changed in the environment takes effect straight away
+    api_key = os.environ.get("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is not set")
+    return get_openai_client(api_key)
+
+
+def __getattr__(name):
+    # ``openai_client`` used to be built at import time; it now resolves to the shared client lazily
+    if name == "openai_client":
+        return _client()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-openai_client = OpenAI(api_key=OPENAI_API_KEY)
 
 def send_openai_request(prompt: str) -> str:
-    completion = openai_client.chat.completions.create(
+    completion = _client().chat.completions.create(
         model="gpt-4o", messages=[{"role": "user", "content": prompt}], max_tokens=200
     )
     content = completion.choices[0].message.content
@@ -0,0 +1,128 @@
+"""Streaming, page-parallel PDF ingestion.
+
+Pages are extracted with PyMuPDF, in parallel across processes for larger
+documents, and yielded in page order as langchain ``Document`` objects. Chunks are
+split page by page and embedded in fixed-size batches, so only a bounded window of
+page text is held in memory regardless of report size.
+
+Extraction, splitting and indexing are recorded as ``pdf.extract``, ``pdf.split``
+and ``index.add`` telemetry spans; extraction and splitting spans cover the time
+spent on that work only, not the time the consumer holds on to each page.
+"""
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import pymupdf as fitz
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from telemetry import record, span
+
+PAGES_PER_TASK = 32
+
+
+def _extract_pages(path, start, stop):
+    started = time.time_ns()
+    with fitz.open(path) as doc:
+        pages = [(number, doc[number].get_text()) for number in range(start, stop)]
+    return pages, started, time.time_ns()
+
+
+def _page_count(source):
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        with fitz.open(stream=bytes(source), filetype="pdf") as doc:
+            return doc.page_count
+    with fitz.open(source) as doc:
+        return doc.page_count
+
+
+def iter_pdf_pages(source, name=None, workers=None, pages_per_task=PAGES_PER_TASK):
+    """Yield one Document per page of a PDF given as a path or as bytes.
+
+    Metadata matches langchain's PyPDFLoader: ``source`` and the zero-based ``page``.
+    With more than one worker, pages are extracted by a process pool in tasks of
+    ``pages_per_task`` pages, keeping at most ``2 * workers`` tasks in flight.
+    """
+    workers = workers or min(4, os.cpu_count() or 1)
+    name = name or (source if isinstance(source, str) else "report.pdf")
+    page_count = _page_count(source)
+
+    if workers <= 1 or page_count <= pages_per_task:
+        if isinstance(source, str):
+            doc = fitz.open(source)
+        else:
+            doc = fitz.open(stream=bytes(source), filetype="pdf")
+        with doc:
+            for start in range(0, page_count, pages_per_task):
+                started, elapsed, size = time.time_ns(), 0, 0
+                for number in range(start, min(start + pages_per_task, page_count)):
+                    extract_start = time.perf_counter_ns()
+                    text = doc[number].get_text()
+                    elapsed += time.perf_counter_ns() - extract_start
+                    size += len(text)
+                    yield Document(page_content=text, metadata={"source": name, "page": number})
+                record("pdf.extract", started, started + elapsed, pages=min(pages_per_task, page_count - start),
+                       bytes=size)
+        return
+
+    # Worker processes open the PDF by path; a per-call temp file avoids shipping the bytes to each task
+    temp_path = None
+    if not isinstance(source, str):
+        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as f:
+            f.write(source)
+            temp_path = f.name
+    path = source if temp_path is None else temp_path
+
+    try:
+        ranges = iter([(start, min(start + pages_per_task, page_count))
+                       for start in range(0, page_count, pages_per_task)])
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            window = [pool.submit(_extract_pages, path, start, stop) for start, stop in islice(ranges, 2 * workers)]
+            while window:
+                pages, started, finished = window.pop(0).result()
+                record("pdf.extract", started, finished, pages=len(pages), bytes=sum(len(text) for _, text in pages),
+                       worker_process=True)
+                for start, stop in islice(ranges, 1):
+                    window.append(pool.submit(_extract_pages, path, start, stop))
+                for number, text in pages:
+                    yield Document(page_content=text, metadata={"source": name, "page": number})
+    finally:
+        if temp_path is not None:
+            os.remove(temp_path)
+
+
+def iter_chunks(pages, text_splitter):
+    """Split pages one at a time as they arrive."""
+    started, elapsed, page_count, chunk_count = time.time_ns(), 0, 0, 0
+    for page in pages:
+        split_start = time.perf_counter_ns()
+        chunks = text_splitter.split_documents([page])
+        elapsed += time.perf_counter_ns() - split_start
+        page_count += 1
+        chunk_count += len(chunks)
+        yield from chunks
+    record("pdf.split", started, started + elapsed, pages=page_count, chunks=chunk_count)
+
+
+def build_vectorstore(chunks, embeddings, batch_size=256, vectorstore=None):
+    """Embed chunks in batches of ``batch_size`` and add them to a FAISS vectorstore.
+
+    A new vectorstore is created from the first batch unless one is passed in.
+    Returns None when there are no chunks and no vectorstore was given.
+    """
+    chunks = iter(chunks)
+    while True:
+        batch = list(islice(chunks, batch_size))
+        if not batch:
+            return vectorstore
+        texts = [chunk.page_content for chunk in batch]
+        metadatas = [chunk.metadata for chunk in batch]
+        text_embeddings = list(zip(texts, embeddings.embed_documents(texts)))
+        with span("index.add", chunks=len(batch)):
+            if vectorstore is None:
+                vectorstore = FAISS.from_embeddings(text_embeddings, embeddings, metadatas=metadatas)
+            else:
+                vectorstore.add_embeddings(text_embeddings, metadatas=metadatas)
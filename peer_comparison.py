@@ -0,0 +1,241 @@
+"""Cross-sectional comparison of companies on their financial metrics.
+
+``MetricMatrix`` holds the metrics of every loaded company as one float64 array of
+shape (ticker, metric, fiscal year), with dicts mapping tickers and metrics to their
+positions. Peer queries (percentile ranks, z-scores, top-N) slice one year, or each
+company's latest reported value, out of that array and compute over all companies
+and metrics at once, so their cost does not grow with a per-company pipeline.
+
+Matrices are built from the statements already stored locally: the
+``StatementWarehouse`` when one is configured, otherwise the statement cache. No
+provider requests are made. ``get_metric_matrix`` keeps the last built matrix and
+rebuilds it only when the stored statements change.
+"""
+import hashlib
+import os
+import threading
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from metrics_engine import METRIC_NAMES, compute_metrics_table
+from telemetry import span
+
+
+class MetricMatrix:
+    """Metrics of many companies as a (ticker, metric, fiscal year) array.
+
+    ``groups`` optionally maps tickers to a peer group (e.g. a sector); queries with
+    ``by_group=True`` then rank each company within its own group.
+    """
+
+    def __init__(self, values, tickers, metrics, years, groups=None):
+        self.values = values
+        self.tickers = list(tickers)
+        self.metrics = list(metrics)
+        self.years = list(years)
+        self.ticker_index = {ticker: position for position, ticker in enumerate(self.tickers)}
+        self.metric_index = {metric: position for position, metric in enumerate(self.metrics)}
+        self.year_index = {year: position for position, year in enumerate(self.years)}
+        self.groups = dict(groups or {})
+        self._latest = None
+
+    @classmethod
+    def from_frame(cls, metrics, groups=None):
+        """Build from a (ticker, period) x metric frame, e.g. ``compute_metrics_table(..., wide=True)``.
+
+        Periods are bucketed by calendar year of their end date; when a company reports
+        several periods in one year, the latest one is kept.
+        """
+        if metrics.empty:
+            return cls(np.empty((0, len(METRIC_NAMES), 0)), [], METRIC_NAMES, [], groups)
+        metrics = metrics.sort_index()
+        ticker_codes, tickers = pd.factorize(metrics.index.get_level_values('ticker'), sort=True)
+        period_years = metrics.index.get_level_values('period').year.to_numpy()
+        year_codes, years = pd.factorize(period_years, sort=True)
+        # Keep the last row of each (ticker, year): quarterly and fiscal-year ends can share a year
+        last = ~pd.Series(ticker_codes * len(years) + year_codes).duplicated(keep='last').to_numpy()
+        columns = list(metrics.columns)
+        values = np.full((len(tickers), len(columns), len(years)), np.nan)
+        values[ticker_codes[last], :, year_codes[last]] = metrics.to_numpy(dtype=float)[last]
+        return cls(values, tickers, columns, [int(year) for year in years], groups)
+
+    @classmethod
+    def from_financial_data(cls, financial_data_by_ticker, groups=None):
+        """Build from raw statement payloads keyed by ticker."""
+        return cls.from_frame(compute_metrics_table(financial_data_by_ticker, wide=True), groups)
+
+    @classmethod
+    def from_warehouse(cls, warehouse, tickers=None, groups=None):
+        """Build from the memory-mapped history of ``tickers`` (default: all) in a ``StatementWarehouse``."""
+        return cls.from_frame(warehouse.metrics_table(tickers), groups)
+
+    @classmethod
+    def from_statement_cache(cls, cache, tickers=None, groups=None):
+        """Build from the statements of ``tickers`` (default: every fully cached symbol) in a ``StatementCache``."""
+        from data_processing import STATEMENT_FUNCTIONS
+
+        # A read-only scan, so building the matrix neither skews the cache's hit counts nor its LRU order
+        financial_data_by_ticker = {
+            ticker: {statement: payloads[function] for statement, function in STATEMENT_FUNCTIONS.items()}
+            for ticker, payloads in cache.scan(STATEMENT_FUNCTIONS.values(), symbols=tickers)
+        }
+        return cls.from_financial_data(financial_data_by_ticker, groups)
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes
+
+    def latest(self):
+        """(ticker, metric) array of each company's most recent non-missing value of each metric."""
+        if self._latest is None:
+            present = ~np.isnan(self.values)
+            # Position of the last present year along the year axis (the last year, NaN, when none is)
+            last = self.values.shape[2] - 1 - np.argmax(present[:, :, ::-1], axis=2) if self.years else None
+            if last is None:
+                self._latest = np.full(self.values.shape[:2], np.nan)
+            else:
+                self._latest = np.take_along_axis(self.values, last[:, :, None], axis=2)[:, :, 0]
+        return self._latest
+
+    def snapshot(self, year=None):
+        """(ticker, metric) array for fiscal ``year``; each company's latest values when ``year`` is None."""
+        if year is None:
+            return self.latest()
+        if year not in self.year_index:
+            return np.full(self.values.shape[:2], np.nan)
+        return self.values[:, :, self.year_index[year]]
+
+    def _rows(self, peers):
+        if peers is None:
+            return np.arange(len(self.tickers))
+        return np.array([self.ticker_index[ticker.upper()] for ticker in peers
+                         if ticker.upper() in self.ticker_index], dtype=int)
+
+    def frame(self, year=None, peers=None):
+        """Ticker x metric frame of ``peers`` (default: every company) for ``year`` (default: latest)."""
+        rows = self._rows(peers)
+        return pd.DataFrame(self.snapshot(year)[rows], index=pd.Index([self.tickers[i] for i in rows], name='ticker'),
+                            columns=self.metrics)
+
+    def _group_labels(self, index):
+        return pd.Series([self.groups.get(ticker) for ticker in index], index=index)
+
+    def percentiles(self, year=None, peers=None, by_group=False):
+        """Percentile rank (0-100] of every company among ``peers`` on every metric.
+
+        A company's rank is the share of peers with a value at or below its own (ties
+        share their average rank); missing values are not ranked.
+        """
+        with span("peers.percentiles", companies=len(self.tickers), by_group=by_group):
+            frame = self.frame(year, peers)
+            if by_group:
+                return frame.groupby(self._group_labels(frame.index), dropna=False).rank(pct=True) * 100
+            return frame.rank(pct=True) * 100
+
+    def zscores(self, year=None, peers=None, by_group=False):
+        """Standard score of every company's value relative to the mean and spread of ``peers``."""
+        with span("peers.zscores", companies=len(self.tickers), by_group=by_group):
+            frame = self.frame(year, peers)
+            if by_group:
+                grouped = frame.groupby(self._group_labels(frame.index), dropna=False)
+                mean, std = grouped.transform('mean'), grouped.transform('std', ddof=0)
+                return (frame - mean) / std.where(std != 0)
+            values = frame.to_numpy()
+            with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+                # Metrics no peer reports have no mean; their scores stay NaN
+                warnings.simplefilter('ignore', RuntimeWarning)
+                mean = np.nanmean(values, axis=0)
+                std = np.nanstd(values, axis=0)
+                scores = (values - mean) / np.where(std == 0, np.nan, std)
+            return pd.DataFrame(scores, index=frame.index, columns=frame.columns)
+
+    def top(self, metric, n=10, year=None, peers=None, ascending=False):
+        """The ``n`` companies with the highest (``ascending=True``: lowest) value of ``metric``."""
+        with span("peers.top", metric=metric, n=n, companies=len(self.tickers)):
+            rows = self._rows(peers)
+            column = self.snapshot(year)[rows, self.metric_index[metric]]
+            keys = column if ascending else -column
+            keys = np.where(np.isnan(keys), np.inf, keys)
+            n = min(n, int((~np.isnan(column)).sum()))
+            if n == 0:
+                return pd.Series(dtype=float, name=metric)
+            # Partition out the best n before sorting only those
+            best = np.argpartition(keys, n - 1)[:n] if n < len(keys) else np.arange(len(keys))
+            best = best[np.argsort(keys[best], kind='stable')]
+            return pd.Series(column[best], index=pd.Index([self.tickers[rows[i]] for i in best], name='ticker'),
+                             name=metric)
+
+    def profile(self, ticker, year=None, peers=None, by_group=False):
+        """Metric x (value, peer median, percentile, z-score) comparison of ``ticker`` with its peers.
+
+        ``ticker`` is always included in its own peer set.
+        """
+        ticker = ticker.upper()
+        if ticker not in self.ticker_index:
+            raise KeyError(f"{ticker} is not loaded")
+        if peers is not None:
+            peers = list(dict.fromkeys([ticker] + [peer.upper() for peer in peers]))
+        elif by_group:
+            group = self.groups.get(ticker)
+            peers = [other for other in self.tickers if self.groups.get(other) == group]
+        frame = self.frame(year, peers)
+        return pd.DataFrame({
+            'value': frame.loc[ticker],
+            'peer_median': frame.median(),
+            'percentile': self.percentiles(year, peers).loc[ticker],
+            'z_score': self.zscores(year, peers).loc[ticker],
+            'peers': frame.notna().sum(),
+        })
+
+
+def source_version(warehouse=None, cache=None):
+    """Identifier of the stored statements a matrix is built from; changes when any of them does."""
+    digest = hashlib.blake2b(digest_size=16)
+    if warehouse is not None:
+        for ticker in warehouse.tickers():
+            digest.update(warehouse.version(ticker).encode())
+    else:
+        from data_processing import STATEMENT_FUNCTIONS
+
+        for symbol, stored_at in cache.symbols(STATEMENT_FUNCTIONS.values()).items():
+            digest.update(f"{symbol}:{stored_at}".encode())
+    return digest.hexdigest()
+
+
+_matrix = None
+_matrix_version = None
+_matrix_lock = threading.Lock()
+
+
+def get_metric_matrix(warehouse=None, cache=None):
+    """Return the matrix of every locally stored company, rebuilt only when the stored statements change.
+
+    Reads the ``StatementWarehouse`` when STATEMENT_WAREHOUSE_PATH is set (or ``warehouse``
+    is given), otherwise the statement cache.
+    """
+    global _matrix, _matrix_version
+    if warehouse is None and cache is None:
+        if os.environ.get("STATEMENT_WAREHOUSE_PATH"):
+            from statement_warehouse import get_statement_warehouse
+
+            warehouse = get_statement_warehouse()
+        else:
+            from statement_cache import get_statement_cache
+
+            cache = get_statement_cache()
+    with _matrix_lock:
+        version = source_version(warehouse, cache)
+        if _matrix is None or version != _matrix_version:
+            with span("peers.build", source="warehouse" if warehouse is not None else "cache") as build_span:
+                if warehouse is not None:
+                    _matrix = MetricMatrix.from_warehouse(warehouse)
+                else:
+                    _matrix = MetricMatrix.from_statement_cache(cache)
+                build_span.set(companies=len(_matrix), years=len(_matrix.years), bytes=_matrix.nbytes)
+            _matrix_version = version
+        return _matrix
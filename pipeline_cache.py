@@ -0,0 +1,167 @@
+"""Memoized results of the Financial Data page pipeline.
+
+Streamlit reruns the whole page on every widget interaction. The metrics table,
+the charts (serialized to Plotly JSON on first use) and the AI insights computed
+for a ticker are kept here under ``(ticker, data version)``, where the version is a
+BLAKE2 fingerprint of the raw statement payloads, so an unchanged rerun only pays
+for the (statement-cached) fetch and the fingerprint. Entries are evicted least
+recently used once their estimated size exceeds ``max_bytes``. Each entry's size is
+measured when it is stored and again whenever it grows (charts serialized or parsed,
+insights attached), and the cache keeps the running total.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def payload_fingerprint(financial_data):
+    """Cheap content hash of the raw statement payloads (well under a millisecond for typical payloads)."""
+    digest = hashlib.blake2b(digest_size=16)
+    for statement in sorted(financial_data):
+        digest.update(statement.encode())
+        digest.update(json.dumps(financial_data[statement], separators=(",", ":")).encode())
+    return digest.hexdigest()
+
+
+@dataclass
+class PipelineEntry:
+    ticker: str
+    version: str
+    metrics_df: object
+    chart_set: object
+    insights: str = None
+    _charts: list = field(default=None, repr=False)
+    # The cache holding the entry, which re-measures it when it grows
+    _cache: object = field(default=None, repr=False, compare=False)
+
+    @property
+    def charts_json(self):
+        """Serialized figures, built on first access (see ``chart_generation.ChartSet``)."""
+        serialized = self.chart_set.serialized_bytes
+        charts = self.chart_set.to_json_list()
+        if self.chart_set.serialized_bytes != serialized:
+            self._grew()
+        return charts
+
+    @property
+    def charts(self):
+        """Figures as plain dicts, which ``st.plotly_chart`` renders without re-validating them."""
+        if self._charts is None:
+            self._charts = [json.loads(chart) for chart in self.charts_json]
+            self._grew()
+        return self._charts
+
+    def _grew(self):
+        if self._cache is not None:
+            self._cache.resize(self)
+
+    @property
+    def size(self):
+        # Statement frames, serialized charts and any figures the chart set holds, plus the
+        # parsed chart dicts once ``charts`` has been read
+        parsed = self.chart_set.parsed_bytes if self._charts is not None else 0
+        return (self.chart_set.nbytes + parsed
+                + int(self.metrics_df.memory_usage(deep=True).sum())
+                + len(self.insights or ""))
+
+
+class PipelineCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        # Size of each entry when it was last measured, and their total
+        self._sizes = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, ticker, version):
+        key = (ticker.upper(), version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, entry):
+        key = (entry.ticker.upper(), entry.version)
+        entry._cache = self
+        # Measured outside the lock; sizing an entry touches its frames and chart set
+        size = entry.size
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._bytes += size - self._sizes.get(key, 0)
+            self._sizes[key] = size
+            self._evict()
+        return entry
+
+    def set_insights(self, entry, insights):
+        """Attach insights to a cached entry; they count towards its size from now on."""
+        entry.insights = insights
+        self.resize(entry)
+
+    def resize(self, entry):
+        """Re-measure ``entry`` after it grew and evict down to ``max_bytes`` again."""
+        key = (entry.ticker.upper(), entry.version)
+        size = entry.size
+        with self._lock:
+            # An entry that was evicted or replaced meanwhile no longer counts
+            if self._entries.get(key) is not entry:
+                return
+            self._bytes += size - self._sizes[key]
+            self._sizes[key] = size
+            self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            key, _ = self._entries.popitem(last=False)
+            self._bytes -= self._sizes.pop(key)
+            self.evictions += 1
+
+    def invalidate(self, ticker=None):
+        """Drop every entry for ``ticker``, or everything when no ticker is given."""
+        with self._lock:
+            if ticker is None:
+                self._entries.clear()
+                self._sizes.clear()
+                self._bytes = 0
+            else:
+                for key in [key for key in self._entries if key[0] == ticker.upper()]:
+                    del self._entries[key]
+                    self._bytes -= self._sizes.pop(key)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_pipeline_cache():
+    """Return the process-wide cache, sized by PIPELINE_CACHE_MAX_BYTES."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = PipelineCache(int(os.environ.get("PIPELINE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)))
+        return _default_cache
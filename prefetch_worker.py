@@ -0,0 +1,361 @@
+"""Background prefetching of a watchlist of tickers.
+
+``PrefetchWorker`` runs in a daemon thread next to the app and keeps the companies on
+its watchlist warm: it fetches their statements (into the statement cache, or the
+``StatementWarehouse`` when one is configured), computes the metrics and serializes
+the charts into the pipeline cache, so the Financial Data page serves them without
+waiting on the provider. Provider requests go through a ``ProviderQuota`` sized to the
+key's per-minute and per-day limits. There is one worker per provider key
+(``get_prefetch_worker``), with its own watchlist file, and it shares the key's
+``get_provider_quota`` with the page's interactive lookups.
+
+Each ticker is scheduled again for when its next filing is expected (the latest
+fiscal period plus the period length and a filing lag), then rechecked daily until
+the provider has it. Without a warehouse it is also rewarmed before its cached
+statements expire. Failures are retried with exponential backoff, and a spent daily
+budget defers the queue until the budget refills.
+
+Run it as a separate process to warm the on-disk caches for other processes:
+
+    python prefetch_worker.py watchlist.txt --rpm 5 --per-day 25
+"""
+import argparse
+import datetime
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+from data_processing import ALPHA_VANTAGE_URL, analyze_ticker, cache_function
+from pipeline_cache import get_pipeline_cache
+from rate_limit import DEFAULT_PROVIDER_RPM, ProviderQuota, QuotaExhausted, get_provider_quota
+from statement_warehouse import DEFAULT_RECHECK_SECONDS, STALE_AFTER
+from telemetry import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WATCHLIST_DIR = os.path.join(".cache", "watchlists")
+# Retry delays after failed fetches double from here up to the recheck interval
+RETRY_BASE_SECONDS = 60
+
+
+def watchlist_path_for(api_key):
+    """Watchlist file of one provider key, named by a digest so the key itself is not written to disk."""
+    directory = os.environ.get("PREFETCH_WATCHLIST_DIR", DEFAULT_WATCHLIST_DIR)
+    return os.path.join(directory, hashlib.blake2b(api_key.encode(), digest_size=8).hexdigest() + ".json")
+
+
+def next_filing_due(latest_period, periodicity):
+    """Date by which the period after ``latest_period`` should have been filed."""
+    return latest_period + STALE_AFTER[periodicity]
+
+
+class PrefetchWorker:
+    """Keep the analysis of every watchlist ticker warm in the caches.
+
+    ``run_pending`` processes the tickers that are due, which is what the background
+    thread started by ``start`` does in a loop; call it directly to drive the worker
+    synchronously (e.g. against ``benchmarks/stub_server.py``). ``status`` reports the
+    queue and per-ticker state.
+    """
+
+    def __init__(self, api_key, watchlist=(), watchlist_path=None, base_url=ALPHA_VANTAGE_URL,
+                 requests_per_minute=DEFAULT_PROVIDER_RPM, requests_per_day=None, pipeline_cache=None,
+                 warehouse=None, statement_cache=None, recheck_seconds=DEFAULT_RECHECK_SECONDS, clock=time.time,
+                 quota=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        # ``quota`` shares a key's budget with other callers; otherwise the worker gets its own
+        self.quota = quota or ProviderQuota(requests_per_minute, requests_per_day)
+        self.pipeline_cache = pipeline_cache or get_pipeline_cache()
+        if warehouse is None and statement_cache is None:
+            if os.environ.get("STATEMENT_WAREHOUSE_PATH"):
+                from statement_warehouse import get_statement_warehouse
+                warehouse = get_statement_warehouse()
+            else:
+                from statement_cache import get_statement_cache
+                statement_cache = get_statement_cache()
+        self.warehouse = warehouse
+        self.statement_cache = statement_cache
+        self.recheck_seconds = recheck_seconds
+        self.watchlist_path = watchlist_path
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._queue = []
+        self._sequence = itertools.count()
+        self._states = {}
+        self._stopping = False
+        self._thread = None
+        self.current = None
+        self.processed = 0
+        self.failed = 0
+        self.deferred = 0
+
+        for ticker in list(watchlist) + self._load_watchlist():
+            self.add(ticker)
+
+    def _load_watchlist(self):
+        if not self.watchlist_path:
+            return []
+        try:
+            with open(self.watchlist_path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return []
+
+    def _save_watchlist(self):
+        if not self.watchlist_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.watchlist_path)), exist_ok=True)
+        with open(self.watchlist_path + ".tmp", "w") as f:
+            json.dump(sorted(self._states), f)
+        os.replace(self.watchlist_path + ".tmp", self.watchlist_path)
+
+    def _schedule(self, ticker, when):
+        # Superseded heap entries are skipped when popped: only the state's next_run counts
+        self._states[ticker]['next_run'] = when
+        heapq.heappush(self._queue, (when, next(self._sequence), ticker))
+        self._wake.notify()
+
+    def add(self, ticker):
+        """Add ``ticker`` to the watchlist and queue it for an immediate first fetch."""
+        ticker = ticker.strip().upper()
+        with self._lock:
+            if not ticker or ticker in self._states:
+                return
+            self._states[ticker] = {'state': 'queued', 'next_run': None, 'last_run': None, 'seconds': None,
+                                    'latest_period': None, 'failures': 0, 'error': None}
+            self._schedule(ticker, self.clock())
+            self._save_watchlist()
+
+    def remove(self, ticker):
+        with self._lock:
+            if self._states.pop(ticker.strip().upper(), None) is not None:
+                self._save_watchlist()
+
+    @property
+    def watchlist(self):
+        with self._lock:
+            return sorted(self._states)
+
+    def _pop_due(self, now):
+        with self._lock:
+            while self._queue and self._queue[0][0] <= now:
+                when, _, ticker = heapq.heappop(self._queue)
+                state = self._states.get(ticker)
+                if state is not None and state['next_run'] == when:
+                    self.current = ticker
+                    return ticker, state['last_run'] is not None
+            return None, False
+
+    def _latest_period(self, ticker):
+        if self.warehouse is not None:
+            return self.warehouse.latest_period(ticker)
+        # A read-only peek: rescheduling is not a lookup and must not count or reorder the LRU
+        payload = (self.statement_cache.peek(cache_function("INCOME_STATEMENT", self.base_url), ticker)
+                   if self.statement_cache else None)
+        latest = None
+        # Annual first, like the statements served (see StatementWarehouse.latest_period)
+        for periodicity in ('annual', 'quarterly'):
+            dates = [report.get('fiscalDateEnding') for report in (payload or {}).get(f"{periodicity}Reports") or []]
+            dates = [date for date in dates if date]
+            if dates:
+                latest = (datetime.date.fromisoformat(max(dates)), periodicity)
+                break
+        return latest or (None, None)
+
+    def _next_run(self, now, latest, periodicity):
+        """When to look for the filing after ``latest`` (see ``_latest_period``), or recheck daily once overdue."""
+        next_run = now + self.recheck_seconds
+        if latest is not None:
+            due = datetime.datetime.combine(next_filing_due(latest, periodicity), datetime.time()).timestamp()
+            next_run = max(due, next_run)
+        if self.warehouse is None and self.statement_cache is not None and self.statement_cache.ttl:
+            # Rewarm before the cached statements expire and interactive lookups would go to the provider
+            next_run = min(next_run, now + self.statement_cache.ttl * 0.9)
+        return next_run, latest
+
+    def process(self, ticker, refresh=False):
+        """Fetch and precompute one ticker now; returns its new state."""
+        start = self.clock()
+        with span("prefetch.ticker", ticker=ticker, refresh=refresh) as prefetch_span:
+            try:
+                entry = analyze_ticker(ticker, self.api_key, pipeline_cache=self.pipeline_cache,
+                                       warehouse=self.warehouse, base_url=self.base_url, rate_limiter=self.quota,
+                                       refresh=refresh, statement_cache=self.statement_cache)
+                error = None
+                if entry is None:
+                    error = "fetch failed"
+                elif 'Error' in entry.metrics_df.columns:
+                    error = str(entry.metrics_df['Error'].iloc[0])
+                else:
+                    # Serialize the charts now so the page only has to send them
+                    entry.charts_json
+            except QuotaExhausted as e:
+                prefetch_span.set(deferred=True)
+                return self._defer(ticker, e)
+            except Exception as e:
+                logger.warning("Prefetch of %s failed: %s", ticker, e)
+                error = f"{type(e).__name__}: {e}"
+            prefetch_span.set(error=error)
+
+        now = self.clock()
+        # Read before taking the lock, which status() and the page wait on
+        latest, periodicity = self._latest_period(ticker) if error is None else (None, None)
+        with self._lock:
+            state = self._states.get(ticker)
+            if state is None:
+                # Removed from the watchlist while it was being fetched
+                self.current = None
+                return None
+            state.update(last_run=now, seconds=now - start, error=error)
+            if error is None:
+                next_run, latest = self._next_run(now, latest, periodicity)
+                state.update(state='warm', failures=0, latest_period=latest and latest.isoformat())
+                self.processed += 1
+            else:
+                state['failures'] += 1
+                state['state'] = 'failed'
+                next_run = now + min(RETRY_BASE_SECONDS * 2 ** (state['failures'] - 1), self.recheck_seconds)
+                self.failed += 1
+            self._schedule(ticker, next_run)
+            self.current = None
+            return dict(state)
+
+    def _defer(self, ticker, error):
+        now = self.clock()
+        with self._lock:
+            self.deferred += 1
+            self.current = None
+            state = self._states.get(ticker)
+            if state is None:
+                return None
+            state.update(state='deferred', error=str(error))
+            self._schedule(ticker, now + max(self.quota.seconds_until(3), 1.0))
+            return dict(state)
+
+    def run_pending(self):
+        """Process every ticker that is due now; returns how many were processed."""
+        count = 0
+        while not self._stopping:
+            ticker, refresh = self._pop_due(self.clock())
+            if ticker is None:
+                break
+            self.process(ticker, refresh=refresh)
+            count += 1
+        return count
+
+    def _run(self):
+        while True:
+            self.run_pending()
+            with self._lock:
+                if self._stopping:
+                    return
+                delay = self._queue[0][0] - self.clock() if self._queue else None
+                if delay is None or delay > 0:
+                    self._wake.wait(timeout=delay)
+                if self._stopping:
+                    return
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="prefetch-worker", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Stop after the ticker being processed, if any."""
+        with self._lock:
+            self._stopping = True
+            self._wake.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self):
+        """Queue and quota metrics, with the state of every watchlist ticker."""
+        now = self.clock()
+        with self._lock:
+            tickers = {ticker: dict(state) for ticker, state in self._states.items()}
+            current = self.current
+        states = [state['state'] for state in tickers.values()]
+        upcoming = [state['next_run'] for ticker, state in tickers.items()
+                    if state['next_run'] is not None and ticker != current]
+        return {
+            'running': self.running,
+            'watchlist': len(tickers),
+            'due': sum(1 for when in upcoming if when <= now),
+            'next_run_in': max(min(upcoming) - now, 0.0) if upcoming else None,
+            'in_progress': current,
+            **{name: states.count(name) for name in ('queued', 'warm', 'failed', 'deferred')},
+            'processed': self.processed,
+            'failures': self.failed,
+            'deferrals': self.deferred,
+            **self.quota.stats(),
+            'tickers': tickers,
+        }
+
+
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_prefetch_worker(api_key):
+    """Return the worker of ``api_key``, started on first use.
+
+    Each key has its own watchlist (``watchlist_path_for``) and spends its own
+    ``get_provider_quota``, which interactive lookups with the key share.
+    """
+    with _workers_lock:
+        if api_key not in _workers:
+            _workers[api_key] = PrefetchWorker(api_key, watchlist_path=watchlist_path_for(api_key),
+                                               quota=get_provider_quota(api_key)).start()
+        return _workers[api_key]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Keep the statements and metrics of a watchlist warm.")
+    parser.add_argument('tickers', nargs='?', help="file with one ticker per line, added to the watchlist")
+    parser.add_argument('--api-key', default=os.environ.get('ALPHA_VANTAGE_API_KEY'))
+    parser.add_argument('--watchlist', help="persisted watchlist file (default: the key's file under "
+                                            "PREFETCH_WATCHLIST_DIR, as in the app)")
+    parser.add_argument('--rpm', type=float, default=DEFAULT_PROVIDER_RPM, help="provider requests per minute")
+    parser.add_argument('--per-day', type=int, help="provider requests per day")
+    parser.add_argument('--base-url', default=ALPHA_VANTAGE_URL)
+    parser.add_argument('--status-interval', type=float, default=60, help="seconds between status lines")
+    args = parser.parse_args(argv)
+    if not args.api_key:
+        parser.error("an API key is required (--api-key or ALPHA_VANTAGE_API_KEY)")
+
+    logging.basicConfig(level=os.environ.get("LOG_LEVEL", "INFO").upper(),
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    tickers = []
+    if args.tickers:
+        with open(args.tickers) as f:
+            tickers = [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    worker = PrefetchWorker(args.api_key, tickers, watchlist_path=args.watchlist or watchlist_path_for(args.api_key),
+                            base_url=args.base_url,
+                            requests_per_minute=args.rpm, requests_per_day=args.per_day).start()
+    try:
+        while True:
+            time.sleep(args.status_interval)
+            status = worker.status()
+            logger.info("watchlist %d: %d warm, %d due, %d failed, %d deferred, %d provider requests",
+                        status['watchlist'], status['warm'], status['due'], status['failed'], status['deferred'],
+                        status['requests'])
+    except KeyboardInterrupt:
+        worker.stop()
+
+
+if __name__ == "__main__":
+    main()
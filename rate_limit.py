@@ -0,0 +1,135 @@
+import asyncio
+import os
+import threading
+import time
+
+
+class TokenBucket:
+    """Thread-safe token bucket.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``;
+    ``acquire`` blocks until enough tokens are available.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests_per_minute, burst=None):
+        return cls(requests_per_minute / 60.0, capacity=burst)
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self, tokens=1):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def acquire(self, tokens=1):
+        """Block until ``tokens`` are available and take them; returns the time waited."""
+        if tokens > self.capacity:
+            raise ValueError("cannot acquire more tokens than the bucket capacity")
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    async def acquire_async(self, tokens=1):
+        """``acquire`` for coroutines: waits with ``asyncio.sleep`` instead of blocking the loop."""
+        if tokens > self.capacity:
+            raise ValueError("cannot acquire more tokens than the bucket capacity")
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill(time.monotonic())
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return waited
+                delay = (tokens - self._tokens) / self.rate
+            await asyncio.sleep(delay)
+            waited += delay
+
+    @property
+    def available(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return self._tokens
+
+
+class QuotaExhausted(Exception):
+    """Raised by ``ProviderQuota.acquire`` when the daily request budget is used up."""
+
+
+class ProviderQuota:
+    """Per-minute and optional per-day request budget for one provider key.
+
+    ``acquire`` waits for the per-minute bucket but raises ``QuotaExhausted`` rather than
+    block for hours when the daily budget is spent; ``requests`` counts the acquired calls.
+    Pass it as ``rate_limiter`` to ``fetch_financial_data``, which only acquires for
+    requests that actually reach the provider.
+    """
+
+    def __init__(self, requests_per_minute, requests_per_day=None):
+        # A full minute's requests may go out at once, as the provider counts them per minute
+        self.minute = TokenBucket.per_minute(requests_per_minute, burst=max(1.0, requests_per_minute))
+        self.day = TokenBucket(requests_per_day / 86400.0, capacity=requests_per_day) if requests_per_day else None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        if self.day is not None and not self.day.try_acquire(tokens):
+            raise QuotaExhausted(f"daily budget of {self.day.capacity:g} requests is used up")
+        waited = self.minute.acquire(tokens)
+        with self._lock:
+            self.requests += tokens
+        return waited
+
+    def seconds_until(self, tokens=1):
+        """How long until ``tokens`` requests fit in both budgets (0 when they fit now)."""
+        waits = [(tokens - bucket.available) / bucket.rate
+                 for bucket in (self.minute, self.day) if bucket is not None and bucket.available < tokens]
+        return max(waits, default=0.0)
+
+    def stats(self):
+        return {
+            'requests': self.requests,
+            'available_per_minute': self.minute.available,
+            'available_today': self.day.available if self.day is not None else None,
+        }
+
+
+DEFAULT_PROVIDER_RPM = 5
+
+_quotas = {}
+_quotas_lock = threading.Lock()
+
+
+def get_provider_quota(api_key):
+    """Return the process-wide ``ProviderQuota`` of one provider key.
+
+    Every fetch made with the key (interactive lookups and the prefetch worker) should
+    acquire from it. Sized by PROVIDER_RPM (default 5) and PROVIDER_REQUESTS_PER_DAY.
+    """
+    with _quotas_lock:
+        if api_key not in _quotas:
+            per_day = os.environ.get("PROVIDER_REQUESTS_PER_DAY")
+            _quotas[api_key] = ProviderQuota(float(os.environ.get("PROVIDER_RPM", DEFAULT_PROVIDER_RPM)),
+                                             int(per_day) if per_day else None)
+        return _quotas[api_key]
@@ -1,47 +1,213 @@
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chains.question_answering import load_qa_chain
-from langchain.llms import OpenAI
+import hashlib
+import json
 import os
 
-def process_annual_report(uploaded_file, openai_api_key):
-    # Save uploaded file to a temporary location
-    with open("temp_report.pdf", "wb") as f:
-        f.write(uploaded_file.getbuffer())
+from answer_cache import get_answer_cache
+from context_packing import build_context, get_token_counter, token_budget
+from corpus_index import CorpusIndex, get_corpus
+from embedding_cache import CachedEmbeddings, HashingEmbeddings
+from index_store import get_index_store, report_key
+from llm_clients import get_completion_llm, get_openai_embeddings, get_qa_chain
+from llm_metrics import timed_stream
+from telemetry import span
 
-    # Load and split the document
-    loader = PyPDFLoader("temp_report.pdf")
-    documents = loader.load()
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 100
+MAX_TABLE_SIZE = 4000
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
+RETRIEVAL_K = 4
+# Results taken from each of the dense and the BM25 search before they are fused
+HYBRID_CANDIDATES = 20
+# Chunks retrieved for the context packer to deduplicate, diversify and fit to the token budget
+CONTEXT_CANDIDATES = 6
+
+def ingestion_config(embeddings):
+    # Everything that changes the resulting index must be part of the store key
+    return {
+        "loader": "pymupdf",
+        "splitter": "TableAwareSplitter",
+        "chunk_size": CHUNK_SIZE,
+        "chunk_overlap": CHUNK_OVERLAP,
+        "max_table_size": MAX_TABLE_SIZE,
+        "embedding_model": embeddings.model,
+    }
+
+def make_splitter():
+    from report_chunking import TableAwareSplitter
+
+    return TableAwareSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP, max_table_size=MAX_TABLE_SIZE)
+
+RETRIEVAL_MODES = ("hybrid", "dense", "text")
+
+def retrieval_mode():
+    # How the corpus is searched: fused dense + BM25 (default), embeddings only, or BM25 only
+    mode = os.environ.get("RETRIEVAL_MODE", "hybrid")
+    if mode not in RETRIEVAL_MODES:
+        raise ValueError(f"RETRIEVAL_MODE must be one of {', '.join(RETRIEVAL_MODES)}, not {mode!r}")
+    return mode
+
+def get_embeddings(openai_api_key):
+    # EMBEDDING_BACKEND=local swaps in deterministic offline embeddings (benchmarks, no API key)
+    if os.environ.get("EMBEDDING_BACKEND") == "local":
+        base = HashingEmbeddings()
+    else:
+        base = get_openai_embeddings(openai_api_key)
+    return CachedEmbeddings(
+        base,
+        batch_size=int(os.environ.get("EMBEDDING_BATCH_SIZE", 128)),
+        max_concurrency=int(os.environ.get("EMBEDDING_CONCURRENCY", 4)),
     )
-    docs = text_splitter.split_documents(documents)
 
-    # Create embeddings and store in FAISS index
-    embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
-    vectorstore = FAISS.from_documents(docs, embeddings)
+def report_key_for(uploaded_file, openai_api_key):
+    embeddings = get_embeddings(openai_api_key)
+    return report_key(uploaded_file.getvalue(), ingestion_config(embeddings))
+
+def get_report_corpus(openai_api_key):
+    return get_corpus(get_embeddings(openai_api_key))
+
+def process_annual_report(uploaded_file, openai_api_key, index_store=None, ticker=None, fiscal_year=None):
+    index_store = index_store or get_index_store()
+    embeddings = get_embeddings(openai_api_key)
+    config = ingestion_config(embeddings)
+    pdf_bytes = uploaded_file.getvalue()
+    key = report_key(pdf_bytes, config)
+
+    with span("report.ingest", report_key=key, bytes=len(pdf_bytes)) as ingest_span:
+        # Reuse the index saved for an identical report and configuration
+        vectorstore = index_store.load(key, embeddings)
+        ingest_span.set(index_cached=vectorstore is not None)
+        if vectorstore is None:
+            # PyMuPDF and the splitter are only loaded when a report actually has to be extracted
+            from pdf_ingest import build_vectorstore, iter_chunks, iter_pdf_pages
+
+            # Stream pages straight from the upload buffer into the splitter and embedder;
+            # statement tables are kept whole rather than cut at the chunk size
+            pages = iter_pdf_pages(pdf_bytes, name=getattr(uploaded_file, "name", None))
+            docs = iter_chunks(pages, make_splitter())
+
+            # Create embeddings and store in FAISS index
+            vectorstore = build_vectorstore(docs, embeddings)
+            if vectorstore is None:
+                raise ValueError("No text could be extracted from the uploaded PDF.")
+
+            index_store.save(key, vectorstore, config)
 
-    # Remove temporary file
-    os.remove("temp_report.pdf")
+        # Make the report searchable alongside every other filing in the corpus, reusing its vectors
+        get_corpus(embeddings).add_vectorstore(key, vectorstore, ticker=ticker, fiscal_year=fiscal_year,
+                                               name=getattr(uploaded_file, "name", None))
 
     return vectorstore
 
-def answer_question_from_report(question, vectorstore, openai_api_key):
-    # Retrieve relevant documents
-    docs = vectorstore.similarity_search(question, k=4)
+def answer_index_id(vectorstore, filters=None, index_id=None):
+    """Identify the documents an answer is drawn from; None when they cannot be identified."""
+    if isinstance(vectorstore, CorpusIndex):
+        return f"corpus:{vectorstore.root}@{vectorstore.generation}:{json.dumps(filters or {}, sort_keys=True)}"
+    if index_id is not None:
+        return f"report:{index_id}:{json.dumps(filters or {}, sort_keys=True)}"
+    return None
 
-    # Load QA chain
-    llm = OpenAI(temperature=0, openai_api_key=openai_api_key)
-    chain = load_qa_chain(llm, chain_type="stuff")
+def _retrieve(question, vectorstore, openai_api_key, filters, index_id, cache):
+    # Embed the question once for both retrieval and the semantic answer cache
+    cache = get_answer_cache() if cache is None else cache
+    cache_id = answer_index_id(vectorstore, filters, index_id) if cache else None
+    mode = retrieval_mode() if isinstance(vectorstore, CorpusIndex) else "dense"
+    budget = token_budget()
+    with span("qa.retrieve", k=CONTEXT_CANDIDATES, filtered=bool(filters), mode=mode) as retrieve_span:
+        embeddings = get_embeddings(openai_api_key)
+        query_vector = embeddings.embed_query(question)
 
-    # Get the answer
-    answer = chain.run(input_documents=docs, question=question)
+        # Retrieve candidate documents; filters restrict the search to matching chunks' metadata.
+        # Corpus results fuse the nearest vectors with the BM25 ranking of the question's words.
+        vectors = None
+        if isinstance(vectorstore, CorpusIndex):
+            if mode == "hybrid":
+                ids, _ = vectorstore.hybrid_search_ids(question, query_vector, k=CONTEXT_CANDIDATES,
+                                                       filters=filters, candidates=HYBRID_CANDIDATES)
+            elif mode == "text":
+                ids, _ = vectorstore.text_search_ids(question, k=CONTEXT_CANDIDATES, filters=filters)
+            else:
+                ids, _ = vectorstore.search_ids(query_vector, k=CONTEXT_CANDIDATES, filters=filters)
+            candidates = vectorstore.documents(ids)
+            chunk_ids = [int(i) for i in ids]
+            if chunk_ids:
+                vectors = vectorstore.archived_vectors()[chunk_ids]
+        else:
+            candidates = vectorstore.similarity_search_by_vector(query_vector, k=CONTEXT_CANDIDATES,
+                                                                 filter=filters or None)
+            chunk_ids = [hashlib.sha256(doc.page_content.encode()).hexdigest()[:16] for doc in candidates]
+        # The packed context also depends on the budget it was fitted to
+        chunk_ids.append(f"budget:{budget}")
+
+        cached = None
+        if cache_id is not None:
+            cached = (cache.get_exact(cache_id, question, chunk_ids)
+                      or cache.get_similar(cache_id, query_vector))
+            if cached is None:
+                cache.record_miss()
+        retrieve_span.set(documents=len(candidates), bytes=sum(len(doc.page_content) for doc in candidates),
+                          answer_cached=cached is not None)
+    # Only an answer that still has to be generated needs its context packed
+    docs = build_context(candidates, vectors, budget, baseline_k=RETRIEVAL_K).documents if cached is None else []
+    store = (lambda value: cache.put(cache_id, question, chunk_ids, value, query_vector)) if cache_id else None
+    return docs, cached, store
+
+def answer_question_from_report(question, vectorstore, openai_api_key, filters=None, index_id=None, cache=None):
+    """Answer ``question`` from the report chunks most similar to it.
+
+    The retrieved chunks are deduplicated, reordered for diversity and packed into
+    ``CONTEXT_TOKEN_BUDGET`` tokens (see ``context_packing``) before they are stuffed
+    into the prompt. Answers are cached per document index (see ``answer_cache``); ``index_id`` names a
+    plain per-report vectorstore, e.g. its report key. Pass ``cache=False`` to bypass the cache.
+    """
+    with span("qa.answer"):
+        docs, cached, store = _retrieve(question, vectorstore, openai_api_key, filters, index_id, cache)
+        if cached is not None:
+            return cached
+
+        # Shared QA chain for this key, built on first use
+        chain = get_qa_chain(openai_api_key)
+
+        # Get the answer; the chain reports no usage, so tokens are counted locally
+        with span("llm.report_answer") as llm_span:
+            answer = chain.run(input_documents=docs, question=question)
+            counter = get_token_counter()
+            prompt_tokens = counter.count(question) + sum(counter.count(doc.page_content) for doc in docs)
+            completion_tokens = counter.count(answer)
+            llm_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens,
+                         tokens=prompt_tokens + completion_tokens, estimated=not counter.exact)
+
+        # Extract sources (actual text content)
+        sources = [doc.page_content for doc in docs]
+
+        if store:
+            store((answer, sources))
+        return answer, sources
+
+def stream_answer_from_report(question, vectorstore, openai_api_key, filters=None, index_id=None, cache=None):
+    """Streaming variant of ``answer_question_from_report``: returns ``(tokens, sources)``.
+
+    ``tokens`` yields the answer as the LLM generates it, with the same "stuff" prompt the
+    QA chain uses; a cached answer is yielded in one piece. Time-to-first-token and total
+    time are recorded under ``report_answer`` in ``llm_metrics``.
+    """
+    docs, cached, store = _retrieve(question, vectorstore, openai_api_key, filters, index_id, cache)
+    if cached is not None:
+        answer, sources = cached
+        return timed_stream(iter([answer]), "report_answer"), sources
 
-    # Extract sources (actual text content)
     sources = [doc.page_content for doc in docs]
 
-    return answer, sources
+    def tokens():
+        from langchain.chains.question_answering.stuff_prompt import PROMPT_SELECTOR as STUFF_PROMPT_SELECTOR
+
+        llm = get_completion_llm(openai_api_key)
+        prompt = STUFF_PROMPT_SELECTOR.get_prompt(llm).format(
+            context="\n\n".join(sources), question=question)
+        parts = []
+        for token in llm.stream(prompt):
+            parts.append(token)
+            yield token
+        if store:
+            store(("".join(parts), sources))
+
+    return timed_stream(tokens(), "report_answer"), sources
@@ -0,0 +1,146 @@
+"""Table-aware splitting of annual-report pages.
+
+Financial statements come out of PDF text extraction as runs of lines that are mostly
+figures: a column header of years, then one line item per line with its values (or,
+for some layouts, one cell per line). A plain character splitter cuts such a table
+wherever the character budget runs out, separating line items from their caption and
+column headers, and its overlap copies the cut rows into the next chunk.
+
+``TableAwareSplitter`` finds those runs first and keeps each table, with the caption
+lines directly above it, in a single chunk. Tables longer than ``max_table_size`` are
+split between rows, and every part repeats the caption and column header. The prose
+around them is split with ``RecursiveCharacterTextSplitter`` as before, with a smaller
+overlap. Chunks carry ``chunk_type`` (``"table"`` or ``"text"``) in their metadata.
+"""
+import re
+
+from langchain_core.documents import Document
+
+NUMBER_PATTERN = re.compile(r"^[(\-–]?[$€£¥]?\d[\d,]*(?:\.\d+)?%?\)?$")
+WORD_PATTERN = re.compile(r"[A-Za-z]{2,}")
+
+# A line with at least this many figures and at most this many words is a table row
+MIN_ROW_NUMBERS = 2
+MAX_ROW_WORDS = 8
+# Short lines without a full stop directly above a table are kept with it as its caption
+MAX_CAPTION_LINES = 2
+MAX_CAPTION_LENGTH = 120
+# A run needs this many figure lines to count as a table rather than prose with numbers
+MIN_TABLE_ROWS = 3
+
+
+def _is_number(token):
+    return bool(NUMBER_PATTERN.match(token))
+
+
+def is_table_row(line):
+    """Whether ``line`` looks like a row of figures: a line item with values, or a lone cell value."""
+    tokens = line.split()
+    if not tokens:
+        return False
+    numbers = sum(1 for token in tokens if _is_number(token))
+    if numbers == len(tokens):
+        return True
+    return numbers >= MIN_ROW_NUMBERS and len(WORD_PATTERN.findall(line)) <= MAX_ROW_WORDS
+
+
+def _is_label(line):
+    # Line-item labels of cell-per-line tables: short text without a sentence ending
+    stripped = line.strip()
+    return 0 < len(stripped) <= 60 and not stripped.endswith('.')
+
+
+def _is_caption(line):
+    stripped = line.strip()
+    return 0 < len(stripped) <= MAX_CAPTION_LENGTH and not stripped.endswith('.')
+
+
+def segment_lines(lines):
+    """Split page lines into ``("table" | "text", lines)`` segments in page order."""
+    rows = [is_table_row(line) for line in lines]
+    segments, text, position = [], [], 0
+    while position < len(lines):
+        if not rows[position]:
+            text.append(lines[position])
+            position += 1
+            continue
+        # Extend the run over figure lines and labels that are followed by figures
+        end, figures = position, 0
+        while end < len(lines):
+            if rows[end]:
+                figures += 1
+                end += 1
+            elif end + 1 < len(lines) and rows[end + 1] and _is_label(lines[end]):
+                end += 1
+            else:
+                break
+        if figures < MIN_TABLE_ROWS:
+            text.extend(lines[position:end])
+            position = end
+            continue
+        caption = []
+        while text and len(caption) < MAX_CAPTION_LINES and _is_caption(text[-1]):
+            caption.insert(0, text.pop())
+        if text:
+            segments.append(('text', text))
+            text = []
+        segments.append(('table', caption + lines[position:end]))
+        position = end
+    if text:
+        segments.append(('text', text))
+    return segments
+
+
+def _table_parts(lines, max_size):
+    """Split an oversized table between rows, repeating its caption and column header in each part."""
+    header_size = next((i for i, line in enumerate(lines) if is_table_row(line)), 0) + 1
+    header, body = lines[:header_size], lines[header_size:]
+    budget = max_size - sum(len(line) + 1 for line in header)
+    parts, part, size = [], [], 0
+    for line in body:
+        if part and size + len(line) + 1 > budget:
+            parts.append(header + part)
+            part, size = [], 0
+        part.append(line)
+        size += len(line) + 1
+    if part or not parts:
+        parts.append(header + part)
+    return parts
+
+
+class TableAwareSplitter:
+    """Drop-in for a langchain text splitter's ``split_documents`` that keeps tables whole."""
+
+    def __init__(self, chunk_size=1000, chunk_overlap=100, max_table_size=4000):
+        from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.max_table_size = max_table_size
+        self._text_splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+    def split_text_with_types(self, text):
+        """Return ``(chunk_type, chunk_text)`` pairs for one page of text."""
+        chunks, prose = [], []
+        for kind, lines in segment_lines(text.splitlines()):
+            if kind == 'text':
+                prose.extend(lines)
+                continue
+            if len("\n".join(lines)) <= self.max_table_size:
+                chunks.append(('table', "\n".join(lines)))
+            else:
+                chunks.extend(('table', "\n".join(part)) for part in _table_parts(lines, self.max_table_size))
+        # The prose between tables of a page is split together so short passages are not left on their own
+        prose_text = "\n".join(line for line in prose if line.strip())
+        chunks.extend(('text', chunk) for chunk in self._text_splitter.split_text(prose_text))
+        return chunks
+
+    def split_text(self, text):
+        return [chunk for _, chunk in self.split_text_with_types(text)]
+
+    def split_documents(self, documents):
+        return [
+            Document(page_content=chunk, metadata={**document.metadata, 'chunk_type': kind})
+            for document in documents
+            for kind, chunk in self.split_text_with_types(document.page_content)
+        ]
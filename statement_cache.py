@@ -0,0 +1,178 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+DEFAULT_CACHE_PATH = os.path.join(".cache", "statements.sqlite")
+DEFAULT_TTL_SECONDS = 7 * 24 * 3600
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+class StatementCache:
+    """SQLite-backed cache of raw Alpha Vantage responses keyed by (function, symbol).
+
+    Payloads are stored as zlib-compressed JSON. Entries older than ``ttl`` seconds
+    are treated as misses, and once the stored payloads exceed ``max_bytes`` the
+    least recently used entries are evicted. Responses from other sources are stored
+    under qualified function names (see ``data_processing.cache_function``).
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS statements (
+                function TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (function, symbol)
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS statements_accessed ON statements (accessed_at)")
+
+    def get(self, function, symbol):
+        """Return the cached payload, or None on a miss or expired entry."""
+        key = (function, symbol.upper())
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, stored_at FROM statements WHERE function = ? AND symbol = ?", key
+            ).fetchone()
+            if row is None or (self.ttl is not None and now - row[1] > self.ttl):
+                self.misses += 1
+                return None
+            self._conn.execute(
+                "UPDATE statements SET accessed_at = ? WHERE function = ? AND symbol = ?", (now, *key)
+            )
+            self.hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def peek(self, function, symbol):
+        """Return the cached payload like ``get``, without counting a hit or miss or touching ``accessed_at``."""
+        fresh, params = self._fresh_clause()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT payload FROM statements WHERE function = ? AND symbol = ? AND {fresh}",
+                [function, symbol.upper()] + params,
+            ).fetchone()
+        return None if row is None else json.loads(zlib.decompress(row[0]))
+
+    def set(self, function, symbol, payload):
+        blob = zlib.compress(json.dumps(payload, separators=(",", ":")).encode(), 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO statements VALUES (?, ?, ?, ?, ?, ?)",
+                (function, symbol.upper(), blob, len(blob), now, now),
+            )
+            self._evict()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM statements").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT function, symbol, size FROM statements ORDER BY accessed_at").fetchall()
+        for function, symbol, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM statements WHERE function = ? AND symbol = ?", (function, symbol))
+            total -= size
+            self.evictions += 1
+
+    def _fresh_clause(self):
+        # The expiry rule of ``get``: rows older than ``ttl`` count as missing
+        if self.ttl is None:
+            return "1", []
+        return "stored_at >= ?", [time.time() - self.ttl]
+
+    def symbols(self, functions=None):
+        """Return ``{symbol: last stored time}`` of the symbols with an unexpired entry for each of ``functions``.
+
+        With no ``functions``, every symbol with an unexpired entry is returned.
+        """
+        functions = list(functions or [])
+        fresh, params = self._fresh_clause()
+        query = f"SELECT symbol, MAX(stored_at) FROM statements WHERE {fresh}"
+        if functions:
+            query += (f" AND function IN ({', '.join('?' * len(functions))})"
+                      f" GROUP BY symbol HAVING COUNT(DISTINCT function) = {len(functions)}")
+        else:
+            query += " GROUP BY symbol"
+        with self._lock:
+            return dict(self._conn.execute(query + " ORDER BY symbol", params + functions).fetchall())
+
+    def scan(self, functions, symbols=None):
+        """Yield ``(symbol, {function: payload})`` for each symbol with an unexpired entry for
+        every one of ``functions`` (and among ``symbols``, when given).
+
+        A read-only bulk read: unlike ``get`` it neither counts hits and misses nor
+        touches ``accessed_at``, so it leaves the LRU order to real lookups.
+        """
+        functions = list(functions)
+        wanted = None if symbols is None else {symbol.upper() for symbol in symbols}
+        fresh, params = self._fresh_clause()
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT symbol, function, payload FROM statements WHERE {fresh}"
+                f" AND function IN ({', '.join('?' * len(functions))}) ORDER BY symbol",
+                params + functions).fetchall()
+        payloads = {}
+        for symbol, function, payload in rows:
+            if wanted is None or symbol in wanted:
+                payloads.setdefault(symbol, {})[function] = payload
+        for symbol, blobs in payloads.items():
+            if len(blobs) == len(functions):
+                yield symbol, {function: json.loads(zlib.decompress(blob)) for function, blob in blobs.items()}
+
+    def invalidate(self, symbol=None):
+        """Drop every entry for ``symbol``, or the whole cache when no symbol is given."""
+        with self._lock:
+            if symbol is None:
+                self._conn.execute("DELETE FROM statements")
+            else:
+                self._conn.execute("DELETE FROM statements WHERE symbol = ?", (symbol.upper(),))
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM statements").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'bytes': size,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_statement_cache():
+    """Return the process-wide cache, configured from the STATEMENT_CACHE_* environment variables."""
+    global _default_cache
+    if _default_cache is None:
+        with _default_cache_lock:
+            if _default_cache is None:
+                _default_cache = StatementCache(
+                    path=os.environ.get("STATEMENT_CACHE_PATH", DEFAULT_CACHE_PATH),
+                    ttl=float(os.environ.get("STATEMENT_CACHE_TTL", DEFAULT_TTL_SECONDS)),
+                    max_bytes=int(os.environ.get("STATEMENT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                )
+    return _default_cache
@@ -0,0 +1,136 @@
+"""Normalized, typed view of the three financial statements of one company.
+
+``FinancialStatements.from_raw`` parses the raw Alpha Vantage payloads once:
+every numeric field becomes a float64 column (``"None"`` and other non-numeric
+values become NaN) and each statement is indexed by a sorted ``fiscalDateEnding``
+DatetimeIndex. Metrics and charts read from this object instead of re-parsing
+the JSON.
+"""
+import logging
+from dataclasses import dataclass, field
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+STATEMENTS = ['income_statement', 'balance_sheet', 'cash_flow']
+
+MISSING_REPORTS_MESSAGES = {
+    'income_statement': 'No financial report data available',
+    'balance_sheet': 'No balance sheet data available',
+    'cash_flow': 'No cash flow data available',
+}
+
+# Columns kept as text rather than converted to floats
+TEXT_FIELDS = {'fiscalDateEnding', 'reportedCurrency'}
+
+
+def statement_reports(statement):
+    """Return the report list of a raw statement, preferring annual over quarterly reports."""
+    if 'annualReports' in statement:
+        return statement['annualReports']
+    return statement.get('quarterlyReports', [])
+
+
+def to_float_array(values):
+    """Convert raw field values to float64, mapping "None" and missing values to NaN."""
+    array = np.array(values, dtype=object)
+    array[array == 'None'] = np.nan
+    try:
+        return array.astype(float)
+    except (TypeError, ValueError):
+        # Some other non-numeric string; take the slower element-wise path
+        return pd.to_numeric(pd.Series(array), errors='coerce').to_numpy(dtype=float)
+
+
+def statement_frame(reports, fields=None):
+    """Convert a list of report dicts to a float64 frame indexed by fiscalDateEnding.
+
+    Without ``fields`` every non-text field is kept.
+    """
+    if fields is None:
+        fields = list(dict.fromkeys(key for report in reports for key in report if key not in TEXT_FIELDS))
+    index = pd.DatetimeIndex(
+        pd.to_datetime(pd.Index([report.get('fiscalDateEnding') for report in reports], dtype=object),
+                       errors='coerce'),
+        name='fiscalDateEnding')
+    columns = {name: to_float_array([report.get(name) for report in reports]) for name in fields}
+    frame = pd.DataFrame(columns, index=index, columns=fields, dtype=float)
+    frame = frame[frame.index.notna()]
+    return frame[~frame.index.duplicated()].sort_index()
+
+
+@dataclass
+class FinancialStatements:
+    income: pd.DataFrame
+    balance: pd.DataFrame
+    cash_flow: pd.DataFrame
+    # 'annual' or 'quarterly' per statement, depending on which reports were available
+    periodicity: dict = field(default_factory=dict)
+
+    @classmethod
+    def from_raw(cls, financial_data):
+        """Parse raw statement payloads; raises ValueError when a statement has no reports."""
+        frames, periodicity = {}, {}
+        for name in STATEMENTS:
+            statement = financial_data.get(name) or {}
+            if 'annualReports' in statement:
+                periodicity[name] = 'annual'
+            elif 'quarterlyReports' in statement:
+                logger.info("'annualReports' not found in %s; using quarterlyReports", name)
+                periodicity[name] = 'quarterly'
+            else:
+                raise ValueError(MISSING_REPORTS_MESSAGES[name])
+            frames[name] = statement_frame(statement_reports(statement))
+        return cls(frames['income_statement'], frames['balance_sheet'], frames['cash_flow'], periodicity)
+
+    def statement(self, name):
+        return {'income_statement': self.income, 'balance_sheet': self.balance, 'cash_flow': self.cash_flow}[name]
+
+    def column(self, name, field_name, default=np.nan):
+        """Return one field of a statement as a Series, filled with ``default`` if the provider omitted it."""
+        frame = self.statement(name)
+        if field_name in frame:
+            return frame[field_name]
+        return pd.Series(default, index=frame.index, dtype=float, name=field_name)
+
+    @cached_property
+    def aligned(self):
+        """All three statements outer-joined on fiscalDateEnding, with (statement, field) columns."""
+        return pd.concat([self.income, self.balance, self.cash_flow], axis=1, join='outer', keys=STATEMENTS)
+
+    def fields(self, fields_by_statement, defaults=None):
+        """Return the requested fields aligned on fiscalDateEnding as a flat frame.
+
+        ``fields_by_statement`` maps statement names to field lists; field names must be
+        unique across statements. Fields missing from a statement get ``defaults``
+        (or NaN).
+        """
+        defaults = defaults or {}
+        columns = {}
+        for name, fields in fields_by_statement.items():
+            for field_name in fields:
+                columns[field_name] = self.column(name, field_name, defaults.get(field_name, np.nan))
+        return pd.concat(columns, axis=1, join='outer').sort_index()
+
+    def latest(self, name):
+        """Return the most recent report of a statement as a Series (empty if there are none)."""
+        frame = self.statement(name)
+        if frame.empty:
+            return pd.Series(dtype=float)
+        return frame.iloc[-1]
+
+    @property
+    def nbytes(self):
+        """Memory held by the statement frames, including ``aligned`` once it is built."""
+        frames = [self.income, self.balance, self.cash_flow]
+        if 'aligned' in self.__dict__:
+            frames.append(self.aligned)
+        return sum(int(frame.memory_usage(deep=True).sum()) + frame.index.memory_usage(deep=True)
+                   for frame in frames)
+
+    @property
+    def latest_period(self):
+        return self.income.index[-1] if len(self.income.index) else None
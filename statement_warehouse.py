@@ -0,0 +1,308 @@
+"""Local columnar store of statement history, partitioned by ticker and statement.
+
+Each partition is an uncompressed Arrow IPC file,
+``<root>/ticker=IBM/statement=income_statement/annual.arrow`` (and ``quarterly.arrow``),
+holding one row per fiscal period sorted by ``fiscalDateEnding``: a date32 column,
+``reportedCurrency`` and one float64 column per numeric field, with ``"None"`` and
+absent values stored as NaN rather than null. Files are memory-mapped on read and the
+float columns are handed to pandas without copying, so ``FinancialStatements`` built
+by ``statements`` read straight from the page cache.
+
+``refresh`` only calls the provider for tickers whose latest period is stale (a new
+quarter or year should have been filed by now) and that were not already checked
+recently, and only periods newer than the stored ones are appended. A partition is
+rewritten as a single contiguous file on append (statement histories are a few
+dozen rows) so that every column stays one zero-copy chunk.
+"""
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.ipc as ipc
+
+from statement_model import STATEMENTS, FinancialStatements, statement_frame
+
+DEFAULT_WAREHOUSE_PATH = os.path.join(".cache", "warehouse")
+PERIODICITIES = ('annual', 'quarterly')
+
+# A period counts as stale once the next one should have been filed: period length plus a filing lag
+STALE_AFTER = {'quarterly': datetime.timedelta(days=90 + 45), 'annual': datetime.timedelta(days=365 + 90)}
+DEFAULT_RECHECK_SECONDS = 24 * 3600
+
+
+def reports_table(reports):
+    """Convert raw Alpha Vantage reports to an Arrow table sorted by fiscalDateEnding."""
+    frame = statement_frame(reports)
+    currency = {report.get('fiscalDateEnding'): report.get('reportedCurrency') for report in reports}
+    columns = {
+        'fiscalDateEnding': pa.array(frame.index.values.astype('datetime64[D]'), pa.date32()),
+        'reportedCurrency': pa.array([currency.get(date.strftime('%Y-%m-%d')) for date in frame.index],
+                                     pa.string()),
+    }
+    columns.update({name: pa.array(frame[name].to_numpy(), pa.float64()) for name in frame.columns})
+    return pa.table(columns)
+
+
+def _nan_filled(table):
+    # Columns missing from some of the concatenated parts come back as nulls; keep them NaN
+    for position, column in enumerate(table.columns):
+        if pa.types.is_floating(column.type) and column.null_count:
+            table = table.set_column(position, table.field(position), pc.fill_null(column, np.nan))
+    return table
+
+
+def _frame(table):
+    """Float columns of a memory-mapped table as a frame indexed by fiscalDateEnding, without copying them."""
+    index = pd.DatetimeIndex(table.column('fiscalDateEnding').to_numpy().astype('datetime64[ns]'),
+                             name='fiscalDateEnding')
+    numeric = [name for name in table.column_names if pa.types.is_floating(table.schema.field(name).type)]
+    # One block per column: consolidating them into a 2-D block would copy every column
+    frame = table.select(numeric).to_pandas(split_blocks=True)
+    frame.index = index
+    return frame
+
+
+class StatementWarehouse:
+    def __init__(self, root=None, recheck_seconds=DEFAULT_RECHECK_SECONDS):
+        self.root = root or os.environ.get("STATEMENT_WAREHOUSE_PATH", DEFAULT_WAREHOUSE_PATH)
+        self.recheck_seconds = recheck_seconds
+        os.makedirs(self.root, exist_ok=True)
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _lock(self, ticker):
+        with self._locks_lock:
+            return self._locks.setdefault(ticker, threading.Lock())
+
+    def _ticker_dir(self, ticker):
+        return os.path.join(self.root, f"ticker={ticker.upper()}")
+
+    def _path(self, ticker, statement, periodicity):
+        return os.path.join(self._ticker_dir(ticker), f"statement={statement}", f"{periodicity}.arrow")
+
+    def _manifest_path(self, ticker):
+        return os.path.join(self._ticker_dir(ticker), "manifest.json")
+
+    def manifest(self, ticker):
+        try:
+            with open(self._manifest_path(ticker)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_manifest(self, ticker, manifest):
+        path = self._manifest_path(ticker)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w") as f:
+            json.dump(manifest, f)
+        os.replace(path + ".tmp", path)
+
+    def tickers(self):
+        return sorted(name[len("ticker="):] for name in os.listdir(self.root) if name.startswith("ticker="))
+
+    def read_table(self, ticker, statement, periodicity='annual'):
+        """Memory-map one partition; None if nothing is stored for it."""
+        try:
+            with pa.memory_map(self._path(ticker, statement, periodicity)) as source:
+                return ipc.open_file(source).read_all()
+        except FileNotFoundError:
+            return None
+
+    def latest_period(self, ticker, statement='income_statement'):
+        """Latest stored ``(fiscalDateEnding, periodicity)``.
+
+        Annual reports are preferred, as in ``statements``, so staleness is judged on the
+        reports that are served.
+        """
+        for periodicity in PERIODICITIES:
+            table = self.read_table(ticker, statement, periodicity)
+            if table is not None and table.num_rows:
+                return table.column('fiscalDateEnding')[-1].as_py(), periodicity
+        return None, None
+
+    def is_stale(self, ticker, today=None, now=None):
+        """Whether the provider may have newer periods than those stored for ``ticker``."""
+        manifest = self.manifest(ticker)
+        if manifest.get('stale'):
+            return True
+        latest, periodicity = self.latest_period(ticker)
+        if latest is None:
+            return True
+        checked_at = manifest.get('checked_at')
+        if checked_at is not None and (now or time.time()) - checked_at < self.recheck_seconds:
+            return False
+        return (today or datetime.date.today()) - latest > STALE_AFTER[periodicity]
+
+    def append(self, ticker, financial_data):
+        """Store the periods of raw statement payloads that are newer than those already stored.
+
+        Returns the number of rows added. Every statement in ``financial_data`` must be a
+        statement payload (see ``data_processing.is_statement_payload``).
+        """
+        added = 0
+        with self._lock(ticker):
+            for statement in STATEMENTS:
+                payload = financial_data.get(statement) or {}
+                for periodicity in PERIODICITIES:
+                    reports = payload.get(f"{periodicity}Reports")
+                    if not reports:
+                        continue
+                    new = reports_table(reports)
+                    existing = self.read_table(ticker, statement, periodicity)
+                    if existing is not None and existing.num_rows:
+                        latest = existing.column('fiscalDateEnding')[-1]
+                        new = new.filter(pc.greater(new.column('fiscalDateEnding'), latest))
+                        if not new.num_rows:
+                            continue
+                        combined = _nan_filled(pa.concat_tables([existing, new], promote_options="permissive"))
+                    else:
+                        combined = new
+                    self._write_partition(ticker, statement, periodicity, combined.combine_chunks())
+                    added += new.num_rows
+            manifest = self.manifest(ticker)
+            manifest.pop('stale', None)
+            manifest['checked_at'] = time.time()
+            if added:
+                manifest['updated_at'] = manifest['checked_at']
+            self._write_manifest(ticker, manifest)
+        return added
+
+    def _write_partition(self, ticker, statement, periodicity, table):
+        path = self._path(ticker, statement, periodicity)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Readers keep their memory map of the old file; the new one replaces it atomically
+        with ipc.new_file(path + ".tmp", table.schema) as writer:
+            writer.write_table(table)
+        os.replace(path + ".tmp", path)
+
+    def mark_checked(self, ticker):
+        with self._lock(ticker):
+            manifest = self.manifest(ticker)
+            manifest.pop('stale', None)
+            manifest['checked_at'] = time.time()
+            self._write_manifest(ticker, manifest)
+
+    def invalidate(self, ticker):
+        """Mark ``ticker`` stale so the next refresh asks the provider again, whatever its latest period.
+
+        The stored history is kept; only newer periods are appended.
+        """
+        with self._lock(ticker):
+            manifest = self.manifest(ticker)
+            manifest['stale'] = True
+            self._write_manifest(ticker, manifest)
+
+    def refresh(self, tickers, fetch, today=None):
+        """Fetch and append new periods for the stale ``tickers``.
+
+        ``fetch(ticker)`` returns raw statement payloads (or None on an HTTP error). Returns
+        ``{ticker: payload}`` for the tickers that were fetched, so callers can report
+        provider refusals (rate-limit notes, unknown symbols), which are not stored.
+        """
+        from data_processing import is_statement_payload
+
+        fetched = {}
+        for ticker in tickers:
+            if not self.is_stale(ticker, today=today):
+                continue
+            financial_data = fetch(ticker)
+            fetched[ticker] = financial_data
+            if financial_data is None:
+                continue
+            if all(is_statement_payload(financial_data.get(statement)) for statement in STATEMENTS):
+                self.append(ticker, financial_data)
+            elif self.latest_period(ticker)[0] is not None:
+                # Keep serving the stored history; try the provider again after the recheck interval
+                self.mark_checked(ticker)
+        return fetched
+
+    def statements(self, ticker):
+        """``FinancialStatements`` read from the memory-mapped partitions; None if ``ticker`` is not stored.
+
+        Like ``FinancialStatements.from_raw``, annual reports are used when available.
+        """
+        frames, periodicity = {}, {}
+        for statement in STATEMENTS:
+            for kind in PERIODICITIES:
+                table = self.read_table(ticker, statement, kind)
+                if table is not None and table.num_rows:
+                    frames[statement], periodicity[statement] = _frame(table), kind
+                    break
+            else:
+                return None
+        return FinancialStatements(frames['income_statement'], frames['balance_sheet'], frames['cash_flow'],
+                                   periodicity)
+
+    def version(self, ticker):
+        """Identifier of the stored data of ``ticker`` that changes whenever a partition is rewritten."""
+        digest = hashlib.blake2b(ticker.upper().encode(), digest_size=16)
+        for statement in STATEMENTS:
+            for periodicity in PERIODICITIES:
+                try:
+                    stat = os.stat(self._path(ticker, statement, periodicity))
+                except FileNotFoundError:
+                    continue
+                digest.update(f"{statement}/{periodicity}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+        return f"warehouse:{digest.hexdigest()}"
+
+    def _scan(self, tickers, statement, fields, defaults):
+        """One statement of many tickers as a (ticker, period) frame, concatenated in Arrow and converted once."""
+        stored, counts = [], []
+        chunks = {name: [] for name in ['fiscalDateEnding'] + fields}
+        for ticker in tickers:
+            for periodicity in PERIODICITIES:
+                table = self.read_table(ticker, statement, periodicity)
+                if table is not None and table.num_rows:
+                    break
+            else:
+                continue
+            stored.append(ticker)
+            counts.append(table.num_rows)
+            columns = dict(zip(table.column_names, table.columns))
+            chunks['fiscalDateEnding'].extend(columns['fiscalDateEnding'].chunks)
+            for name in fields:
+                if name in columns:
+                    chunks[name].extend(columns[name].chunks)
+                else:
+                    chunks[name].append(pa.array(np.full(table.num_rows, defaults.get(name, np.nan))))
+        if not stored:
+            return None
+        frame = pa.table({name: pa.chunked_array(arrays, pa.float64()) for name, arrays in chunks.items()
+                          if name != 'fiscalDateEnding'}).to_pandas(split_blocks=True)
+        frame.index = pd.MultiIndex.from_arrays(
+            [np.repeat(np.array(stored, dtype=object), counts),
+             pd.DatetimeIndex(pa.chunked_array(chunks['fiscalDateEnding'], pa.date32()).to_numpy()
+                              .astype('datetime64[ns]'))],
+            names=['ticker', 'period'])
+        return frame
+
+    def metrics_table(self, tickers=None):
+        """The (ticker, period) x metric frame of the stored ``tickers``, computed in one vectorized pass."""
+        from metrics_engine import FIELDS, OPTIONAL_FIELDS, compute_metrics_from_fields
+
+        tickers = [ticker.upper() for ticker in tickers or self.tickers()]
+        defaults = dict.fromkeys(OPTIONAL_FIELDS, 0.0)
+        frames = [self._scan(tickers, statement, FIELDS[statement], defaults) for statement in STATEMENTS]
+        if any(frame is None for frame in frames):
+            return pd.DataFrame()
+        return compute_metrics_from_fields(pd.concat(frames, axis=1, join='outer'))
+
+
+_warehouse = None
+_warehouse_lock = threading.Lock()
+
+
+def get_statement_warehouse():
+    """Return the process-wide warehouse under STATEMENT_WAREHOUSE_PATH."""
+    global _warehouse
+    with _warehouse_lock:
+        if _warehouse is None:
+            _warehouse = StatementWarehouse()
+        return _warehouse
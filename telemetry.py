@@ -0,0 +1,350 @@
+"""Timing spans for the fetch, process, ingest and QA hot paths.
+
+``span(name, **attributes)`` times a block and records it with its attributes (byte
+and token counts, cache hits, ...). A span opened while another is active, in the
+same thread or task or in a context carried over with ``bind_context``, becomes its
+child and shares its trace id. ``record`` adds a span timed by the caller, for work
+done inside generators or other processes.
+
+The last ``window`` finished spans are kept in memory for the app's profiling panel
+(``Tracer.summary`` and ``Tracer.recent_traces``). They can also be exported:
+
+- OpenTelemetry: with OTEL_EXPORTER_OTLP_ENDPOINT set (e.g. ``http://localhost:4318``),
+  finished spans are posted as OTLP/HTTP JSON to ``<endpoint>/v1/traces`` in batches
+  from a background thread. OTEL_SERVICE_NAME names the service.
+- Prometheus: with TELEMETRY_PROMETHEUS_PORT set, ``/metrics`` on that port serves a
+  duration histogram and byte/token counters per span name.
+"""
+import contextvars
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from bisect import bisect_left
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW = 4096
+
+# Upper bounds (seconds) of the Prometheus duration histogram buckets
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Numeric attributes summed into counters per span name
+COUNTED_ATTRIBUTES = ('bytes', 'tokens')
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str = None
+    start_ns: int = 0
+    end_ns: int = None
+    attributes: dict = field(default_factory=dict)
+    error: str = None
+
+    @property
+    def duration(self):
+        """Duration in seconds (None while the span is open)."""
+        return None if self.end_ns is None else (self.end_ns - self.start_ns) / 1e9
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+
+_current_span = contextvars.ContextVar("telemetry_span", default=None)
+
+
+def current_span():
+    return _current_span.get()
+
+
+def bind_context(function):
+    """Wrap ``function`` to run in a copy of the caller's context, e.g. before submitting it to a thread pool.
+
+    Spans opened by the wrapped function become children of the caller's current span.
+    Bind once per submission: a context cannot be entered by two threads at once.
+    """
+    context = contextvars.copy_context()
+    return lambda *args, **kwargs: context.run(function, *args, **kwargs)
+
+
+class _Aggregate:
+    __slots__ = ('count', 'errors', 'seconds', 'buckets', 'counters')
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.counters = dict.fromkeys(COUNTED_ATTRIBUTES, 0)
+
+
+class Tracer:
+    """Records finished spans into a bounded window, lifetime aggregates and exporters."""
+
+    def __init__(self, window=DEFAULT_WINDOW, service_name="financial-analysis-rag"):
+        self.service_name = service_name
+        self._lock = threading.Lock()
+        self._spans = deque(maxlen=window)
+        self._aggregates = defaultdict(_Aggregate)
+        self._exporters = []
+
+    def add_exporter(self, exporter):
+        """``exporter(span)`` is called with every finished span; it must not block."""
+        with self._lock:
+            self._exporters.append(exporter)
+
+    @contextmanager
+    def span(self, name, **attributes):
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8),
+                    parent.span_id if parent else None, time.time_ns(), attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end_ns = time.time_ns()
+            self._finish(span)
+
+    def record(self, name, start_ns, end_ns, **attributes):
+        """Record a span timed by the caller (``time.time_ns`` values), as a child of the current span."""
+        parent = _current_span.get()
+        span = Span(name, parent.trace_id if parent else secrets.token_hex(16), secrets.token_hex(8),
+                    parent.span_id if parent else None, start_ns, end_ns, attributes)
+        self._finish(span)
+        return span
+
+    def _finish(self, span):
+        with self._lock:
+            self._spans.append(span)
+            aggregate = self._aggregates[span.name]
+            aggregate.count += 1
+            aggregate.errors += span.error is not None
+            aggregate.seconds += span.duration
+            position = bisect_left(DURATION_BUCKETS, span.duration)
+            if position < len(DURATION_BUCKETS):
+                aggregate.buckets[position] += 1
+            for name in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(name)
+                if isinstance(value, (int, float)):
+                    aggregate.counters[name] += value
+            exporters = list(self._exporters)
+        for exporter in exporters:
+            exporter(span)
+
+    def spans(self):
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self):
+        with self._lock:
+            self._spans.clear()
+            self._aggregates.clear()
+
+    def summary(self):
+        """Per span name over the window: count, errors, total/p50/p95/max ms and byte/token sums."""
+        by_name = defaultdict(list)
+        for span in self.spans():
+            by_name[span.name].append(span)
+        summary = {}
+        for name, spans in by_name.items():
+            durations = sorted(span.duration * 1000 for span in spans)
+            summary[name] = {
+                'count': len(spans),
+                'errors': sum(span.error is not None for span in spans),
+                'total_ms': sum(durations),
+                'p50_ms': durations[(len(durations) - 1) // 2],
+                'p95_ms': durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+                'max_ms': durations[-1],
+                **{attribute: sum(span.attributes.get(attribute) or 0 for span in spans)
+                   for attribute in COUNTED_ATTRIBUTES},
+            }
+        return dict(sorted(summary.items(), key=lambda item: -item[1]['total_ms']))
+
+    def recent_traces(self, limit=5):
+        """The ``limit`` most recently finished traces, newest first, as lists of ``(depth, span)`` in start order."""
+        traces = {}
+        for span in reversed(self.spans()):
+            traces.setdefault(span.trace_id, []).append(span)
+        result = []
+        for spans in list(traces.values())[:limit]:
+            children = defaultdict(list)
+            ids = {span.span_id for span in spans}
+            for span in spans:
+                children[span.parent_id if span.parent_id in ids else None].append(span)
+
+            ordered = []
+
+            def walk(parent_id, depth):
+                for child in sorted(children[parent_id], key=lambda span: span.start_ns):
+                    ordered.append((depth, child))
+                    walk(child.span_id, depth + 1)
+
+            walk(None, 0)
+            result.append(ordered)
+        return result
+
+    def prometheus_text(self):
+        """Aggregates since start in the Prometheus text exposition format."""
+        with self._lock:
+            aggregates = {name: (a.count, a.errors, a.seconds, list(a.buckets), dict(a.counters))
+                          for name, a in self._aggregates.items()}
+        lines = [
+            "# HELP span_duration_seconds Duration of instrumented operations.",
+            "# TYPE span_duration_seconds histogram",
+        ]
+        for name, (count, _, seconds, buckets, _) in sorted(aggregates.items()):
+            cumulative = 0
+            for bound, bucket in zip(DURATION_BUCKETS, buckets):
+                cumulative += bucket
+                lines.append(f'span_duration_seconds_bucket{{span="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'span_duration_seconds_bucket{{span="{name}",le="+Inf"}} {count}')
+            lines.append(f'span_duration_seconds_sum{{span="{name}"}} {seconds}')
+            lines.append(f'span_duration_seconds_count{{span="{name}"}} {count}')
+        lines += ["# HELP span_errors_total Instrumented operations that raised.", "# TYPE span_errors_total counter"]
+        lines += [f'span_errors_total{{span="{name}"}} {errors}'
+                  for name, (_, errors, _, _, _) in sorted(aggregates.items())]
+        for attribute in COUNTED_ATTRIBUTES:
+            lines += [f"# HELP span_{attribute}_total Sum of the {attribute} attribute of instrumented operations.",
+                      f"# TYPE span_{attribute}_total counter"]
+            lines += [f'span_{attribute}_total{{span="{name}"}} {counters[attribute]}'
+                      for name, (_, _, _, _, counters) in sorted(aggregates.items()) if counters[attribute]]
+        return "\n".join(lines) + "\n"
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(spans, service_name):
+    """Encode spans as an OTLP/HTTP JSON ``ExportTraceServiceRequest``."""
+    return {'resourceSpans': [{
+        'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': service_name}}]},
+        'scopeSpans': [{
+            'scope': {'name': __name__},
+            'spans': [{
+                'traceId': span.trace_id,
+                'spanId': span.span_id,
+                **({'parentSpanId': span.parent_id} if span.parent_id else {}),
+                'name': span.name,
+                'kind': 1,
+                'startTimeUnixNano': str(span.start_ns),
+                'endTimeUnixNano': str(span.end_ns),
+                'attributes': [{'key': key, 'value': _otlp_value(value)}
+                               for key, value in span.attributes.items() if value is not None],
+                'status': {'code': 2, 'message': span.error} if span.error else {'code': 1},
+            } for span in spans],
+        }],
+    }]}
+
+
+class OtlpExporter:
+    """Posts finished spans to an OTLP/HTTP collector in batches from a daemon thread."""
+
+    def __init__(self, endpoint, service_name, interval=5.0, max_batch=512, max_queue=10000):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.service_name = service_name
+        self.interval = interval
+        self.max_batch = max_batch
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        threading.Thread(target=self._run, name="otlp-exporter", daemon=True).start()
+
+    def __call__(self, span):
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        import requests
+
+        session = requests.Session()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.interval
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                session.post(self.url, json=to_otlp(batch, self.service_name), timeout=10).raise_for_status()
+            except Exception as e:
+                logger.warning("Dropped %d spans: OTLP export to %s failed: %s", len(batch), self.url, e)
+
+
+def serve_prometheus(tracer, port, host="0.0.0.0"):
+    """Serve ``tracer.prometheus_text()`` at ``/metrics`` from a daemon thread; returns the server."""
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = tracer.prometheus_text().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="prometheus-metrics", daemon=True).start()
+    return server
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the process-wide tracer, with the exporters configured in the environment."""
+    global _tracer
+    if _tracer is None:
+        with _tracer_lock:
+            if _tracer is None:
+                tracer = Tracer(int(os.environ.get("TELEMETRY_WINDOW", DEFAULT_WINDOW)),
+                                os.environ.get("OTEL_SERVICE_NAME", "financial-analysis-rag"))
+                endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT")
+                if endpoint:
+                    tracer.add_exporter(OtlpExporter(endpoint, tracer.service_name))
+                port = os.environ.get("TELEMETRY_PROMETHEUS_PORT")
+                if port:
+                    try:
+                        serve_prometheus(tracer, int(port))
+                    except OSError as e:
+                        # Another process (or a Streamlit reload) already serves this port
+                        logger.warning("Prometheus endpoint not started on port %s: %s", port, e)
+                _tracer = tracer
+    return _tracer
+
+
+def span(name, **attributes):
+    """``with span("fetch.statement", ticker=...) as s: ...; s.set(bytes=n)`` on the process-wide tracer."""
+    return get_tracer().span(name, **attributes)
+
+
+def record(name, start_ns, end_ns, **attributes):
+    return get_tracer().record(name, start_ns, end_ns, **attributes)
@@ -1,8 +1,8 @@
 import os
 from data_processing import fetch_financial_data
+from statement_cache import get_statement_cache
 import logging
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
@@ -38,6 +38,7 @@ def test_api():
                 logger.error(f"No reports found in {statement}.")
                 return f"No financial reports found in {statement}. The API might be experiencing issues."
 
+        logger.info(f"Statement cache: {get_statement_cache().stats()}")
         logger.info("API test completed successfully")
         return "Financial data retrieved successfully."
 
@@ -47,5 +48,7 @@ def test_api():
 
 
 if __name__ == "__main__":
+    # Only configure logging when run as a script, not when the app imports this module
+    logging.basicConfig(level=logging.INFO)
     result = test_api()
     print(result)
@@ -0,0 +1,113 @@
+"""Configurable FAISS index types for the report vector store.
+
+``flat`` is exact search. The approximate types trade recall for query latency and
+memory:
+
+- ``ivf_flat``: inverted lists over ``nlist`` k-means cells; ``nprobe`` cells are scanned per query.
+- ``hnsw``: graph index; ``hnsw_m`` links per node, ``ef_search`` candidates explored per query.
+- ``ivf_pq``: IVF with product-quantized codes (``pq_m`` sub-vectors of ``pq_nbits`` bits). PQ
+  distances are too coarse to rank by, so ``refine_factor`` times ``k`` candidates are
+  re-ranked against the exact vectors (``refine``), which the corpus keeps on disk.
+- ``ivf_sq8``: IVF with 8-bit scalar-quantized codes (4x smaller than float32).
+
+IVF types must be trained on a sample of vectors before vectors are added.
+"""
+import os
+from dataclasses import asdict, dataclass
+
+import faiss
+import numpy as np
+
+INDEX_KINDS = ('flat', 'ivf_flat', 'hnsw', 'ivf_pq', 'ivf_sq8')
+
+# faiss recommends at least ~39 training points per centroid
+TRAINING_POINTS_PER_CENTROID = 39
+
+
+@dataclass
+class IndexConfig:
+    kind: str = 'flat'
+    nlist: int = 1024
+    nprobe: int = 16
+    hnsw_m: int = 32
+    ef_construction: int = 80
+    ef_search: int = 64
+    pq_m: int = 16
+    pq_nbits: int = 8
+    refine_factor: int = 16
+
+    def __post_init__(self):
+        if self.kind not in INDEX_KINDS:
+            raise ValueError(f"unknown index kind {self.kind!r}; expected one of {INDEX_KINDS}")
+
+    @classmethod
+    def from_env(cls):
+        """Build a config from CORPUS_INDEX_TYPE, CORPUS_INDEX_NLIST, CORPUS_INDEX_NPROBE, ... variables."""
+        values = {}
+        for name, default in asdict(cls()).items():
+            raw = os.environ.get(f"CORPUS_INDEX_{'TYPE' if name == 'kind' else name.upper()}")
+            if raw is not None:
+                values[name] = raw if isinstance(default, str) else int(raw)
+        return cls(**values)
+
+    @property
+    def refines(self):
+        return self.kind == 'ivf_pq' and self.refine_factor > 1
+
+    @property
+    def needs_training(self):
+        return self.kind.startswith('ivf')
+
+    def factory_string(self, dim):
+        if self.kind == 'flat':
+            return "Flat"
+        if self.kind == 'hnsw':
+            return f"HNSW{self.hnsw_m},Flat"
+        if self.kind == 'ivf_flat':
+            return f"IVF{self.nlist},Flat"
+        if self.kind == 'ivf_sq8':
+            return f"IVF{self.nlist},SQ8"
+        if dim % self.pq_m:
+            raise ValueError(f"pq_m={self.pq_m} must divide the vector dimension {dim}")
+        return f"IVF{self.nlist},PQ{self.pq_m}x{self.pq_nbits}"
+
+    def min_training_vectors(self):
+        return self.nlist * TRAINING_POINTS_PER_CENTROID if self.needs_training else 0
+
+    def search_parameters(self, selector=None):
+        """Return faiss SearchParameters carrying the recall/latency knobs and an optional id selector."""
+        kwargs = {} if selector is None else {'sel': selector}
+        if self.needs_training:
+            return faiss.SearchParametersIVF(nprobe=self.nprobe, **kwargs)
+        if self.kind == 'hnsw':
+            return faiss.SearchParametersHNSW(efSearch=self.ef_search, **kwargs)
+        return faiss.SearchParameters(**kwargs) if kwargs else None
+
+
+def build_index(config, dim, training_vectors=None):
+    """Create an empty index for ``config``; IVF types are trained on ``training_vectors``."""
+    index = faiss.index_factory(dim, config.factory_string(dim))
+    if config.kind == 'hnsw':
+        index.hnsw.efConstruction = config.ef_construction
+    if config.needs_training:
+        if training_vectors is None or len(training_vectors) < config.nlist:
+            raise ValueError(f"{config.kind} needs at least nlist={config.nlist} training vectors")
+        index.train(training_vectors)
+    return index
+
+
+def refine(query, ids, vectors, k):
+    """Re-rank the candidate ``ids`` of one query by exact L2 distance to their rows of ``vectors``.
+
+    Returns ``(ids, distances)`` of the best ``k``; ``vectors`` may be a memory map.
+    """
+    ids = np.sort(ids[ids >= 0])
+    # Sorted ids read a memory map in file order
+    distances = ((np.asarray(vectors[ids]) - query) ** 2).sum(axis=1)
+    best = np.argsort(distances, kind='stable')[:k]
+    return ids[best], distances[best].astype(np.float32)
+
+
+def index_memory_bytes(index):
+    """Size of the serialized index, a close proxy for its resident memory."""
+    return faiss.serialize_index(index).nbytes